@@ -2,7 +2,10 @@
 """An object that represent a Wikidata item of a Swedish nature area."""
 from WikidataItem import WikidataItem
 
+import area_geometry
+import datasets
 import importer_utils as utils
+import preflight
 
 
 class NatureArea(WikidataItem):
@@ -12,7 +15,31 @@ class NatureArea(WikidataItem):
     Handles both nature reserves and national parks.
     """
 
-    def __init__(self, raw_data, repository, data_files, existing):
+    # Statement groups that can be built, in the order they are built,
+    # and the method building each of them.
+    PROPERTY_SETTERS = [("labels", "set_labels"),
+                        ("descriptions", "set_descriptions"),
+                        ("is", "set_is"),
+                        ("country", "set_country"),
+                        ("municipalities", "set_municipalities"),
+                        ("operator", "set_forvaltare"),
+                        ("id", "set_natur_id"),
+                        ("iucn", "set_iucn_status"),
+                        ("area", "set_area"),
+                        ("inception", "set_inception"),
+                        ("coordinates", "set_coordinates")]
+    PROPERTY_NAMES = [x[0] for x in PROPERTY_SETTERS]
+
+    # The release of the source data the references point to.
+    # When a new release is imported, update these and run
+    # nature_importer --refresh-references, see reference_refresh.py.
+    PUBLICATION_DATE = "2015-12-18"
+    RETRIEVAL_DATE = "2017-01-20"
+    REFERENCE_URL = ("http://nvpub.vic-metria.nu/"
+                     "naturvardsregistret/rest/omrade/{}/G%C3%A4llande")
+
+    def __init__(self, raw_data, repository, data_files, existing,
+                 properties=None):
         """
         Initialize the NatureArea object.
 
@@ -24,24 +51,45 @@ class NatureArea(WikidataItem):
         :type data_files: dictionary
         :param existing: WD items that already have an unique id
         :type existing: dictionary
+        :param properties: Only build these groups of statements,
+                           see PROPERTY_NAMES. All of them by default.
+        :type properties: list of strings
         """
         WikidataItem.__init__(self, raw_data, repository, data_files, existing)
         self.municipalities = data_files["municipalities"]
         self.iucn = data_files["iucn_categories"]
         self.forvaltare = data_files["forvaltare"]
         self.glossary = data_files["glossary"]
+        self.indexes = data_files["indexes"]
+        self.geometry = data_files.get("geometry", {})
+        self.municipalities_found = data_files.get("municipalities_found", {})
+        self.problem_report = data_files.get("problems", {}).get(
+            raw_data["NVRID"], {})
+        self.sources = None
+        self.built = set()
         self.match_wikidata(data_files)
-        self.create_sources()
-        self.set_labels()
-        self.set_descriptions()
-        self.set_is()
-        self.set_country()
-        self.set_municipalities()
-        self.set_forvaltare()
-        self.set_natur_id()
-        self.set_iucn_status()
-        self.set_area()
-        self.set_inception()
+        if properties is not None and self.wd_item["wd-item"] is None:
+            print("{} has no WD item to correct, skipping.".format(
+                self.raw_data["NAMN"]))
+            self.wd_item["upload"] = False
+        self.build(properties)
+
+    def build(self, properties=None):
+        """
+        Build the selected groups of statements.
+
+        Groups that were built before are not built again,
+        so this can be called repeatedly to add more of them.
+
+        :param properties: names from PROPERTY_NAMES, or None for all
+        :type properties: list of strings
+        """
+        for name, setter in self.PROPERTY_SETTERS:
+            if properties is not None and name not in properties:
+                continue
+            if name not in self.built:
+                getattr(self, setter)()
+                self.built.add(name)
 
     def generate_ref_url(self):
         """
@@ -49,30 +97,32 @@ class NatureArea(WikidataItem):
 
         :return: url pointing to the post of the specific nature area
         """
-        url = ("http://nvpub.vic-metria.nu/"
-               "naturvardsregistret/rest/omrade/{}/G%C3%A4llande")
-        return url.format(self.raw_data["NVRID"])
+        return self.REFERENCE_URL.format(self.raw_data["NVRID"])
 
     def create_sources(self):
         """
         Create the references for all statements.
 
+        This is done when the first statement is added,
+        so that building only labels doesn't create any.
+
         Publication date = included in the metadata files
-                           supplied by Naturvårdsverket.
-        Retrieval date =   when the stuff was downloaded to the WMSE machine.
+                           supplied by Naturvårdsverket,
+                           see PUBLICATION_DATE.
+        Retrieval date =   when the stuff was downloaded to the WMSE machine,
+                           see RETRIEVAL_DATE.
+
+        The 'stated in' item depends on the dataset
+        that the area belongs to, see datasets.py.
         """
         self.sources = {}
-        item_nr = self.items["source_nr"]
-        item_np = self.items["source_np"]
         url = self.generate_ref_url()
-        publication_date = "2015-12-18"
-        retrieval_date = "2017-01-20"
-        self.sources["np"] = self.make_stated_in_ref(item_np,
-                                                     publication_date,
-                                                     url, retrieval_date)
-        self.sources["nr"] = self.make_stated_in_ref(item_nr,
-                                                     publication_date,
-                                                     url, retrieval_date)
+        dataset = datasets.get_dataset_by_protection_type(
+            self.raw_data["SKYDDSTYP"])
+        if dataset is not None:
+            source_item = self.items[dataset.source_item]
+            self.sources[dataset.code] = self.make_stated_in_ref(
+                source_item, self.PUBLICATION_DATE, url, self.RETRIEVAL_DATE)
 
     def set_labels(self):
         """
@@ -110,11 +160,7 @@ class NatureArea(WikidataItem):
                 description = np_dictionary[language]
                 self.add_description(language, description)
         elif self.raw_data["SKYDDSTYP"] == "Naturreservat":
-            county_without_lan = self.raw_data["LAN"].split(" ")[:-1]
-            county_name = " ".join(county_without_lan)
-            if utils.get_last_char(county_name) == "s":
-                county_name = county_name[:-1]
-
+            county_name = preflight.get_county_name(self.raw_data["LAN"])
             nr_dictionary = self.glossary["nr_description"]
             fi_locations = self.glossary["location_in"]["fi"]
             ru_locations = self.glossary["location_in"]["ru"]
@@ -141,10 +187,25 @@ class NatureArea(WikidataItem):
         incept_pwb = self.make_pywikibot_item({"date_value": incept})
         self.add_statement("inception", incept_pwb)
 
+    def set_coordinates(self):
+        """
+        Set the coordinates of the area.
+
+        This is a representative point inside the area,
+        computed from the polygon data by area_geometry.
+        Areas without polygon data get no coordinates.
+        """
+        point = self.geometry.get(self.raw_data["NVRID"])
+        if point:
+            coordinate = {"latitude": point["latitude"],
+                          "longitude": point["longitude"],
+                          "precision": area_geometry.COORDINATE_PRECISION}
+            self.add_statement("coordinates",
+                               {"coordinate_value": coordinate})
+
     def set_iucn_status(self):
         """Set the IUCN category of the area."""
-        raw_status = self.raw_data["IUCNKAT"]
-        iucn_type = raw_status.split(',')[0]
+        iucn_type = preflight.get_iucn_code(self.raw_data["IUCNKAT"])
         status_item = self.iucn.get(iucn_type)
         self.add_statement("iucn", status_item)
 
@@ -162,21 +223,23 @@ class NatureArea(WikidataItem):
         Set the municipalities where the area is located.
 
         Can be more than one claim if the area stretches across
-        several municipalities.
+        several municipalities. Names in KOMMUN that are not
+        known are completed with the municipalities found
+        from the polygon of the area, if any,
+        see municipality_index.py.
         """
-        municipalities_raw = self.raw_data["KOMMUN"].split(",")
-        for municipality in municipalities_raw:
-            municipality = municipality.strip()
-            if municipality == "Malung":  # Changed in 2007.
-                municipality = "Malung-Sälen"
-            elif municipality == "Göteborg":
-                municipality = "Gothenburg"
-
-            municipality_long = municipality.lower() + " municipality"
-            m_item = [x["item"] for
-                      x in self.municipalities
-                      if x["en"].lower() == municipality_long]
-            self.add_statement("located_adm", m_item[0])
+        m_items, unknown = preflight.resolve_municipalities(
+            self.raw_data["KOMMUN"], self.indexes)
+        if unknown or not m_items:
+            located = self.municipalities_found.get(self.raw_data["NVRID"])
+            if located:
+                print("{}: unknown municipality {}, using {} from the "
+                      "polygon.".format(self.raw_data["NAMN"],
+                                        ", ".join(unknown) or "(none)",
+                                        ", ".join(located)))
+                m_items = m_items + [x for x in located if x not in m_items]
+        for m_item in m_items:
+            self.add_statement("located_adm", m_item)
 
     def set_natur_id(self):
         """Set the Naturvårdsverket ID number."""
@@ -185,23 +248,8 @@ class NatureArea(WikidataItem):
 
     def set_forvaltare(self):
         """Set the operator of the area."""
-        forvaltare = None
-        forvaltare_raw = self.raw_data["FORVALTARE"]
-        if forvaltare_raw == "Hässelholms kommun":
-            forvaltare_raw = "Hässleholms kommun"
-        elif forvaltare_raw == "Malungs kommun":
-            forvaltare_raw = "Malung-Sälens kommun"
-
-        try:
-            f = [x["item"] for
-                 x in self.forvaltare
-                 if x["sv"].lower() == forvaltare_raw.lower()]
-            forvaltare = f[0]
-        except IndexError:
-            if "kommun" in forvaltare_raw.lower():
-                forvaltare = [x["item"] for
-                              x in self.municipalities
-                              if x["sv"].lower() == forvaltare_raw.lower()]
+        forvaltare = preflight.find_operator(self.raw_data["FORVALTARE"],
+                                             self.indexes)
         if forvaltare:
             self.add_statement("forvaltare", forvaltare)
 
@@ -252,26 +300,32 @@ class NatureArea(WikidataItem):
         manually. For nature reserves, the mapping was
         generated by nature_harvester.py, see there for
         methodology used.
-        TODO: check the P31 of matched reserve item.
+        The matched items are checked (P31, redirects,
+        deletions) in bulk before upload, see match_validator.py.
+        To make that possible, where the match came from is
+        saved in self.match_source.
 
         :param data_files: the library of files with area Wikidata mappings
         :type data_files: dictionary
         """
         if self.raw_data["SKYDDSTYP"] == "Nationalpark":
-            mapping = data_files["mapping_nationalparks"]
+            mapping = self.indexes["mapping_nationalparks"]
         elif self.raw_data["SKYDDSTYP"] == "Naturreservat":
-            mapping = data_files["svwp_to_nature_id_exact"]
+            mapping = self.indexes["svwp_to_nature_id_exact"]
         nature_id = self.raw_data["NVRID"]
 
         match_via_id_on_wd = self.match_wikidata_existing(nature_id)
+        self.match_source = None
         if match_via_id_on_wd:
             self.associate_wd_item(match_via_id_on_wd)
+            self.match_source = "existing"
         else:
-            match = [x["item"] for x in mapping if x["nature_id"] == nature_id]
+            match = mapping.get(nature_id)
             if not match:
                 print("{} has no WD match.".format(self.raw_data["NAMN"]))
             else:
-                self.associate_wd_item(match[0])
+                self.associate_wd_item(match)
+                self.match_source = "mapping"
 
     def add_statement(self, prop_name, value, quals=None, ref=None):
         """
@@ -290,8 +344,9 @@ class NatureArea(WikidataItem):
         :return: an add_statement function with the correct source set
                  as default depending on the type of the area.
         """
-        if self.raw_data["SKYDDSTYP"] == "Nationalpark":
-            source = self.sources["np"]
-        elif self.raw_data["SKYDDSTYP"] == "Naturreservat":
-            source = self.sources["nr"]
+        if self.sources is None:
+            self.create_sources()
+        dataset = datasets.get_dataset_by_protection_type(
+            self.raw_data["SKYDDSTYP"])
+        source = self.sources.get(dataset.code) if dataset else None
         return super().add_statement(prop_name, value, quals, source)
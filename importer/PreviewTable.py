@@ -15,7 +15,6 @@ The preview includes:
 Example:
 https://www.wikidata.org/w/index.php?title=User:Alicia_Fagerving_(WMSE)/sandbox3&oldid=480712165
 """
-import pywikibot
 import importer_utils as utils
 
 
@@ -24,6 +23,7 @@ class PreviewTable(object):
 
     def itis_to_string(self, itis):
         """Represent the target of the statement in readable form."""
+        import pywikibot
         if isinstance(itis, pywikibot.page.ItemPage):
             target_item = utils.wd_template("Q", itis.getID())
         elif isinstance(itis, pywikibot.WbQuantity):
@@ -32,6 +32,8 @@ class PreviewTable(object):
             target_item = "{} {}".format(amount, unit)
         elif isinstance(itis, pywikibot.WbTime):
             target_item = itis.toTimestr()
+        elif isinstance(itis, pywikibot.Coordinate):
+            target_item = "{}, {}".format(itis.lat, itis.lon)
         else:
             target_item = str(itis)
         return target_item
@@ -67,6 +69,10 @@ class PreviewTable(object):
                 self.make_text_bold("Possible item"), possible_item)
         else:
             table += "{} : \n\n".format(self.make_text_bold("Possible item"))
+        if self.problem_report:
+            table += self.make_text_bold("Problems") + "\n\n"
+            for problem, detail in sorted(self.problem_report.items()):
+                table += "* {} : {}\n\n".format(problem, detail)
         table_head = "{| class='wikitable'\n|-\n! Property\n! Value\n! Qualifiers\n! References\n"
         table += table_head
         statements = self.wd_item["statements"]
@@ -110,3 +116,4 @@ class PreviewTable(object):
         """
         self.wd_item = WD_object.wd_item
         self.raw_data = WD_object.raw_data
+        self.problem_report = WD_object.problem_report
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive throttling of uploads to Wikidata.
+
+Uploads get slots from the throttle. A slot is given when
+fewer than the allowed number of uploads are running and
+enough time has passed since the last slot was given.
+Both the interval between slots and the number of
+concurrent uploads adapt to how the servers are doing:
+
+* the replication lag (the value checked by maxlag)
+  is polled regularly; if it's above the target,
+  uploads slow down, and if the server sends a Retry-After,
+  no slots are given until it has passed,
+* failing uploads slow things down in the same way,
+* while the lag is low and nothing fails, the interval
+  shrinks step by step, and once it's at the minimum,
+  more concurrent uploads are allowed.
+
+This is additive increase / multiplicative decrease, like
+TCP congestion control. The per-edit throttle of pywikibot
+(put_throttle in user-config.py) still applies on top of this.
+
+The lag is checked with the User-Agent of the importer,
+as Wikimedia's User-Agent policy asks, see wdqs.USER_AGENT.
+
+The current state is available as metrics().
+"""
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+
+import requests
+
+import wdqs
+
+LAG_TIMEOUT = 10
+# Seconds above the minimum interval that count as reaching it,
+# so that the interval gets there even when the minimum is 0.
+INTERVAL_TOLERANCE = 0.05
+
+
+class UploadThrottle(object):
+    """Give out upload slots at a rate adapted to server load."""
+
+    def __init__(self, site=None, min_interval=1.0, max_interval=120.0,
+                 start_interval=5.0, max_workers=4, target_lag=5.0,
+                 lag_check_interval=30.0, error_window=20):
+        """
+        Initialize the throttle.
+
+        :param site: site to check the lag of; if None, only
+                     errors are used to adapt
+        :param min_interval: shortest time between slots, seconds
+        :param max_interval: longest time between slots, seconds
+        :param start_interval: time between slots at the start
+        :param max_workers: most concurrent uploads allowed
+        :param target_lag: lag in seconds above which we slow down,
+                           the same as maxlag
+        :param lag_check_interval: how often to check the lag, seconds
+        :param error_window: number of recent uploads used
+                             to compute the error rate
+        """
+        self.site = site
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = wdqs.USER_AGENT
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = max(min_interval, min(start_interval, max_interval))
+        self.max_workers = max_workers
+        self.workers = 1
+        self.peak_workers = 1
+        self.target_lag = target_lag
+        self.lag_check_interval = lag_check_interval
+        self.condition = threading.Condition()
+        self.active = 0
+        self.peak_active = 0
+        self.next_slot = 0.0
+        self.backoff_until = 0.0
+        self.lag = None
+        self.last_lag_check = None
+        self.checking_lag = False
+        self.started = time.time()
+        self.uploads = 0
+        self.errors = 0
+        self.recent = deque(maxlen=error_window)
+
+    def get_api_url(self):
+        """Get the url of the API of the site."""
+        return "{}://{}{}".format(self.site.protocol(),
+                                  self.site.hostname(),
+                                  self.site.apipath())
+
+    def fetch_lag(self):
+        """
+        Get the current lag of the site.
+
+        A request with maxlag=-1 always fails with a maxlag
+        error, which contains the current lag and a Retry-After.
+
+        :return: tuple (lag in seconds, retry after in seconds),
+                 either can be None if not available
+        """
+        response = self.session.get(self.get_api_url(),
+                                    params={"action": "query",
+                                            "format": "json",
+                                            "maxlag": -1},
+                                    timeout=LAG_TIMEOUT)
+        lag = response.json().get("error", {}).get("lag")
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            retry_after = int(retry_after)
+        else:
+            retry_after = None
+        return (lag, retry_after)
+
+    def check_lag(self):
+        """Check the lag, if it's time to, and adapt to it."""
+        if self.site is None:
+            return
+        now = time.time()
+        with self.condition:
+            if self.checking_lag or (
+                    self.last_lag_check is not None and
+                    now - self.last_lag_check < self.lag_check_interval):
+                return
+            self.checking_lag = True
+        try:
+            lag, retry_after = self.fetch_lag()
+        except (requests.RequestException, ValueError) as error:
+            print("Could not check lag: {}".format(error))
+            lag, retry_after = (None, None)
+        with self.condition:
+            self.checking_lag = False
+            self.last_lag_check = time.time()
+            self.lag = lag
+            if lag is not None and lag > self.target_lag:
+                self.slow_down(retry_after or lag)
+            self.condition.notify_all()
+
+    def slow_down(self, pause=None):
+        """
+        Halve the speed, and optionally pause.
+
+        Must be called with the condition held.
+
+        :param pause: seconds during which no slots are given
+        """
+        self.interval = min(self.max_interval, self.interval * 2)
+        self.workers = max(1, self.workers // 2)
+        if pause:
+            self.backoff_until = max(self.backoff_until, time.time() + pause)
+
+    def speed_up(self):
+        """
+        Speed up one step, if the servers are doing fine.
+
+        Must be called with the condition held.
+        """
+        if self.lag is not None and self.lag > self.target_lag / 2:
+            return
+        if self.recent and not all(self.recent):
+            return
+        if self.interval > self.min_interval:
+            step = max(self.min_interval / 2, self.interval * 0.1)
+            if self.interval - step <= self.min_interval + INTERVAL_TOLERANCE:
+                self.interval = self.min_interval
+            else:
+                self.interval -= step
+        elif self.workers < self.max_workers:
+            self.workers += 1
+            self.peak_workers = max(self.peak_workers, self.workers)
+
+    def acquire(self):
+        """Wait for a slot."""
+        self.check_lag()
+        with self.condition:
+            while True:
+                now = time.time()
+                start = max(self.next_slot, self.backoff_until)
+                if self.active < self.workers and now >= start:
+                    break
+                wait = start - now if now < start else None
+                self.condition.wait(wait)
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            self.next_slot = now + self.interval
+
+    def release(self, error=None):
+        """
+        Give back a slot, and adapt to how the upload went.
+
+        :param error: the exception the upload failed with, if any
+        """
+        with self.condition:
+            self.active -= 1
+            self.uploads += 1
+            self.recent.append(error is None)
+            if error is None:
+                self.speed_up()
+            else:
+                self.errors += 1
+                self.slow_down(self.interval)
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Wait for a slot, and give it back when the upload is done."""
+        self.acquire()
+        try:
+            yield
+        except Exception as error:
+            self.release(error)
+            raise
+        else:
+            self.release()
+
+    def is_failing(self):
+        """Check if every one of the recent uploads failed."""
+        with self.condition:
+            return (len(self.recent) == self.recent.maxlen and
+                    not any(self.recent))
+
+    def metrics(self):
+        """Get the current state of the throttle."""
+        with self.condition:
+            elapsed = time.time() - self.started
+            failed = len(self.recent) - sum(self.recent)
+            return {
+                "uploads": self.uploads,
+                "errors": self.errors,
+                "error_rate": (failed / len(self.recent)
+                               if self.recent else 0.0),
+                "interval": self.interval,
+                "uploads_per_minute": (60 / self.interval
+                                       if self.interval else None),
+                "actual_uploads_per_minute": (self.uploads * 60 / elapsed
+                                              if elapsed else 0.0),
+                "workers": self.workers,
+                "peak_workers": self.peak_workers,
+                "active": self.active,
+                "peak_active": self.peak_active,
+                "lag": self.lag,
+                "backoff_remaining": max(0.0,
+                                         self.backoff_until - time.time()),
+            }
+
+    def print_metrics(self):
+        """Print the current state of the throttle."""
+        metrics = self.metrics()
+        print("Throttle: {interval:.1f} s between uploads, "
+              "{workers} workers, lag {lag}, "
+              "{uploads} uploads, {errors} errors, "
+              "backoff {backoff_remaining:.0f} s".format(**metrics))
@@ -1,15 +1,8 @@
 # -*- coding: utf-8 -*-
 """Upload a WikidataItem to Wikidata."""
-from os import path
+from collections import OrderedDict
 
-from wikidataStuff.WikidataStuff import WikidataStuff as WDS
-import pywikibot
-
-import importer_utils as utils
-
-
-MAPPING_DIR = "data"
-PROPS = utils.load_json(path.join(MAPPING_DIR, "properties.json"))
+import api_costs
 
 SUMMARY_TEST = "nature test"
 
@@ -33,8 +26,9 @@ class Uploader(object):
             label_content = label['value']
             language = label['language']
             labels_for_upload[language] = label_content
-        self.wdstuff.add_multiple_label_or_alias(
-            labels_for_upload, target_item)
+        with api_costs.phase("labels"):
+            self.wdstuff.add_multiple_label_or_alias(
+                labels_for_upload, target_item)
 
     def add_descriptions(self, target_item, descriptions):
         """Add descriptions to the item."""
@@ -43,37 +37,115 @@ class Uploader(object):
             desc_content = description['value']
             lang = description['language']
             descriptions_for_upload[lang] = desc_content
-        self.wdstuff.add_multiple_descriptions(
-            descriptions_for_upload, target_item)
+        with api_costs.phase("descriptions"):
+            self.wdstuff.add_multiple_descriptions(
+                descriptions_for_upload, target_item)
 
     def add_claims(self, wd_item, claims):
         """Add claims to the item."""
         if wd_item:
             for claim in claims:
-                wd_item.get()
                 prop = claim["prop"]
                 value = claim["value"]
                 ref = claim["ref"]
-                self.wdstuff.addNewClaim(prop, value, wd_item, ref)
+                with api_costs.phase("claim {}".format(prop)):
+                    wd_item.get()
+                    self.wdstuff.addNewClaim(prop, value, wd_item, ref)
+
+    def make_claim_json(self, claim):
+        """
+        Convert a claim of the data object to Wikibase JSON.
+
+        The JSON includes the qualifiers and the reference
+        of the claim, so it can be sent as part of
+        a new item.
+        """
+        import pywikibot
+        statement = claim["value"]
+        wd_claim = pywikibot.Claim(self.repo, claim["prop"])
+        if statement.special:
+            wd_claim.setSnakType(statement.itis)
+        else:
+            wd_claim.setTarget(statement.itis)
+        for qual in statement.quals:
+            wd_qual = pywikibot.Claim(self.repo, qual.prop, is_qualifier=True)
+            wd_qual.setTarget(qual.itis)
+            wd_claim.qualifiers.setdefault(qual.prop, []).append(wd_qual)
+        ref = claim["ref"]
+        if ref:
+            source = OrderedDict()
+            for part in ref.source_test + ref.source_notest:
+                wd_ref = pywikibot.Claim(
+                    self.repo, part.getID(), is_reference=True)
+                wd_ref.setTarget(part.getTarget())
+                source.setdefault(part.getID(), []).append(wd_ref)
+            wd_claim.sources.append(source)
+        return wd_claim.toJSON()
+
+    def make_item_data(self):
+        """Get all the content of the data object as Wikibase JSON."""
+        labels = {}
+        for label in self.data["labels"]:
+            language = label['language']
+            labels[language] = {"language": language,
+                                "value": label['value']}
+        descriptions = {}
+        for description in self.data["descriptions"]:
+            language = description['language']
+            descriptions[language] = {"language": language,
+                                      "value": description['value']}
+        claims = [self.make_claim_json(x) for x in self.data["statements"]]
+        return {"labels": labels,
+                "descriptions": descriptions,
+                "claims": claims}
 
     def create_new_item(self):
-        """Create a new WD item and return it."""
-        return self.wdstuff.make_new_item({}, self.summary)
+        """
+        Create a new WD item with all its content and return it.
+
+        Labels, descriptions, claims, qualifiers and references
+        are all sent in a single edit.
+        """
+        data = self.make_item_data()
+        with api_costs.phase("create"):
+            return self.wdstuff.make_new_item(data, self.summary)
 
     def get_username(self):
-        """Get Wikidata login that will be used to upload."""
-        return pywikibot.config.usernames["wikidata"]["wikidata"]
+        """Get the login that will be used to upload to the repo."""
+        import pywikibot
+        family = self.repo.family.name
+        return pywikibot.config.usernames[family][self.repo.code]
+
+    def prefetch(self):
+        """
+        Load the content of the item to be edited, ahead of the upload.
+
+        Only done in live mode: in the sandbox, every upload
+        edits the same item, so its content would be outdated
+        by the time it's uploaded to.
+        """
+        if self.live and self.data["upload"] is not False and self.wd_item:
+            with api_costs.phase("prefetch"):
+                self.wd_item.get()
 
     def upload(self):
         """Upload a single WD item, or enrich an already existing one."""
         if self.data["upload"] is False:
             print("SKIPPING ITEM")
             return
+        if self.wd_item is None:
+            self.wd_item = self.create_new_item()
+            self.wd_item_q = self.wd_item.getID()
+            self.created = True
+            print("Created new item: {}".format(self.wd_item_q))
+            return
         labels = self.data["labels"]
         descriptions = self.data["descriptions"]
         claims = self.data["statements"]
-        self.add_labels(self.wd_item, labels)
-        self.add_descriptions(self.wd_item, descriptions)
+        if labels:
+            self.add_labels(self.wd_item, labels)
+        if descriptions:
+            self.add_descriptions(self.wd_item, descriptions)
         self.add_claims(self.wd_item, claims)
 
     def set_wd_item(self):
@@ -81,13 +153,14 @@ class Uploader(object):
         Determine WD item to manipulate.
 
         In live mode, if data object has associated WD item,
-        edit it. Otherwise, create a new WD item.
+        edit it. Otherwise, a new WD item will be created
+        when uploading.
         In sandbox mode, all edits are done on the WD Sandbox item.
         """
         if self.live:
             if self.data["wd-item"] is None:
-                self.wd_item = self.create_new_item()
-                self.wd_item_q = self.wd_item.getID()
+                self.wd_item = None
+                self.wd_item_q = None
             else:
                 item_q = self.data["wd-item"]
                 self.wd_item = self.wdstuff.QtoItemPage(item_q)
@@ -120,5 +193,7 @@ class Uploader(object):
         print("Edit summary: {}".format(self.summary))
         print("---------------")
         self.data = data_object.wd_item
+        self.created = False
+        from wikidataStuff.WikidataStuff import WikidataStuff as WDS
         self.wdstuff = WDS(self.repo, edit_summary=self.summary)
         self.set_wd_item()
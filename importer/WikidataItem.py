@@ -12,11 +12,10 @@ The purpose of it is to serve as a base for a
 data-specific object that will turn some data
 into Wikidata objects. It can then be uploaded
 to Wikidata using the uploader script.
-"""
-from wikidataStuff.WikidataStuff import WikidataStuff as WDS
-from wikidataStuff import helpers as helpers
-import pywikibot
 
+pywikibot and wikidataStuff are imported when the first
+object is created, so that importing this module is cheap.
+"""
 import importer_utils as utils
 
 DATA_DIR = "data"
@@ -38,6 +37,7 @@ class WikidataItem(object):
         :param existing: WD items that already have an unique id
         :type existing: dictionary
         """
+        from wikidataStuff.WikidataStuff import WikidataStuff as WDS
         self.repo = repository
         self.existing = existing
         self.wdstuff = WDS(self.repo)
@@ -67,6 +67,8 @@ class WikidataItem(object):
         * a string (value is string)
         * an item (value is Q-string)
         * an amount with or without unit (value is dic)
+        * a date (value is dic)
+        * a coordinate (value is dic)
 
         :param value: the content of the item
         :type value: it can be a string or
@@ -76,6 +78,7 @@ class WikidataItem(object):
                  by the input data, either ItemPage or Quantity
                  or string.
         """
+        import pywikibot
         val_item = None
         if isinstance(value, list) and len(value) == 1:
             value = value[0]
@@ -96,6 +99,13 @@ class WikidataItem(object):
             val_item = pywikibot.WbTime(year=date_dict["year"],
                                         month=date_dict["month"],
                                         day=date_dict["day"])
+        elif isinstance(value, dict) and 'coordinate_value' in value:
+            coordinate = value["coordinate_value"]
+            val_item = pywikibot.Coordinate(
+                lat=coordinate["latitude"],
+                lon=coordinate["longitude"],
+                precision=coordinate["precision"],
+                site=self.repo)
         elif value == "novalue":
             #  raise NotImplementedError
             #  implement Error
@@ -150,6 +160,7 @@ class WikidataItem(object):
         :param ref: reference item
         :type ref: a wikidatastuff Reference item
         """
+        from wikidataStuff import helpers
         base = self.wd_item["statements"]
         prop = self.props[prop_name]
         if quals is None:
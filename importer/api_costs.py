@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Measure what uploading every item costs in API traffic.
+
+All HTTP requests (pywikibot's included, since it uses
+requests under the hood) are counted once install() has
+been called: reads, writes, bytes sent and received,
+and time spent. They are attributed to the item and
+the phase (labels, descriptions, a claim, creation...)
+that is being worked on in the current thread:
+
+    with api_costs.item("2000283", "nr", new=False):
+        with api_costs.phase("labels"):
+            ...
+
+The ledger then produces a report with totals and
+percentiles per item and per phase, broken down by dataset
+and by new vs existing items. The reports of several
+shards can be combined with merge_reports.
+"""
+from contextlib import contextmanager
+import threading
+import time
+from urllib.parse import parse_qs
+
+import requests
+
+WRITE_ACTIONS = ["wbeditentity", "wbcreateclaim", "wbsetclaim",
+                 "wbsetclaimvalue", "wbremoveclaims", "wbsetlabel",
+                 "wbsetdescription", "wbsetaliases", "wbsetreference",
+                 "wbremovereferences", "wbsetqualifier",
+                 "wbremovequalifiers", "wbmergeitems", "edit"]
+PERCENTILES = [50, 90, 99]
+COUNTERS = ["reads", "writes", "bytes"]
+
+local = threading.local()
+ledger = None
+original_request = None
+
+
+def percentile(values, percent):
+    """
+    Get a percentile of a list of numbers, nearest-rank method.
+
+    :return: the value, or None for an empty list
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-percent * len(ordered) // 100)))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    """Get total, count and percentiles of a list of numbers."""
+    summary = {"total": sum(values), "count": len(values)}
+    for percent in PERCENTILES:
+        summary["p{}".format(percent)] = percentile(values, percent)
+    return summary
+
+
+def merge_summaries(summaries):
+    """
+    Combine summaries of the same numbers from several reports.
+
+    Totals and counts are added up. The percentiles can't be
+    recomputed without the numbers themselves, so they're None.
+    """
+    merged = {"total": sum(x["total"] for x in summaries),
+              "count": sum(x["count"] for x in summaries)}
+    for percent in PERCENTILES:
+        merged["p{}".format(percent)] = None
+    return merged
+
+
+def summarize_totals(totals, summaries):
+    """
+    Summarize a group of items from the reports of several runs.
+
+    :param totals: the totals of every item in the group,
+                   as in the "items" of a report
+    :param summaries: the summaries of the group in the reports,
+                      see CostLedger.summarize_items
+    """
+    summary = {"items": len(totals)}
+    for counter in COUNTERS + ["seconds"]:
+        summary[counter] = summarize([x[counter] for x in totals])
+    phases = {}
+    for group in summaries:
+        for name, counts in group["phases"].items():
+            phases.setdefault(name, []).append(counts)
+    summary["phases"] = {
+        name: {counter: merge_summaries([x[counter] for x in occurrences])
+               for counter in COUNTERS + ["seconds"]}
+        for name, occurrences in phases.items()}
+    return summary
+
+
+def merge_reports(reports):
+    """
+    Combine the cost reports of several runs, e.g. of the shards.
+
+    The summaries of the items are recomputed from their totals.
+    Only the totals of the phases are kept, see merge_summaries.
+
+    :param reports: reports made by CostLedger.make_report
+    :return: a report in the same format
+    """
+    totals = [x for report in reports for x in report["items"]]
+    unattributed = new_counts()
+    for report in reports:
+        for key, value in report["unattributed"].items():
+            unattributed[key] += value
+    merged = {"all": summarize_totals(totals,
+                                      [x["all"] for x in reports]),
+              "unattributed": unattributed,
+              "items": totals}
+    groupings = [("by_dataset", lambda x: x["dataset"]),
+                 ("by_status",
+                  lambda x: "new" if x["new"] else "existing")]
+    for grouping, get_group in groupings:
+        merged[grouping] = {}
+        for report in reports:
+            for group in report[grouping]:
+                if group in merged[grouping]:
+                    continue
+                merged[grouping][group] = summarize_totals(
+                    [x for x in totals if get_group(x) == group],
+                    [x[grouping][group] for x in reports
+                     if group in x[grouping]])
+    return merged
+
+
+def get_action(kwargs):
+    """Get the API action of a request, from its parameters or data."""
+    for key in ["params", "data"]:
+        content = kwargs.get(key)
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "replace")
+        if isinstance(content, str):
+            content = {k: v[0] for k, v in parse_qs(content).items()}
+        if isinstance(content, dict) and "action" in content:
+            return content["action"]
+
+
+def get_sent_bytes(kwargs):
+    """Estimate the size of the body and parameters of a request."""
+    size = 0
+    for key in ["params", "data"]:
+        content = kwargs.get(key)
+        if isinstance(content, (bytes, str)):
+            size += len(content)
+        elif isinstance(content, dict):
+            size += sum(len(str(k)) + len(str(v)) + 2
+                        for k, v in content.items())
+    return size
+
+
+def get_received_bytes(response, streamed):
+    """
+    Get the size of the body of a response.
+
+    Streamed responses are not read here, so the
+    Content-Length header is used for them.
+    """
+    if streamed:
+        return int(response.headers.get("Content-Length") or 0)
+    return len(response.content)
+
+
+def metered_request(session, method, url, **kwargs):
+    """Send a request through requests, counting it in the ledger."""
+    start = time.time()
+    response = original_request(session, method, url, **kwargs)
+    if ledger is not None:
+        action = get_action(kwargs)
+        is_write = method.upper() == "POST" and action in WRITE_ACTIONS
+        size = (get_sent_bytes(kwargs) +
+                get_received_bytes(response, kwargs.get("stream")))
+        ledger.count(is_write, size, time.time() - start)
+    return response
+
+
+def install(new_ledger):
+    """
+    Start counting all HTTP requests in a ledger.
+
+    :param new_ledger: the CostLedger to count in
+    """
+    global ledger, original_request
+    ledger = new_ledger
+    if original_request is None:
+        original_request = requests.Session.request
+        requests.Session.request = metered_request
+
+
+def new_counts():
+    """Create empty counters."""
+    return {"reads": 0, "writes": 0, "bytes": 0, "seconds": 0.0}
+
+
+def new_record(key, dataset, new):
+    """
+    Create the record of an item.
+
+    :param key: identifier of the item, e.g. the nature ID
+    :param dataset: short name of the dataset, e.g. "nr"
+    :param new: whether the item is created rather than edited
+    """
+    return {"item": key, "dataset": dataset, "new": new,
+            "totals": new_counts(), "phases": []}
+
+
+@contextmanager
+def counting(record):
+    """
+    Attribute the requests made in this thread to the record of an item.
+
+    A record can be counted in several times, also from
+    different threads, e.g. when the item is fetched by one
+    stage of a pipeline and edited by the next. It's only
+    added to the ledger by finish().
+    """
+    if ledger is None:
+        yield
+        return
+    local.item = record
+    start = time.time()
+    try:
+        yield
+    finally:
+        record["totals"]["seconds"] += time.time() - start
+        local.item = None
+
+
+def finish(record):
+    """Add the record of an item to the ledger, once it's done."""
+    if ledger is not None:
+        ledger.add(record)
+
+
+@contextmanager
+def item(key, dataset, new):
+    """
+    Attribute the requests made in this thread to an item.
+
+    :param key: identifier of the item, e.g. the nature ID
+    :param dataset: short name of the dataset, e.g. "nr"
+    :param new: whether the item is created rather than edited
+    """
+    record = new_record(key, dataset, new)
+    try:
+        with counting(record):
+            yield
+    finally:
+        finish(record)
+
+
+@contextmanager
+def phase(name):
+    """
+    Attribute the requests made in this thread to a phase of the item.
+
+    :param name: e.g. "labels" or "claim P31"
+    """
+    record = getattr(local, "item", None)
+    if ledger is None or record is None:
+        yield
+        return
+    counts = new_counts()
+    counts["phase"] = name
+    local.phase = counts
+    start = time.time()
+    try:
+        yield
+    finally:
+        counts["seconds"] = time.time() - start
+        local.phase = None
+        record["phases"].append(counts)
+
+
+class CostLedger(object):
+    """Collect the API costs of uploaded items."""
+
+    def __init__(self):
+        """Initialize an empty ledger."""
+        self.lock = threading.Lock()
+        self.items = []
+        self.unattributed = new_counts()
+
+    def count(self, is_write, size, seconds):
+        """
+        Count a request made in the current thread.
+
+        :param is_write: whether it was an edit
+        :param size: bytes sent and received
+        :param seconds: time the request took
+        """
+        key = "writes" if is_write else "reads"
+        record = getattr(local, "item", None)
+        with self.lock:
+            targets = [self.unattributed]
+            if record is not None:
+                targets = [record["totals"]]
+                if getattr(local, "phase", None) is not None:
+                    targets.append(local.phase)
+            for target in targets:
+                target[key] += 1
+                target["bytes"] += size
+            if record is None:
+                self.unattributed["seconds"] += seconds
+
+    def add(self, record):
+        """Add the record of a finished item."""
+        with self.lock:
+            self.items.append(record)
+
+    def summarize_items(self, records):
+        """Summarize the totals and phases of a group of item records."""
+        summary = {"items": len(records)}
+        for counter in COUNTERS + ["seconds"]:
+            summary[counter] = summarize(
+                [x["totals"][counter] for x in records])
+        phases = {}
+        for record in records:
+            for counts in record["phases"]:
+                phases.setdefault(counts["phase"], []).append(counts)
+        summary["phases"] = {}
+        for name, occurrences in phases.items():
+            summary["phases"][name] = {
+                counter: summarize([x[counter] for x in occurrences])
+                for counter in COUNTERS + ["seconds"]}
+        return summary
+
+    def make_report(self):
+        """
+        Create the report of the run.
+
+        :return: dictionary with the summary of all items,
+                 summaries by dataset and by new/existing,
+                 the requests that were not made for an item,
+                 and the totals of every single item
+        """
+        with self.lock:
+            records = list(self.items)
+            unattributed = dict(self.unattributed)
+        by_dataset = {}
+        by_status = {}
+        for record in records:
+            by_dataset.setdefault(record["dataset"], []).append(record)
+            status = "new" if record["new"] else "existing"
+            by_status.setdefault(status, []).append(record)
+        return {
+            "all": self.summarize_items(records),
+            "by_dataset": {k: self.summarize_items(v)
+                           for k, v in by_dataset.items()},
+            "by_status": {k: self.summarize_items(v)
+                          for k, v in by_status.items()},
+            "unattributed": unattributed,
+            "items": [dict(x["totals"], item=x["item"],
+                           dataset=x["dataset"], new=x["new"])
+                      for x in records],
+        }
+
+    def print_summary(self):
+        """Print the totals of the run."""
+        summary = self.make_report()["all"]
+        if not summary["items"]:
+            return
+        print("API costs of {} items: {} reads, {} writes, {} bytes, "
+              "median {:.2f} s per item.".format(
+                  summary["items"], summary["reads"]["total"],
+                  summary["writes"]["total"], summary["bytes"]["total"],
+                  summary["seconds"]["p50"]))
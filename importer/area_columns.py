@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar loading and bulk validation of nature area source data.
+
+The numeric and date columns of the source file are parsed
+in one pass into typed columns (one array per column),
+which are then validated together. This way malformed values
+are reported, with the NVRID of the offending rows,
+before any NatureArea is built and long before anything
+reaches Wikidata.
+
+The checks are:
+* area values that are not numbers,
+* negative area values,
+* area parts that don't add up to the total area
+  (land + water = total, woods <= land),
+* inception dates that can't be parsed.
+"""
+from array import array
+import datetime
+import math
+
+AREA_TOTAL = "AREA_HA"
+AREA_PARTS = ["SKOG_HA", "LAND_HA", "VATTEN_HA"]
+AREA_COLUMNS = [AREA_TOTAL] + AREA_PARTS
+DATE_COLUMN = "URSBESLDAT"
+DATE_SLICE = slice(1, 11)
+DATE_FORMAT = "%Y-%m-%d"
+
+# Absolute (hectares) and relative tolerance when comparing sums,
+# the source values are rounded.
+AREA_TOLERANCE_HA = 0.5
+AREA_TOLERANCE_REL = 0.01
+
+
+def parse_number(text):
+    """
+    Parse an area value.
+
+    :param text: raw value from the source file
+    :return: the value as float, or NaN if it can't be parsed
+    """
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def parse_date(text):
+    """
+    Parse an inception date the same way NatureArea does.
+
+    :param text: raw URSBESLDAT value from the source file
+    :return: a date object, or None if it can't be parsed
+    """
+    try:
+        return datetime.datetime.strptime(
+            text[DATE_SLICE], DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def load_area_columns(nature_dataset):
+    """
+    Parse the numeric and date columns of the dataset in one pass.
+
+    :param nature_dataset: list of rows from the source file
+    :return: dictionary of column name -> column, where area
+             columns are arrays of floats (NaN for unparseable
+             values) and the date column is a list of dates
+             (None for unparseable values)
+    """
+    columns = {"NVRID": []}
+    for column in AREA_COLUMNS:
+        columns[column] = array("d")
+    columns[DATE_COLUMN] = []
+    for row in nature_dataset:
+        columns["NVRID"].append(row["NVRID"])
+        for column in AREA_COLUMNS:
+            columns[column].append(parse_number(row.get(column)))
+        columns[DATE_COLUMN].append(parse_date(row.get(DATE_COLUMN)))
+    return columns
+
+
+def sums_differ(total, parts_sum):
+    """Check if a sum of parts is outside the tolerance of the total."""
+    tolerance = max(AREA_TOLERANCE_HA, abs(total) * AREA_TOLERANCE_REL)
+    return abs(total - parts_sum) > tolerance
+
+
+def validate_area_columns(columns):
+    """
+    Validate parsed columns in bulk.
+
+    A row without any breakdown (all parts zero) is not
+    checked against its total.
+
+    :param columns: output of load_area_columns
+    :return: dictionary of problem -> list of NVRIDs, only
+             containing problems that actually occur
+    """
+    problems = {}
+    nature_ids = columns["NVRID"]
+    total = columns[AREA_TOTAL]
+    woods = columns["SKOG_HA"]
+    land = columns["LAND_HA"]
+    water = columns["VATTEN_HA"]
+
+    for column in AREA_COLUMNS:
+        values = columns[column]
+        not_number = [nature_ids[i] for i, x in enumerate(values)
+                      if math.isnan(x)]
+        negative = [nature_ids[i] for i, x in enumerate(values) if x < 0]
+        if not_number:
+            problems["{} is not a number".format(column)] = not_number
+        if negative:
+            problems["{} is negative".format(column)] = negative
+
+    parts_mismatch = []
+    woods_mismatch = []
+    for i, nature_id in enumerate(nature_ids):
+        if land[i] == 0 and water[i] == 0 and woods[i] == 0:
+            continue
+        if sums_differ(total[i], land[i] + water[i]):
+            parts_mismatch.append(nature_id)
+        if woods[i] > land[i] and sums_differ(land[i], woods[i]):
+            woods_mismatch.append(nature_id)
+    if parts_mismatch:
+        problems["LAND_HA + VATTEN_HA differs from AREA_HA"] = parts_mismatch
+    if woods_mismatch:
+        problems["SKOG_HA is larger than LAND_HA"] = woods_mismatch
+
+    bad_dates = [nature_ids[i] for i, x in enumerate(columns[DATE_COLUMN])
+                 if x is None]
+    if bad_dates:
+        problems["{} is not a date".format(DATE_COLUMN)] = bad_dates
+    return problems
@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+"""
+Derive point coordinates of nature areas from polygon data.
+
+The input is a newline-delimited GeoJSON file (GeoJSONSeq,
+as produced by `ogr2ogr -f GeoJSONSeq`) with one polygon
+or multipolygon feature per line and the nature ID in the
+NVRID property. The file is read one feature at a time,
+so only a single (multi)polygon is ever held in memory,
+and every ring is reduced to running sums in one sweep.
+
+For every area we compute:
+* a bounding box, in the coordinate system of the file,
+* a representative point, in WGS84, that is guaranteed
+  to lie inside the area: the area-weighted centroid
+  if that is inside, otherwise the middle of the widest
+  horizontal section of the largest polygon through it.
+
+Coordinates are either WGS84 longitude/latitude or
+SWEREF99 TM (EPSG:3006), which is what Naturvårdsverket
+uses. The latter is detected automatically and converted.
+
+PolygonIndex finds which of many polygons (e.g. all the
+municipalities) contain a point, using a grid so that
+most points are found without testing any polygon.
+"""
+from bisect import bisect_left
+import json
+import math
+
+COORDINATE_PRECISION = 0.0001
+RECORD_SEPARATOR = "\x1e"
+GRID_CELLS = 256
+
+# GRS80 ellipsoid and SWEREF99 TM projection parameters.
+GRS80_AXIS = 6378137.0
+GRS80_FLATTENING = 1 / 298.257222101
+SWEREF99TM_MERIDIAN = 15.0
+SWEREF99TM_SCALE = 0.9996
+SWEREF99TM_FALSE_EASTING = 500000.0
+SWEREF99TM_FALSE_NORTHING = 0.0
+
+
+def sweref99tm_to_wgs84(easting, northing):
+    """
+    Convert SWEREF99 TM coordinates to WGS84.
+
+    Uses the Gauss-Krüger formulas published by Lantmäteriet,
+    which are accurate to well below a millimetre in Sweden.
+
+    :return: tuple (latitude, longitude) in degrees
+    """
+    flattening = GRS80_FLATTENING
+    e2 = flattening * (2 - flattening)
+    n = flattening / (2 - flattening)
+    a_roof = GRS80_AXIS / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+    delta = [n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96 - n ** 4 / 360,
+             n ** 2 / 48 + n ** 3 / 15 - 437 * n ** 4 / 1440,
+             17 * n ** 3 / 480 - 37 * n ** 4 / 840,
+             4397 * n ** 4 / 161280]
+    a_star = e2 + e2 ** 2 + e2 ** 3 + e2 ** 4
+    b_star = -(7 * e2 ** 2 + 17 * e2 ** 3 + 30 * e2 ** 4) / 6
+    c_star = (224 * e2 ** 3 + 889 * e2 ** 4) / 120
+    d_star = -(4279 * e2 ** 4) / 1260
+
+    xi = ((northing - SWEREF99TM_FALSE_NORTHING) /
+          (SWEREF99TM_SCALE * a_roof))
+    eta = ((easting - SWEREF99TM_FALSE_EASTING) /
+           (SWEREF99TM_SCALE * a_roof))
+    xi_prim = xi
+    eta_prim = eta
+    for i, d in enumerate(delta, start=1):
+        xi_prim -= d * math.sin(2 * i * xi) * math.cosh(2 * i * eta)
+        eta_prim -= d * math.cos(2 * i * xi) * math.sinh(2 * i * eta)
+    phi_star = math.asin(math.sin(xi_prim) / math.cosh(eta_prim))
+    delta_lambda = math.atan(math.sinh(eta_prim) / math.cos(xi_prim))
+    sin_phi = math.sin(phi_star)
+    latitude = phi_star + sin_phi * math.cos(phi_star) * (
+        a_star + b_star * sin_phi ** 2 +
+        c_star * sin_phi ** 4 + d_star * sin_phi ** 6)
+    longitude = math.radians(SWEREF99TM_MERIDIAN) + delta_lambda
+    return (math.degrees(latitude), math.degrees(longitude))
+
+
+def wgs84_to_sweref99tm(latitude, longitude):
+    """
+    Convert WGS84 coordinates to SWEREF99 TM.
+
+    The inverse of sweref99tm_to_wgs84, using the same
+    Gauss-Krüger formulas.
+
+    :return: tuple (easting, northing) in metres
+    """
+    flattening = GRS80_FLATTENING
+    e2 = flattening * (2 - flattening)
+    n = flattening / (2 - flattening)
+    a_roof = GRS80_AXIS / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64)
+    beta = [n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16 + 41 * n ** 4 / 180,
+            13 * n ** 2 / 48 - 3 * n ** 3 / 5 + 557 * n ** 4 / 1440,
+            61 * n ** 3 / 240 - 103 * n ** 4 / 140,
+            49561 * n ** 4 / 161280]
+    a_coef = e2
+    b_coef = (5 * e2 ** 2 - e2 ** 3) / 6
+    c_coef = (104 * e2 ** 3 - 45 * e2 ** 4) / 120
+    d_coef = (1237 * e2 ** 4) / 1260
+
+    phi = math.radians(latitude)
+    delta_lambda = math.radians(longitude - SWEREF99TM_MERIDIAN)
+    sin_phi = math.sin(phi)
+    phi_star = phi - sin_phi * math.cos(phi) * (
+        a_coef + b_coef * sin_phi ** 2 +
+        c_coef * sin_phi ** 4 + d_coef * sin_phi ** 6)
+    xi_prim = math.atan2(math.tan(phi_star), math.cos(delta_lambda))
+    eta_prim = math.atanh(math.cos(phi_star) * math.sin(delta_lambda))
+    xi = xi_prim
+    eta = eta_prim
+    for i, b in enumerate(beta, start=1):
+        xi += b * math.sin(2 * i * xi_prim) * math.cosh(2 * i * eta_prim)
+        eta += b * math.cos(2 * i * xi_prim) * math.sinh(2 * i * eta_prim)
+    northing = (SWEREF99TM_SCALE * a_roof * xi +
+                SWEREF99TM_FALSE_NORTHING)
+    easting = (SWEREF99TM_SCALE * a_roof * eta +
+               SWEREF99TM_FALSE_EASTING)
+    return (easting, northing)
+
+
+def iter_features(filepath):
+    """
+    Read features from a newline-delimited GeoJSON file one by one.
+
+    Accepts both plain line-delimited GeoJSON and RFC 8142
+    sequences, where every record starts with a record separator.
+    """
+    with open(filepath, "r") as f_obj:
+        for line in f_obj:
+            line = line.strip().lstrip(RECORD_SEPARATOR)
+            if line:
+                yield json.loads(line)
+
+
+def get_polygons(geometry):
+    """Get the list of polygons (lists of rings) of a geometry."""
+    if geometry is None:
+        return []
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def ring_sums(ring):
+    """
+    Compute signed area and centroid moments of a ring in one sweep.
+
+    :return: tuple (signed area, moment x, moment y)
+    """
+    area = 0.0
+    moment_x = 0.0
+    moment_y = 0.0
+    for i in range(len(ring) - 1):
+        x0, y0 = ring[i][0], ring[i][1]
+        x1, y1 = ring[i + 1][0], ring[i + 1][1]
+        cross = x0 * y1 - x1 * y0
+        area += cross
+        moment_x += (x0 + x1) * cross
+        moment_y += (y0 + y1) * cross
+    return (area / 2, moment_x / 6, moment_y / 6)
+
+
+def point_in_polygon(x, y, polygon):
+    """Check if a point is inside a polygon (with holes), even-odd rule."""
+    inside = False
+    for ring in polygon:
+        for i in range(len(ring) - 1):
+            x0, y0 = ring[i][0], ring[i][1]
+            x1, y1 = ring[i + 1][0], ring[i + 1][1]
+            if (y0 > y) != (y1 > y):
+                if x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                    inside = not inside
+    return inside
+
+
+def widest_section_middle(polygon, y):
+    """
+    Get the middle of the widest horizontal section of a polygon at y.
+
+    :return: tuple (x, y), or None if the line misses the polygon
+    """
+    crossings = []
+    for ring in polygon:
+        for i in range(len(ring) - 1):
+            x0, y0 = ring[i][0], ring[i][1]
+            x1, y1 = ring[i + 1][0], ring[i + 1][1]
+            if (y0 > y) != (y1 > y):
+                crossings.append(x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+    crossings.sort()
+    best = None
+    for start, end in zip(crossings[0::2], crossings[1::2]):
+        if best is None or end - start > best[1] - best[0]:
+            best = (start, end)
+    if best is None:
+        return None
+    return ((best[0] + best[1]) / 2, y)
+
+
+def interior_points(geometry, size=8):
+    """
+    Get points spread evenly inside a geometry.
+
+    The points are the centres of a size x size grid over
+    the bounding box that lie inside the geometry. The edges
+    crossing every row of the grid are collected in a single
+    sweep, and a point is inside if an odd number of them
+    cross its row to the left of it.
+
+    :param geometry: GeoJSON Polygon or MultiPolygon
+    :param size: number of rows and columns of the grid
+    :return: list of (x, y) in the coordinate system of the input,
+             empty if the geometry is too thin to contain any
+    """
+    polygons = get_polygons(geometry)
+    xs = [x[0] for polygon in polygons for x in polygon[0]]
+    ys = [x[1] for polygon in polygons for x in polygon[0]]
+    if not xs:
+        return []
+    min_x, min_y = min(xs), min(ys)
+    step_x = (max(xs) - min_x) / size
+    step_y = (max(ys) - min_y) / size
+    if not step_x or not step_y:
+        return []
+    crossings = [[] for _ in range(size)]
+    for polygon in polygons:
+        for ring in polygon:
+            for i in range(len(ring) - 1):
+                x0, y0 = ring[i][0], ring[i][1]
+                x1, y1 = ring[i + 1][0], ring[i + 1][1]
+                if y0 < y1:
+                    low, high = y0, y1
+                elif y1 < y0:
+                    low, high = y1, y0
+                else:
+                    continue
+                # rows that may cross the edge, checked exactly below
+                first = int((low - min_y) / step_y - 0.5)
+                last = int((high - min_y) / step_y - 0.5)
+                for row in range(first, last + 1):
+                    y = min_y + (row + 0.5) * step_y
+                    if (y0 > y) != (y1 > y):
+                        crossings[row].append(
+                            x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+    points = []
+    for row in range(size):
+        y = min_y + (row + 0.5) * step_y
+        row_crossings = sorted(crossings[row])
+        for column in range(size):
+            x = min_x + (column + 0.5) * step_x
+            if bisect_left(row_crossings, x) % 2:
+                points.append((x, y))
+    return points
+
+
+def summarize_geometry(geometry):
+    """
+    Compute bounding box and representative point of a geometry.
+
+    Holes are subtracted regardless of ring orientation,
+    as not all exports follow the GeoJSON winding order.
+
+    :param geometry: GeoJSON Polygon or MultiPolygon
+    :return: dictionary with "bbox" (min x, min y, max x, max y)
+             and "point" (x, y), in the coordinate system
+             of the input, or None for an empty geometry
+    """
+    min_x = min_y = float("inf")
+    max_x = max_y = float("-inf")
+    total_area = moment_x = moment_y = 0.0
+    largest = None
+    largest_area = 0.0
+    polygons = get_polygons(geometry)
+    for polygon in polygons:
+        polygon_area = 0.0
+        for index, ring in enumerate(polygon):
+            for coordinate in ring:
+                min_x = min(min_x, coordinate[0])
+                max_x = max(max_x, coordinate[0])
+                min_y = min(min_y, coordinate[1])
+                max_y = max(max_y, coordinate[1])
+            area, ring_mx, ring_my = ring_sums(ring)
+            sign = 1 if (area >= 0) == (index == 0) else -1
+            polygon_area += sign * area
+            moment_x += sign * ring_mx
+            moment_y += sign * ring_my
+        total_area += polygon_area
+        if largest is None or abs(polygon_area) > largest_area:
+            largest = polygon
+            largest_area = abs(polygon_area)
+    if largest is None:
+        return None
+
+    if total_area:
+        point = (moment_x / total_area, moment_y / total_area)
+    else:
+        point = ((min_x + max_x) / 2, (min_y + max_y) / 2)
+    if not any(point_in_polygon(point[0], point[1], x) for x in polygons):
+        point = widest_section_middle(largest, point[1]) or point
+    return {"bbox": (min_x, min_y, max_x, max_y), "point": point}
+
+
+def is_projected(point):
+    """Check if coordinates are projected rather than longitude/latitude."""
+    return abs(point[0]) > 180 or abs(point[1]) > 90
+
+
+def to_wgs84(point):
+    """
+    Get the (latitude, longitude) of a point in either supported system.
+
+    :param point: tuple (x, y) as in GeoJSON
+    """
+    if is_projected(point):
+        return sweref99tm_to_wgs84(point[0], point[1])
+    return (point[1], point[0])
+
+
+def to_system(point, projected):
+    """
+    Get a point in either supported coordinate system.
+
+    :param point: tuple (x, y) in either system
+    :param projected: True for SWEREF99 TM, False for WGS84
+    :return: tuple (x, y) as in GeoJSON
+    """
+    if is_projected(point) == projected:
+        return point
+    if projected:
+        return wgs84_to_sweref99tm(point[1], point[0])
+    latitude, longitude = sweref99tm_to_wgs84(point[0], point[1])
+    return (longitude, latitude)
+
+
+class PolygonIndex(object):
+    """
+    Find which of many polygons contain a point.
+
+    The bounding box of all the polygons is divided into
+    a grid. Every cell knows the polygons whose boundary
+    crosses it and the polygons that cover it entirely,
+    so for most points the answer is known from their cell
+    alone. Otherwise, only the edges of the polygons crossing
+    the cell that lie in the same row of the grid as the point
+    are checked.
+    """
+
+    def __init__(self, features, cells=GRID_CELLS):
+        """
+        Build the index.
+
+        :param features: iterable of (key, geometry) pairs,
+                         the geometry a GeoJSON (Multi)Polygon
+        :param cells: number of rows and columns of the grid
+        """
+        features = [(key, get_polygons(x)) for key, x in features]
+        coordinates = [y for _, polygons in features for polygon in polygons
+                       for y in polygon[0]]
+        self.cells = cells
+        self.bands = {}
+        self.crossing = {}
+        self.covering = {}
+        if not coordinates:
+            self.projected = False
+            self.bbox = None
+            return
+        self.projected = is_projected(coordinates[0])
+        self.bbox = (min(x[0] for x in coordinates),
+                     min(x[1] for x in coordinates),
+                     max(x[0] for x in coordinates),
+                     max(x[1] for x in coordinates))
+        self.cell_width = (self.bbox[2] - self.bbox[0]) / cells or 1.0
+        self.cell_height = (self.bbox[3] - self.bbox[1]) / cells or 1.0
+        for key, polygons in features:
+            self.add_edges(key, polygons)
+        for key, polygons in features:
+            self.add_cover(key, polygons)
+
+    def get_column(self, x):
+        """Get the grid column of an x coordinate."""
+        column = int((x - self.bbox[0]) / self.cell_width)
+        return min(max(column, 0), self.cells - 1)
+
+    def get_row(self, y):
+        """Get the grid row of a y coordinate."""
+        row = int((y - self.bbox[1]) / self.cell_height)
+        return min(max(row, 0), self.cells - 1)
+
+    def add_edges(self, key, polygons):
+        """Add the edges of a feature to the rows and cells they cross."""
+        bands = self.bands.setdefault(key, {})
+        for polygon in polygons:
+            for ring in polygon:
+                for i in range(len(ring) - 1):
+                    x0, y0 = ring[i][0], ring[i][1]
+                    x1, y1 = ring[i + 1][0], ring[i + 1][1]
+                    edge = (x0, y0, x1, y1)
+                    first_row = self.get_row(min(y0, y1))
+                    last_row = self.get_row(max(y0, y1))
+                    first_column = self.get_column(min(x0, x1))
+                    last_column = self.get_column(max(x0, x1))
+                    for row in range(first_row, last_row + 1):
+                        bands.setdefault(row, []).append(edge)
+                        for column in range(first_column, last_column + 1):
+                            self.crossing.setdefault(
+                                row * self.cells + column, set()).add(key)
+
+    def add_cover(self, key, polygons):
+        """Add a feature to the cells it covers entirely."""
+        xs = [x[0] for polygon in polygons for x in polygon[0]]
+        ys = [x[1] for polygon in polygons for x in polygon[0]]
+        for row in range(self.get_row(min(ys)), self.get_row(max(ys)) + 1):
+            y = self.bbox[1] + (row + 0.5) * self.cell_height
+            for column in range(self.get_column(min(xs)),
+                                self.get_column(max(xs)) + 1):
+                cell = row * self.cells + column
+                if key in self.crossing.get(cell, ()):
+                    continue
+                x = self.bbox[0] + (column + 0.5) * self.cell_width
+                if self.contains(key, x, y):
+                    self.covering.setdefault(cell, []).append(key)
+
+    def contains(self, key, x, y):
+        """Check if a feature contains a point, even-odd rule."""
+        inside = False
+        for x0, y0, x1, y1 in self.bands[key].get(self.get_row(y), ()):
+            if (y0 > y) != (y1 > y):
+                if x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                    inside = not inside
+        return inside
+
+    def lookup(self, x, y):
+        """
+        Get the features containing a point.
+
+        :param x: x of the point, in the system of the index
+        :param y: y of the point, in the system of the index
+        :return: list of keys
+        """
+        if self.bbox is None or not (self.bbox[0] <= x <= self.bbox[2] and
+                                     self.bbox[1] <= y <= self.bbox[3]):
+            return []
+        cell = self.get_row(y) * self.cells + self.get_column(x)
+        found = list(self.covering.get(cell, ()))
+        for key in self.crossing.get(cell, ()):
+            if self.contains(key, x, y):
+                found.append(key)
+        return found
+
+
+def is_preferred_feature(nature_id, properties, selected):
+    """
+    Check if a feature should be used for an area.
+
+    The first feature of an ID is used, unless a later one
+    has the status "Gällande".
+
+    :param nature_id: NVRID of the feature
+    :param properties: properties of the feature
+    :param selected: the IDs that already have a feature
+    """
+    return (nature_id not in selected or
+            properties.get("BESLSTATUS") == "Gällande")
+
+
+def load_geometry(filepath, wanted_ids=None):
+    """
+    Compute the point and bounding box of every area in a geometry file.
+
+    If an ID occurs more than once (different BESLSTATUS),
+    the feature with status "Gällande" is preferred.
+
+    :param filepath: path to the newline-delimited GeoJSON file
+    :param wanted_ids: optionally, only process features with these IDs
+    :return: dictionary of NVRID -> {"latitude", "longitude", "bbox"}
+    """
+    geometry = {}
+    for feature in iter_features(filepath):
+        properties = feature.get("properties") or {}
+        nature_id = str(properties.get("NVRID"))
+        if wanted_ids is not None and nature_id not in wanted_ids:
+            continue
+        if not is_preferred_feature(nature_id, properties, geometry):
+            continue
+        summary = summarize_geometry(feature.get("geometry"))
+        if summary is None:
+            continue
+        latitude, longitude = to_wgs84(summary["point"])
+        geometry[nature_id] = {"latitude": latitude,
+                               "longitude": longitude,
+                               "bbox": summary["bbox"]}
+    return geometry
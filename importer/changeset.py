@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Compare two releases of a Naturvårdsverket dataset.
+
+Every area is identified by its NVRID and summarized
+by a hash of the columns that are mapped to Wikidata,
+so that changes to other columns (e.g. internal object IDs
+or shape lengths) don't count as modifications.
+If the polygons of both releases are given, the coordinates
+of each area (as uploaded, see area_geometry.py) are part
+of the hash too, and a moved area lists "geometry" as changed.
+
+The result is a changeset of added, removed and modified
+areas, where modified areas list the columns that changed:
+
+{"added": ["2045010"],
+ "removed": ["2001123"],
+ "modified": {"2000283": ["AREA_HA", "LAND_HA"]}}
+"""
+import hashlib
+
+MAPPED_COLUMNS = ["NAMN", "SKYDDSTYP", "BESLSTATUS", "LAN", "KOMMUN",
+                  "FORVALTARE", "IUCNKAT", "AREA_HA", "SKOG_HA",
+                  "LAND_HA", "VATTEN_HA", "URSBESLDAT"]
+GEOMETRY_FIELD = "geometry"
+FIELD_SEPARATOR = "\x1f"
+
+
+def geometry_fingerprints(geometry, precision):
+    """
+    Summarize the location of every area as a string.
+
+    The points are rounded to the precision of the uploaded
+    coordinates, so that only moves visible on Wikidata count.
+
+    :param geometry: dictionary of NVRID -> {"latitude", "longitude", ...},
+                     see area_geometry.load_geometry
+    :param precision: precision of the coordinates, in degrees
+    :return: dictionary of NVRID -> fingerprint
+    """
+    return {nature_id: "{},{}".format(
+        round(point["latitude"] / precision),
+        round(point["longitude"] / precision))
+        for nature_id, point in geometry.items()}
+
+
+def content_hash(row, fingerprint=None):
+    """Get a hash of the mapped columns of a row, and its location."""
+    values = [row.get(column) or "" for column in MAPPED_COLUMNS]
+    values.append(fingerprint or "")
+    content = FIELD_SEPARATOR.join(values)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def index_release(nature_dataset, fingerprints=None, nature_ids=None):
+    """
+    Index the rows of a (cleaned) release by NVRID.
+
+    :param fingerprints: optionally, dictionary of NVRID -> fingerprint,
+                         see geometry_fingerprints
+    :param nature_ids: optionally, only index the rows of these areas
+    :return: dictionary of NVRID -> (content hash, row, fingerprint)
+    """
+    fingerprints = fingerprints or {}
+    index = {}
+    for row in nature_dataset:
+        nature_id = row["NVRID"]
+        if nature_ids is not None and nature_id not in nature_ids:
+            continue
+        fingerprint = fingerprints.get(nature_id)
+        index[nature_id] = (content_hash(row, fingerprint), row, fingerprint)
+    return index
+
+
+def get_changed_fields(old_row, new_row, old_fingerprint=None,
+                       new_fingerprint=None):
+    """List the mapped columns whose values differ between two rows."""
+    changed = [column for column in MAPPED_COLUMNS
+               if old_row.get(column) != new_row.get(column)]
+    if old_fingerprint != new_fingerprint:
+        changed.append(GEOMETRY_FIELD)
+    return changed
+
+
+def compare_releases(old_dataset, new_dataset, old_fingerprints=None,
+                     new_fingerprints=None, nature_ids=None):
+    """
+    Create a changeset between two releases.
+
+    Both datasets should have been cleaned of duplicates
+    the same way, so that there is one row per NVRID.
+    If only some areas are selected, the rest of both releases
+    is ignored, so the unselected areas aren't reported as removed.
+
+    :param old_dataset: rows of the previous release
+    :param new_dataset: rows of the new release
+    :param old_fingerprints: optionally, locations of the previous areas,
+                             see geometry_fingerprints
+    :param new_fingerprints: optionally, locations of the new areas
+    :param nature_ids: optionally, only compare these areas
+    :return: changeset dictionary, see module docstring
+    """
+    if nature_ids is not None:
+        nature_ids = set(nature_ids)
+    old_index = index_release(old_dataset, old_fingerprints, nature_ids)
+    new_index = index_release(new_dataset, new_fingerprints, nature_ids)
+    changeset = {"added": [], "removed": [], "modified": {}}
+    for nature_id, (new_hash, new_row, new_point) in new_index.items():
+        if nature_id not in old_index:
+            changeset["added"].append(nature_id)
+            continue
+        old_hash, old_row, old_point = old_index[nature_id]
+        if old_hash != new_hash:
+            changeset["modified"][nature_id] = get_changed_fields(
+                old_row, new_row, old_point, new_point)
+    changeset["removed"] = [x for x in old_index if x not in new_index]
+    changeset["added"].sort()
+    changeset["removed"].sort()
+    return changeset
+
+
+def filter_changed(nature_dataset, changeset):
+    """Keep only the rows of areas that were added or modified."""
+    changed = set(changeset["added"]) | set(changeset["modified"])
+    return [row for row in nature_dataset if row["NVRID"] in changed]
+
+
+def print_changeset(changeset):
+    """Print a summary of a changeset."""
+    print("Changeset: {} added, {} removed, {} modified.".format(
+        len(changeset["added"]),
+        len(changeset["removed"]),
+        len(changeset["modified"])))
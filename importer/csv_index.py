@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Find the rows of single nature areas in a source file without parsing it.
+
+To process a few areas, only their rows are needed, but
+the source file has thousands. The index maps every NVRID
+to the byte offsets of its rows in the file (an area can
+have several rows, with different statuses), so they can be
+read straight from a memory map of the file, and only they
+are parsed.
+
+The index is saved next to the source file, as
+<source file>.nvrid-index: a line of json with the header of
+the file, the modification time and size of the file it was
+built from, and the size of the entries, followed by the
+entries, sorted by NVRID. Every entry is the NVRID, padded
+to the same width, and the start and end of a row.
+A lookup memory-maps the index and finds the entries by
+binary search, so it doesn't read the whole index either.
+
+If the source file has changed, or the index was written by
+another version of this module, it's rebuilt the next time
+it's loaded.
+
+To build the index of a file by hand:
+
+    python3 csv_index.py data/NR_polygon.csv
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".nvrid-index"
+KEY_COLUMN = "NVRID"
+ENCODING = "utf-8"
+
+
+def get_index_path(filepath):
+    """Get the path of the index of a file."""
+    return filepath + INDEX_SUFFIX
+
+
+def get_fingerprint(filepath):
+    """Get the modification time (in ns) and size of a file."""
+    stat = os.stat(filepath)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def get_entry_format(width):
+    """Get the format of the entries of an index with keys of a width."""
+    return struct.Struct(">{}sQQ".format(width))
+
+
+def iter_records(f_obj):
+    """
+    Parse a csv file, keeping track of where every record is.
+
+    :param f_obj: the file, opened in binary mode
+    :return: generator of (start, end, values) of every record,
+             where start and end are byte offsets in the file
+    """
+    position = [0]
+
+    def read_lines():
+        for line in f_obj:
+            position[0] += len(line)
+            yield line.decode(ENCODING)
+
+    start = 0
+    for values in csv.reader(read_lines(), delimiter=","):
+        end = position[0]
+        if values:
+            yield (start, end, values)
+        start = end
+
+
+def build_index(filepath, key=KEY_COLUMN):
+    """
+    Index the rows of a csv file by the values of a column.
+
+    :param filepath: the csv file
+    :param key: the column to index by
+    :return: tuple (metadata, sorted list of entries
+             (value as bytes, start, end))
+    """
+    metadata = {"version": INDEX_VERSION,
+                "fingerprint": get_fingerprint(filepath),
+                "key": key, "header": [], "width": 1, "count": 0}
+    entries = []
+    with open(filepath, "rb") as f_obj:
+        records = iter_records(f_obj)
+        header = next(records, None)
+        if header is None:
+            return (metadata, entries)
+        metadata["header"] = header[2]
+        column = header[2].index(key)
+        for start, end, values in records:
+            if len(values) > column:
+                entries.append((values[column].encode(ENCODING), start, end))
+    entries.sort()
+    metadata["width"] = max([len(x[0]) for x in entries] + [1])
+    metadata["count"] = len(entries)
+    return (metadata, entries)
+
+
+def save_index(metadata, entries, filepath):
+    """Write an index to file, replacing any old one at once."""
+    entry_format = get_entry_format(metadata["width"])
+    temporary = "{}.{}.tmp".format(filepath, os.getpid())
+    with open(temporary, "wb") as f_obj:
+        f_obj.write(json.dumps(metadata).encode(ENCODING) + b"\n")
+        for entry in entries:
+            f_obj.write(entry_format.pack(*entry))
+    os.replace(temporary, filepath)
+
+
+def read_metadata(filepath):
+    """
+    Read the metadata of an index.
+
+    :return: the metadata, with the offset of the entries,
+             or None if the index is missing or can't be read
+    """
+    try:
+        with open(filepath, "rb") as f_obj:
+            line = f_obj.readline()
+        metadata = json.loads(line.decode(ENCODING))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(metadata, dict):
+        return None
+    metadata["offset"] = len(line)
+    return metadata
+
+
+def is_current(metadata, filepath, key=KEY_COLUMN):
+    """Check if an index was built from the current csv file."""
+    return (metadata is not None and
+            metadata.get("version") == INDEX_VERSION and
+            metadata.get("key") == key and
+            metadata.get("fingerprint") == get_fingerprint(filepath))
+
+
+def load_index(filepath, key=KEY_COLUMN):
+    """
+    Get the index of a csv file, rebuilding it if it's out of date.
+
+    :param filepath: the csv file
+    :param key: the column to index by
+    :return: the metadata of the index, see read_metadata
+    """
+    index_path = get_index_path(filepath)
+    metadata = read_metadata(index_path)
+    if not is_current(metadata, filepath, key):
+        print("Building index {}.".format(index_path))
+        metadata, entries = build_index(filepath, key)
+        save_index(metadata, entries, index_path)
+        metadata = read_metadata(index_path)
+    return metadata
+
+
+def find_offsets(data, metadata, value):
+    """
+    Find the rows of a value in a memory-mapped index.
+
+    :param data: the content of the index file
+    :param metadata: its metadata, see read_metadata
+    :param value: the value to look up
+    :return: list of (start, end) of the rows with the value
+    """
+    width = metadata["width"]
+    wanted = value.encode(ENCODING)
+    if len(wanted) > width:
+        return []
+    wanted = wanted.ljust(width, b"\0")
+    entry_format = get_entry_format(width)
+    size = entry_format.size
+    offset = metadata["offset"]
+    low = 0
+    high = metadata["count"]
+    while low < high:
+        middle = (low + high) // 2
+        start = offset + middle * size
+        if data[start:start + width] < wanted:
+            low = middle + 1
+        else:
+            high = middle
+    found = []
+    for position in range(low, metadata["count"]):
+        key, start, end = entry_format.unpack_from(
+            data, offset + position * size)
+        if key != wanted:
+            break
+        found.append((start, end))
+    return found
+
+
+def read_rows(filepath, values, key=KEY_COLUMN):
+    """
+    Read the rows with some values of the key column from a csv file.
+
+    :param filepath: the csv file
+    :param values: the values to look up, e.g. NVRIDs
+    :param key: the column to look them up in
+    :return: tuple (list of the rows as dictionaries, in the order
+             of the file, list of the values that have no rows)
+    """
+    metadata = load_index(filepath, key)
+    offsets = []
+    missing = []
+    if metadata["count"]:
+        with open(get_index_path(filepath), "rb") as f_obj:
+            with mmap.mmap(f_obj.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                for value in values:
+                    found = find_offsets(data, metadata, value)
+                    offsets.extend(found)
+                    if not found:
+                        missing.append(value)
+    else:
+        missing = list(values)
+    rows = []
+    if not offsets:
+        return (rows, missing)
+    with open(filepath, "rb") as f_obj:
+        with mmap.mmap(f_obj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start, end in sorted(set(offsets)):
+                text = data[start:end].decode(ENCODING)
+                values = next(csv.reader(text.splitlines(True),
+                                         delimiter=","))
+                rows.append(dict(zip(metadata["header"], values)))
+    return (rows, missing)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("source")
+    parser.add_argument("--key", default=KEY_COLUMN)
+    args = parser.parse_args()
+    built, built_entries = build_index(args.source, args.key)
+    save_index(built, built_entries, get_index_path(args.source))
+    print("Indexed {} rows by {} in {}.".format(
+        built["count"], args.key, get_index_path(args.source)))
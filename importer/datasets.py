@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the Naturvårdsverket datasets that can be imported.
+
+Every dataset knows its source file, its polygon file,
+the edit summary to use when uploading and the item
+used in the 'stated in' reference of its statements.
+The protection type is the value of SKYDDSTYP in the source
+data, which is how a single row is tied to its dataset.
+
+To add a new dataset type, register a Dataset (or a subclass
+with its own load_rows, if the source file looks different)
+with register_dataset. nature_importer picks it up
+via the --dataset argument.
+"""
+import csv_index
+import importer_utils as utils
+
+DATASETS = {}
+
+
+class Dataset(object):
+    """A type of nature area published by Naturvårdsverket."""
+
+    def __init__(self, code, source_file, geometry_file,
+                 edit_summary, source_item, protection_type):
+        """
+        Initialize the dataset.
+
+        :param code: short name used on the command line, e.g. "nr"
+        :param source_file: csv file in the data directory
+        :param geometry_file: newline-delimited GeoJSON file
+                              in the data directory
+        :param edit_summary: edit summary for uploads
+        :param source_item: key in items.json of the 'stated in' item
+        :param protection_type: value of SKYDDSTYP in the source data
+        """
+        self.code = code
+        self.source_file = source_file
+        self.geometry_file = geometry_file
+        self.edit_summary = edit_summary
+        self.source_item = source_item
+        self.protection_type = protection_type
+
+    def get_source_path(self):
+        """Get the absolute path of the source file."""
+        return utils.get_file_from_subdir("data", self.source_file)
+
+    def get_geometry_path(self):
+        """Get the absolute path of the polygon file."""
+        return utils.get_file_from_subdir("data", self.geometry_file)
+
+    def load_rows(self):
+        """Load the rows of the source file, as dictionaries."""
+        return utils.get_data_from_csv_file(self.get_source_path())
+
+    def load_rows_by_id(self, nature_ids):
+        """
+        Load only the rows of some areas, see csv_index.py.
+
+        :param nature_ids: list of NVRIDs
+        :return: tuple (list of rows, list of the NVRIDs not found)
+        """
+        return csv_index.read_rows(self.get_source_path(), nature_ids)
+
+
+def register_dataset(dataset):
+    """Make a dataset available to the importer."""
+    DATASETS[dataset.code] = dataset
+
+
+def get_dataset(code):
+    """
+    Get a registered dataset.
+
+    :param code: short name of the dataset, e.g. "nr"
+    :return: the Dataset, or None if there is no such dataset
+    """
+    return DATASETS.get(code)
+
+
+def get_dataset_by_protection_type(protection_type):
+    """Get the registered dataset of a SKYDDSTYP value."""
+    for dataset in DATASETS.values():
+        if dataset.protection_type == protection_type:
+            return dataset
+
+
+def get_dataset_codes():
+    """Get the short names of all registered datasets."""
+    return sorted(DATASETS)
+
+
+register_dataset(Dataset(code="nr",
+                         source_file="NR_polygon.csv",
+                         geometry_file="NR_polygon.geojsonl",
+                         edit_summary="#WLESE #naturreservat",
+                         source_item="source_nr",
+                         protection_type="Naturreservat"))
+register_dataset(Dataset(code="np",
+                         source_file="NP_polygon.csv",
+                         geometry_file="NP_polygon.geojsonl",
+                         edit_summary="#WLESE #nationalpark",
+                         source_item="source_np",
+                         protection_type="Nationalpark"))
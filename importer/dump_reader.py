@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extract the data the importer needs from a Wikidata JSON dump.
+
+Instead of asking WDQS for the items that have a nature ID
+and relying on snapshots of the municipalities and operators,
+this reads a local dump (latest-all.json.gz or .bz2 from
+https://dumps.wikimedia.org/wikidatawiki/entities/) and writes:
+
+* existing_P3613.json -- nature ID -> items with that ID,
+  to be used with nature_importer.py --existing-file,
+* municipalities.json -- the municipalities of Sweden,
+  with their English and Swedish labels,
+* forvaltare.json -- the operators (P137) of the items
+  with a nature ID, together with the operators already
+  in the current mapping (data/forvaltare.json, or the
+  file given with --forvaltare), with their Swedish labels,
+
+the last two in the same format as the files in data/.
+
+The dump is read line by line (every entity is on its own
+line), and the lines are parsed and checked in batches by
+a pool of worker processes. Lines that can't contain
+anything of interest are skipped before being parsed.
+Finding the operators needs a second pass, to get the
+labels of the items found in the first one. Operators of
+the current mapping that are not used on any area yet are
+kept, with fresh labels, so areas that get them later can
+still be mapped. Those that aren't in the dump, or have
+no Swedish label in it, keep their current entry.
+
+Usage:
+    python3 dump_reader.py latest-all.json.gz --output-dir refreshed
+"""
+import argparse
+import bz2
+import gzip
+import itertools
+import json
+from multiprocessing import Pool
+import os
+
+NATURE_ID_PROP = "P3613"
+OPERATOR_PROP = "P137"
+INSTANCE_PROP = "P31"
+SWEDISH_MUNICIPALITY = "Q127448"
+BATCH_SIZE = 2000
+OPERATOR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "data", "forvaltare.json")
+
+wanted_labels = frozenset()
+
+
+def open_dump(filepath):
+    """Open a dump for reading text, decompressing it if needed."""
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, "rt", encoding="utf-8")
+    if filepath.endswith(".bz2"):
+        return bz2.open(filepath, "rt", encoding="utf-8")
+    return open(filepath, encoding="utf-8")
+
+
+def iter_batches(lines, size=BATCH_SIZE):
+    """Group lines into lists of a certain size."""
+    lines = iter(lines)
+    while True:
+        batch = list(itertools.islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_line(line):
+    """
+    Parse a line of the dump.
+
+    :return: the entity, or None for the lines opening
+             and closing the list of entities
+    """
+    line = line.strip().rstrip(",")
+    if not line or line in ["[", "]"]:
+        return None
+    return json.loads(line)
+
+
+def get_values(entity, prop):
+    """Get the values of the non-deprecated claims of a property."""
+    values = []
+    for claim in entity.get("claims", {}).get(prop, []):
+        if claim.get("rank") == "deprecated":
+            continue
+        datavalue = claim["mainsnak"].get("datavalue")
+        if datavalue is None:
+            continue
+        value = datavalue["value"]
+        if isinstance(value, dict):
+            value = value.get("id")
+        if value is not None:
+            values.append(value)
+    return values
+
+
+def get_label(entity, language):
+    """Get the label of an entity in a language, or None."""
+    return entity.get("labels", {}).get(language, {}).get("value")
+
+
+def extract_entities(lines):
+    """
+    Find nature ID holders and Swedish municipalities in dump lines.
+
+    :param lines: list of lines of the dump
+    :return: list of tuples, either
+             ("holder", item, nature IDs, operator items) or
+             ("municipality", item, English label, Swedish label)
+    """
+    found = []
+    for line in lines:
+        has_id = '"{}"'.format(NATURE_ID_PROP) in line
+        if not has_id and '"{}"'.format(SWEDISH_MUNICIPALITY) not in line:
+            continue
+        entity = parse_line(line)
+        if entity is None:
+            continue
+        if has_id:
+            nature_ids = get_values(entity, NATURE_ID_PROP)
+            if nature_ids:
+                found.append(("holder", entity["id"], nature_ids,
+                              get_values(entity, OPERATOR_PROP)))
+        if SWEDISH_MUNICIPALITY in get_values(entity, INSTANCE_PROP):
+            found.append(("municipality", entity["id"],
+                          get_label(entity, "en"), get_label(entity, "sv")))
+    return found
+
+
+def set_wanted_labels(items):
+    """Set the items whose labels extract_labels looks for."""
+    global wanted_labels
+    wanted_labels = frozenset(items)
+
+
+def extract_labels(lines):
+    """
+    Get the Swedish labels of the wanted items in dump lines.
+
+    :return: list of tuples (item, Swedish label)
+    """
+    found = []
+    for line in lines:
+        start = line.find('"id":"')
+        if start == -1:
+            continue
+        end = line.find('"', start + 6)
+        if line[start + 6:end] not in wanted_labels:
+            continue
+        entity = parse_line(line)
+        if entity is not None and entity["id"] in wanted_labels:
+            found.append((entity["id"], get_label(entity, "sv")))
+    return found
+
+
+def scan_dump(filepath, function, processes=None, initializer=None,
+              initargs=()):
+    """
+    Run a function over all the lines of a dump, in parallel.
+
+    :param function: takes a list of lines, returns a list of results
+    :param processes: number of worker processes, all cores by default
+    :return: generator of the results
+    """
+    with open_dump(filepath) as f_obj:
+        with Pool(processes, initializer, initargs) as pool:
+            for results in pool.imap(function, iter_batches(f_obj)):
+                for result in results:
+                    yield result
+
+
+def q_number(item):
+    """Get the numeric part of a Q-id, for sorting."""
+    return int(item[1:])
+
+
+def load_operators(filepath):
+    """
+    Load the current operator mapping, if there is one.
+
+    :return: list of mappings {"item", "sv"}
+    """
+    if not filepath or not os.path.isfile(filepath):
+        return []
+    with open(filepath, encoding="utf-8") as f_obj:
+        return json.load(f_obj)
+
+
+def read_dump(filepath, processes=None, known_operators=None):
+    """
+    Extract the existing items, municipalities and operators of a dump.
+
+    :param filepath: the dump, optionally compressed
+    :param processes: number of worker processes
+    :param known_operators: the current operator mapping,
+                            see load_operators
+    :return: dictionary with "existing" (nature ID -> sorted items),
+             "municipalities" and "forvaltare" (lists of mappings)
+    """
+    known = {x["item"]: x for x in known_operators or []}
+    existing = {}
+    operators = set()
+    municipalities = []
+    for result in scan_dump(filepath, extract_entities, processes):
+        if result[0] == "holder":
+            _, item, nature_ids, item_operators = result
+            for nature_id in nature_ids:
+                existing.setdefault(nature_id, []).append(item)
+            operators.update(item_operators)
+        else:
+            _, item, en_label, sv_label = result
+            municipalities.append({"item": item, "en": en_label,
+                                   "sv": sv_label})
+    for items in existing.values():
+        items.sort(key=q_number)
+    municipality_items = set(x["item"] for x in municipalities)
+    operators = (operators - municipality_items) | set(known)
+    labelled = {}
+    if operators:
+        for item, sv_label in scan_dump(filepath, extract_labels,
+                                        processes, set_wanted_labels,
+                                        (operators,)):
+            if sv_label:
+                labelled[item] = {"item": item, "sv": sv_label}
+    for item, entry in known.items():
+        labelled.setdefault(item, entry)
+    forvaltare = list(labelled.values())
+    return {"existing": existing,
+            "municipalities": sorted(municipalities,
+                                     key=lambda x: x["sv"] or ""),
+            "forvaltare": sorted(forvaltare, key=lambda x: x["sv"])}
+
+
+def write_results(results, output_dir):
+    """Write the extracted data to files in a directory."""
+    os.makedirs(output_dir, exist_ok=True)
+    files = {"existing_{}.json".format(NATURE_ID_PROP): results["existing"],
+             "municipalities.json": results["municipalities"],
+             "forvaltare.json": results["forvaltare"]}
+    for filename, content in files.items():
+        with open(os.path.join(output_dir, filename), "w") as f_obj:
+            json.dump(content, f_obj, sort_keys=True, indent=4,
+                      ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dump", help="Wikidata JSON dump, .gz or .bz2")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--processes", type=int,
+                        help="worker processes, all cores by default")
+    parser.add_argument("--forvaltare", default=OPERATOR_FILE,
+                        help="current operator mapping, whose operators "
+                             "are kept")
+    args = parser.parse_args()
+    dump_results = read_dump(args.dump, args.processes,
+                             load_operators(args.forvaltare))
+    write_results(dump_results, args.output_dir)
+    print("Found {} nature IDs, {} municipalities, {} operators.".format(
+        len(dump_results["existing"]), len(dump_results["municipalities"]),
+        len(dump_results["forvaltare"])))
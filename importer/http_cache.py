@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+Record HTTP traffic to a local database and replay it.
+
+Once install() has been called, every HTTP request sent
+through requests (pywikibot's included, and the WDQS
+queries) goes through the cache first, in one of three modes:
+
+* record -- answer from the cache if the request is in it,
+  otherwise send it and store the response,
+* replay -- only answer from the cache, and raise CacheMiss
+  for a request that is not in it, so a run that was
+  recorded can be repeated offline,
+* passthrough -- send every request, the cache is not used.
+
+Requests are stored in an sqlite database, keyed by a hash
+of the method, the url, the sorted parameters and form data
+and the headers that change the answer, see KEY_HEADERS.
+Parameters that change between runs without changing the
+answer, like login tokens, are left out of the key, see
+VOLATILE_PARAMS, and passwords are never stored, see
+SECRET_PARAMS. To refresh the recorded responses, delete
+the database or record to a new one.
+
+Edits and the session are never cached: a request with
+a write action (see WRITE_ACTIONS), a POST carrying an edit
+token, logging in and out (see SESSION_ACTIONS), fetching
+tokens or the logged-in user (see SESSION_META), a request
+asserting that it's logged in, and the maxlag=-1 probe of
+the upload throttle always go to the network, in every mode,
+so a recorded run that uploads really logs in and uploads again.
+
+To see what a database holds:
+
+    python3 http_cache.py cache.sqlite
+"""
+import argparse
+from collections import Counter
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+MODES = ["record", "replay", "passthrough"]
+VOLATILE_PARAMS = ["lgtoken", "logintoken", "requestid",
+                   "curtimestamp", "starttimestamp"]
+SECRET_PARAMS = ["lgpassword", "password", "retype"]
+REDACTED = "<redacted>"
+WRITE_ACTIONS = ["edit", "upload", "move", "delete", "undelete",
+                 "protect", "rollback", "purge", "watch",
+                 "wbeditentity", "wbcreateclaim", "wbsetclaim",
+                 "wbremoveclaims", "wbsetclaimvalue", "wbsetqualifier",
+                 "wbremovequalifiers", "wbsetreference",
+                 "wbremovereferences", "wbsetlabel", "wbsetdescription",
+                 "wbsetaliases", "wbsetsitelink", "wbmergeitems",
+                 "wbcreateredirect", "wblinktitles"]
+SESSION_ACTIONS = ["login", "clientlogin", "logout"]
+SESSION_META = ["tokens", "userinfo"]
+KEY_HEADERS = ["accept"]
+DROPPED_HEADERS = ["content-encoding", "transfer-encoding",
+                   "content-length", "set-cookie", "date"]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    request TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    reason TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    recorded REAL NOT NULL
+)
+"""
+
+cache = None
+original_request = None
+
+
+class CacheMiss(Exception):
+    """A request was not found in the cache in replay mode."""
+
+
+def get_pairs(content):
+    """
+    Get the parameters of a query string, form or dictionary.
+
+    :return: list of (name, value) pairs, or None if the content
+             can't be read as parameters (e.g. a file upload)
+    """
+    if content is None:
+        return []
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+    if isinstance(content, str):
+        return parse_qsl(content, keep_blank_values=True)
+    if isinstance(content, dict):
+        content = content.items()
+    try:
+        pairs = []
+        for name, value in content:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            pairs.extend((str(name), str(x)) for x in values)
+        return pairs
+    except (TypeError, ValueError):
+        return None
+
+
+def get_request_pairs(url, kwargs):
+    """
+    Get all the parameters of a request.
+
+    :return: list of (name, value) pairs of the query string,
+             params and data
+    """
+    pairs = parse_qsl(urlsplit(url).query, keep_blank_values=True)
+    for key in ["params", "data", "json"]:
+        content = kwargs.get(key)
+        if key == "json" and content is not None:
+            content = {"json": json.dumps(content, sort_keys=True)}
+        found = get_pairs(content)
+        if found is None:
+            found = [(key, repr(content))]
+        pairs.extend(found)
+    return pairs
+
+
+def is_cacheable(method, pairs):
+    """
+    Check if the response of a request may be cached.
+
+    :param method: the HTTP method
+    :param pairs: the parameters, see get_request_pairs
+    :return: False for edits, requests about the session
+             and the maxlag probe
+    """
+    params = dict(pairs)
+    if params.get("action") in WRITE_ACTIONS + SESSION_ACTIONS:
+        return False
+    if method.upper() == "POST" and "token" in params:
+        return False
+    meta = params.get("meta", "").split("|")
+    if any(x in SESSION_META for x in meta):
+        return False
+    if "assert" in params:
+        return False
+    return params.get("maxlag") != "-1"
+
+
+def get_key_headers(kwargs, session_headers=None):
+    """
+    Get the headers of a request that change its response.
+
+    :param session_headers: the default headers of the session,
+                            used unless the request overrides them
+    :return: sorted list of (lowercase name, value)
+    """
+    headers = CaseInsensitiveDict(session_headers or {})
+    headers.update(kwargs.get("headers") or {})
+    return sorted((name, str(headers[name])) for name in KEY_HEADERS
+                  if headers.get(name) is not None)
+
+
+def normalize_request(method, url, kwargs, session_headers=None):
+    """
+    Get the parts of a request that identify its response.
+
+    :param session_headers: the default headers of the session
+    :return: dictionary with the method, the url without
+             query string, the sorted parameters of the
+             query string, params and data, without the
+             volatile ones and with the secret ones redacted,
+             and the headers in KEY_HEADERS
+    """
+    parts = urlsplit(url)
+    pairs = sorted((k, REDACTED if k in SECRET_PARAMS else v)
+                   for k, v in get_request_pairs(url, kwargs)
+                   if k not in VOLATILE_PARAMS)
+    return {"method": method.upper(),
+            "url": urlunsplit(parts._replace(query="", fragment="")),
+            "params": pairs,
+            "headers": get_key_headers(kwargs, session_headers)}
+
+
+def make_key(normalized):
+    """Get the key of a normalized request in the database."""
+    text = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_response(method, url, kwargs, row):
+    """
+    Build a response from a row of the database.
+
+    :param row: tuple (status, reason, headers as json, body)
+    """
+    status, reason, headers, body = row
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(json.loads(headers))
+    response.headers["Content-Length"] = str(len(body))
+    response._content = bytes(body)
+    response._content_consumed = True
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = url
+    response.elapsed = datetime.timedelta(0)
+    response.request = requests.Request(
+        method, url, params=kwargs.get("params")).prepare()
+    return response
+
+
+class HttpCache(object):
+    """A database of recorded responses."""
+
+    def __init__(self, filepath, mode="record"):
+        """
+        Open the database, creating it if needed.
+
+        :param filepath: the sqlite file
+        :param mode: one of MODES
+        """
+        if mode not in MODES:
+            raise ValueError("unknown mode {}, use one of: {}".format(
+                mode, ", ".join(MODES)))
+        self.filepath = filepath
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filepath, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "sent": 0}
+
+    def count(self, key):
+        """Count an event in the statistics."""
+        with self.lock:
+            self.stats[key] += 1
+
+    def lookup(self, key):
+        """Get the stored response of a key, or None."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT status, reason, headers, body FROM responses "
+                "WHERE key = ?", (key,)).fetchone()
+
+    def store(self, key, normalized, response):
+        """Store a response under a key."""
+        headers = {k: v for k, v in response.headers.items()
+                   if k.lower() not in DROPPED_HEADERS}
+        row = (key, normalized["method"], normalized["url"],
+               json.dumps(normalized["params"], ensure_ascii=False),
+               response.status_code, response.reason,
+               json.dumps(headers), response.content, time.time())
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self.connection.commit()
+        self.count("stored")
+
+    def request(self, session, method, url, **kwargs):
+        """
+        Answer a request, from the cache or the network.
+
+        Edits and the maxlag probe are always sent,
+        see is_cacheable.
+
+        :raise: CacheMiss if replaying a request that was
+                never recorded
+        """
+        if self.mode == "passthrough" or not is_cacheable(
+                method, get_request_pairs(url, kwargs)):
+            self.count("sent")
+            return original_request(session, method, url, **kwargs)
+        normalized = normalize_request(method, url, kwargs,
+                                       session.headers)
+        key = make_key(normalized)
+        row = self.lookup(key)
+        if row is not None:
+            self.count("hits")
+            return make_response(method, url, kwargs, row)
+        self.count("misses")
+        if self.mode == "replay":
+            raise CacheMiss("{} {} was not recorded in {}".format(
+                normalized["method"], normalized["url"], self.filepath))
+        response = original_request(session, method, url, **kwargs)
+        self.count("sent")
+        if response.status_code < 500:
+            self.store(key, normalized, response)
+            return make_response(method, url, kwargs,
+                                 self.lookup(key))
+        return response
+
+    def summarize(self):
+        """
+        Count the stored responses.
+
+        :return: dictionary of "METHOD host" -> number of responses
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT method, url FROM responses").fetchall()
+        return dict(Counter("{} {}".format(method, urlsplit(url).netloc)
+                            for method, url in rows))
+
+    def print_stats(self):
+        """Print what the cache did in this run."""
+        print("HTTP cache ({}): {hits} hits, {misses} misses, "
+              "{stored} stored, {sent} sent.".format(self.mode,
+                                                     **self.stats))
+
+    def close(self):
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+
+def cached_request(session, method, url, **kwargs):
+    """Send a request through requests, via the cache."""
+    return cache.request(session, method, url, **kwargs)
+
+
+def install(new_cache):
+    """
+    Send all HTTP requests through a cache.
+
+    :param new_cache: the HttpCache to use
+    """
+    global cache, original_request
+    cache = new_cache
+    if original_request is None:
+        original_request = requests.Session.request
+        requests.Session.request = cached_request
+
+
+def uninstall():
+    """Send HTTP requests directly again."""
+    global cache, original_request
+    if original_request is not None:
+        requests.Session.request = original_request
+    cache = None
+    original_request = None
+
+
+def add_arguments(parser):
+    """Add the cache options to a command line parser."""
+    parser.add_argument("--http-cache",
+                        help="sqlite file to record HTTP responses in, "
+                             "or replay them from")
+    parser.add_argument("--http-cache-mode",
+                        choices=MODES,
+                        default="record",
+                        help="record missing responses, only replay, "
+                             "or bypass the cache")
+
+
+def install_from_arguments(arguments):
+    """
+    Install a cache if one was given on the command line.
+
+    :param arguments: the command line arguments, as a dictionary
+    :return: the HttpCache, or None
+    """
+    if not arguments.get("http_cache"):
+        return None
+    new_cache = HttpCache(arguments["http_cache"],
+                          arguments["http_cache_mode"])
+    install(new_cache)
+    return new_cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database")
+    args = parser.parse_args()
+    summary = HttpCache(args.database).summarize()
+    for request, number in sorted(summary.items()):
+        print("{:6d} {}".format(number, request))
+    print("{:6d} in total".format(sum(summary.values())))
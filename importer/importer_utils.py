@@ -6,10 +6,8 @@ import json
 import os
 import re
 
-import pywikibot
-from wikidataStuff.WikidataStuff import WikidataStuff as wds
-
 site_cache = {}
+data_file_cache = {}
 
 
 def get_file_from_subdir(dir_name, file_name):
@@ -41,6 +39,20 @@ def load_json(filename):
         print("File {} does not exist.".format(filename))
 
 
+def get_data_file(filename):
+    """
+    Get the content of a json file in the data directory.
+
+    The file is only read the first time it's asked for.
+
+    :param filename: e.g. "properties.json"
+    """
+    if filename not in data_file_cache:
+        data_file_cache[filename] = load_json(
+            get_file_from_subdir("data", filename))
+    return data_file_cache[filename]
+
+
 def json_to_file(filename, json_content):
     with open(filename, 'w') as f:
         json.dump(json_content, f, sort_keys=True,
@@ -90,6 +102,7 @@ def wd_template(template_type, value):
 
 def create_site_instance(language, family):
     """Create an instance of a Wiki site (convenience function)."""
+    import pywikibot
     site_key = (language, family)
     site = site_cache.get(site_key)
     if not site:
@@ -162,8 +175,7 @@ def extract_municipality_name(category_name):
                           like "Naturreservat i Foo kommun"
     """
     municipality = None
-    legit_municipalities = load_json(
-        get_file_from_subdir("data", "municipalities.json"))
+    legit_municipalities = get_data_file("municipalities.json")
     m = re.search('(\w?)[N|n]aturreservat i (.+?) [kommun|län]', category_name)
     if m:
         municipality = m.group(2)
@@ -184,6 +196,8 @@ def q_from_wikipedia(language, page_title):
     If the page has no item and is in the article
     namespace, create an item for it.
     """
+    import pywikibot
+    from wikidataStuff.WikidataStuff import WikidataStuff as wds
     wp_site = pywikibot.Site(language, "wikipedia")
     page = pywikibot.Page(wp_site, page_title)
     summary = "Creating item for {} on {}wp."
@@ -202,6 +216,59 @@ def q_from_wikipedia(language, page_title):
         return item.getID()
 
 
+def get_entities(repo, ids, props="info|claims", batch_size=50):
+    """
+    Get the content of many Wikidata entities in batched requests.
+
+    Redirects are followed, so the returned entity can have
+    another ID than the requested one. Entities that don't
+    exist (e.g. deleted ones) have the key "missing".
+    When several of the requested items redirect to the same
+    one, it's only returned once, for one of them, so
+    the others are requested again one by one.
+
+    :param repo: Wikidata site instance
+    :param ids: list of Q-ids
+    :param props: the parts of the entities to get
+    :param batch_size: number of entities per request,
+                       at most 50 for normal accounts
+    :return: dictionary of requested Q-id -> entity JSON
+    """
+    def fetch(batch):
+        request = repo.simple_request(action="wbgetentities",
+                                      ids=batch,
+                                      props=props,
+                                      redirects="yes")
+        data = request.submit()
+        for entity in data.get("entities", {}).values():
+            redirect = entity.get("redirects", {})
+            requested = redirect.get("from", entity.get("id"))
+            entities[requested] = entity
+
+    entities = {}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        fetch(batch)
+        if len(batch) > 1:
+            for qid in [x for x in batch if x not in entities]:
+                fetch([qid])
+    return entities
+
+
+def get_claim_values(entity, prop):
+    """
+    Get the item values of a property in an entity's JSON.
+
+    :return: list of Q-ids, excluding somevalue/novalue claims
+    """
+    values = []
+    for claim in entity.get("claims", {}).get(prop, []):
+        datavalue = claim["mainsnak"].get("datavalue")
+        if datavalue and isinstance(datavalue["value"], dict):
+            values.append(datavalue["value"].get("id"))
+    return values
+
+
 def remove_dic_from_list_by_value(diclist, key, value):
     """
     Remove a dictionary from a list of dictionaries by certain value.
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Save built items to file, and load them again for upload.
+
+Building a NatureArea needs the source data, the polygons,
+the mapping files and the existing items, while uploading
+only needs its wd_item. With an export file, building can
+be done once, in bulk, and the upload run separately,
+resumed or split between machines.
+
+The file has one JSON object per line and per item:
+
+    {"key": "2000283", "name": "Kungsberget", "dataset": "nr",
+     "county": "Gävleborgs län", "item": "Q10550272", "upload": true,
+     "labels": {"sv": "Kungsberget"},
+     "descriptions": {"sv": "naturreservat i Gävleborgs län"},
+     "refs": [{"test": [{"prop": "P248", "type": "item",
+                         "value": "Q29580583"}, ...],
+               "notest": [...]}],
+     "statements": [{"prop": "P31", "type": "item", "value": "Q179049",
+                     "quals": [], "ref": 0}, ...]}
+
+Targets are tagged with their type: item, string, time,
+quantity and globecoordinate (the last three in Wikibase JSON),
+or somevalue/novalue without a value. References are
+listed once per item, and statements point to them by index.
+
+Uploads can keep a journal: one line per uploaded item,
+with the item it was uploaded to. Items in the journal are
+skipped when the upload is run again.
+"""
+import json
+import threading
+
+journal_lock = threading.Lock()
+
+
+class SerializedItem(object):
+    """A built item loaded from an export file, ready for upload."""
+
+    def __init__(self, record, wd_item):
+        """
+        Initialize the item.
+
+        :param record: the line of the export file
+        :param wd_item: the wd_item rebuilt from it
+        """
+        self.raw_data = {"NVRID": record["key"], "NAMN": record["name"],
+                         "LAN": record.get("county")}
+        self.dataset = record["dataset"]
+        self.wd_item = wd_item
+
+    def associate_wd_item(self, wd_item):
+        """Associate the item with a Wikidata item."""
+        if wd_item is not None:
+            self.wd_item["wd-item"] = wd_item
+
+
+def encode_target(target, special=False):
+    """
+    Encode the target of a statement, qualifier or reference.
+
+    :param target: a pywikibot ItemPage, WbTime, WbQuantity,
+                   Coordinate, or a string
+    :param special: whether the target is somevalue/novalue
+    :return: dictionary with the type and the value
+    """
+    import pywikibot
+    if special:
+        return {"type": target}
+    if isinstance(target, pywikibot.ItemPage):
+        return {"type": "item", "value": target.getID()}
+    if isinstance(target, pywikibot.WbTime):
+        return {"type": "time", "value": target.toWikibase()}
+    if isinstance(target, pywikibot.WbQuantity):
+        return {"type": "quantity", "value": target.toWikibase()}
+    if isinstance(target, pywikibot.Coordinate):
+        return {"type": "globecoordinate", "value": target.toWikibase()}
+    return {"type": "string", "value": target}
+
+
+def decode_target(data, repo):
+    """
+    Decode a target encoded by encode_target.
+
+    :param data: dictionary with the type and the value
+    :param repo: the data repository the target belongs to
+    :return: the target, and whether it's somevalue/novalue
+    """
+    import pywikibot
+    kind = data["type"]
+    if kind in ["somevalue", "novalue"]:
+        return (kind, True)
+    value = data.get("value")
+    if kind == "item":
+        return (pywikibot.ItemPage(repo, value), False)
+    if kind == "time":
+        return (pywikibot.WbTime.fromWikibase(value, site=repo), False)
+    if kind == "quantity":
+        return (pywikibot.WbQuantity.fromWikibase(value, site=repo), False)
+    if kind == "globecoordinate":
+        return (pywikibot.Coordinate.fromWikibase(value, site=repo), False)
+    return (value, False)
+
+
+def encode_reference(ref):
+    """Encode a wikidataStuff Reference."""
+    parts = {}
+    for key, claims in [("test", ref.source_test),
+                        ("notest", ref.source_notest)]:
+        parts[key] = []
+        for claim in claims:
+            part = encode_target(claim.getTarget())
+            part["prop"] = claim.getID()
+            parts[key].append(part)
+    return parts
+
+
+def decode_reference(data, wdstuff):
+    """Decode a reference encoded by encode_reference."""
+    parts = {}
+    for key in ["test", "notest"]:
+        parts[key] = []
+        for part in data[key]:
+            target, _ = decode_target(part, wdstuff.repo)
+            parts[key].append(
+                wdstuff.make_simple_claim(part["prop"], target))
+    return wdstuff.Reference(source_test=parts["test"],
+                             source_notest=parts["notest"])
+
+
+def encode_item(area, dataset_code):
+    """
+    Encode the wd_item of a built NatureArea.
+
+    :param area: the NatureArea
+    :param dataset_code: short name of its dataset, e.g. "nr"
+    :return: dictionary, one line of the export file
+    """
+    wd_item = area.wd_item
+    refs = []
+    statements = []
+    for claim in wd_item["statements"]:
+        statement = claim["value"]
+        encoded = encode_target(statement.itis, statement.special)
+        encoded["prop"] = claim["prop"]
+        encoded["quals"] = []
+        for qual in statement.quals:
+            encoded_qual = encode_target(qual.itis)
+            encoded_qual["prop"] = qual.prop
+            encoded["quals"].append(encoded_qual)
+        encoded["ref"] = None
+        if claim["ref"] is not None:
+            ref = encode_reference(claim["ref"])
+            if ref not in refs:
+                refs.append(ref)
+            encoded["ref"] = refs.index(ref)
+        statements.append(encoded)
+    return {"key": area.raw_data["NVRID"],
+            "name": area.raw_data["NAMN"],
+            "dataset": dataset_code,
+            "county": area.raw_data.get("LAN"),
+            "item": wd_item["wd-item"],
+            "upload": wd_item["upload"],
+            "labels": {x["language"]: x["value"] for x in wd_item["labels"]},
+            "descriptions": {x["language"]: x["value"]
+                             for x in wd_item["descriptions"]},
+            "refs": refs,
+            "statements": statements}
+
+
+def decode_item(record, repo):
+    """
+    Rebuild an item from a line of an export file.
+
+    :param record: the line, as a dictionary
+    :param repo: the data repository to upload to
+    :return: a SerializedItem
+    """
+    from wikidataStuff.WikidataStuff import WikidataStuff as WDS
+    wdstuff = WDS(repo)
+    refs = [decode_reference(x, wdstuff) for x in record["refs"]]
+    statements = []
+    for encoded in record["statements"]:
+        target, special = decode_target(encoded, repo)
+        statement = wdstuff.Statement(target, special=special)
+        for encoded_qual in encoded["quals"]:
+            qual_target, _ = decode_target(encoded_qual, repo)
+            statement.addQualifier(
+                wdstuff.Qualifier(encoded_qual["prop"], qual_target))
+        ref = refs[encoded["ref"]] if encoded["ref"] is not None else None
+        statements.append({"prop": encoded["prop"],
+                           "value": statement,
+                           "ref": ref})
+    wd_item = {"upload": record["upload"],
+               "wd-item": record["item"],
+               "labels": [{"language": k, "value": v}
+                          for k, v in sorted(record["labels"].items())],
+               "descriptions": [{"language": k, "value": v}
+                                for k, v in
+                                sorted(record["descriptions"].items())],
+               "statements": statements}
+    return SerializedItem(record, wd_item)
+
+
+def encode_record(record):
+    """Get the line of an encoded item in an export file."""
+    return json.dumps(record, ensure_ascii=False,
+                      separators=(",", ":")) + "\n"
+
+
+class RecordWriter(object):
+    """
+    Write encoded items to an export file as they are built.
+
+    Every item is written, and flushed, as soon as it's added,
+    so an interrupted run keeps what it exported, and the items
+    are not kept in memory.
+    """
+
+    def __init__(self, filepath):
+        """Start a new export file, replacing any old one."""
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.count = 0
+        self.f_obj = open(filepath, "w")
+
+    def write(self, record):
+        """Add an encoded item to the file."""
+        line = encode_record(record)
+        with self.lock:
+            self.f_obj.write(line)
+            self.f_obj.flush()
+            self.count += 1
+
+    def close(self):
+        """Close the file."""
+        with self.lock:
+            self.f_obj.close()
+
+
+def iter_records(filepath):
+    """Read the encoded items of an export file, one by one."""
+    with open(filepath) as f_obj:
+        for line in f_obj:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_journal(filepath):
+    """
+    Read an upload journal.
+
+    :return: dictionary of key -> item it was uploaded to,
+             empty if there is no journal yet
+    """
+    done = {}
+    try:
+        with open(filepath) as f_obj:
+            for line in f_obj:
+                if line.strip():
+                    entry = json.loads(line)
+                    done[entry["key"]] = entry["item"]
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def append_journal(filepath, key, item):
+    """Record in the journal that an item was uploaded."""
+    line = json.dumps({"key": key, "item": item}) + "\n"
+    with journal_lock:
+        with open(filepath, "a") as f_obj:
+            f_obj.write(line)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Compile the mapping files into a single bundle with lookup indexes.
+
+Every run of nature_importer needs the same eight json files
+from the data directory, and looks values up in them by
+name or by nature ID. The bundle holds the content of all
+of them together with dictionaries for those lookups,
+pickled into one file, so a run loads a single file and
+never scans the lists.
+
+The bundle records the modification time and size of every
+source file it was built from. If any of them has changed,
+or the bundle was written by another version of this module,
+it's rebuilt the next time it's loaded.
+
+To build the bundle by hand:
+
+    python3 mapping_bundle.py
+"""
+import json
+import os
+import pickle
+
+BUNDLE_VERSION = 1
+BUNDLE_FILE = "mapping_bundle.pickle"
+MAPPING_FILES = ["glossary.json",
+                 "forvaltare.json",
+                 "iucn_categories.json",
+                 "mapping_nationalparks.json",
+                 "svwp_to_nature_id_exact.json",
+                 "municipalities.json",
+                 "items.json",
+                 "properties.json"]
+
+
+def get_data_dir():
+    """Get the absolute path of the data directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def get_fingerprints(data_dir):
+    """
+    Get the modification time and size of every mapping file.
+
+    :return: dictionary of filename -> (mtime in ns, size)
+    """
+    fingerprints = {}
+    for filename in MAPPING_FILES:
+        stat = os.stat(os.path.join(data_dir, filename))
+        fingerprints[filename] = (stat.st_mtime_ns, stat.st_size)
+    return fingerprints
+
+
+def index_by(entries, key, lower=False):
+    """
+    Index a list of mappings by one of their keys.
+
+    If several entries have the same key, the first one is used.
+
+    :param entries: list of dictionaries with an "item"
+    :param key: e.g. "nature_id"
+    :param lower: whether to index by the lowercased value
+    :return: dictionary of value -> item
+    """
+    index = {}
+    for entry in entries:
+        value = entry.get(key)
+        if value is None:
+            continue
+        if lower:
+            value = value.lower()
+        index.setdefault(value, entry["item"])
+    return index
+
+
+def build_indexes(files):
+    """
+    Build the lookup indexes of the mapping files.
+
+    :param files: dictionary of file base name -> content
+    :return: dictionary of index name -> index
+    """
+    return {
+        "municipalities_en": index_by(files["municipalities"], "en",
+                                      lower=True),
+        "municipalities_sv": index_by(files["municipalities"], "sv",
+                                      lower=True),
+        "forvaltare_sv": index_by(files["forvaltare"], "sv", lower=True),
+        "mapping_nationalparks": index_by(files["mapping_nationalparks"],
+                                          "nature_id"),
+        "svwp_to_nature_id_exact": index_by(files["svwp_to_nature_id_exact"],
+                                            "nature_id"),
+    }
+
+
+def build_bundle(data_dir):
+    """
+    Read the mapping files and build the bundle.
+
+    :param data_dir: directory with the mapping files
+    :return: dictionary with the version, fingerprints,
+             file contents and indexes
+    """
+    fingerprints = get_fingerprints(data_dir)
+    files = {}
+    for filename in MAPPING_FILES:
+        filename_base = os.path.splitext(filename)[0]
+        with open(os.path.join(data_dir, filename)) as f_obj:
+            files[filename_base] = json.load(f_obj)
+    return {"version": BUNDLE_VERSION,
+            "fingerprints": fingerprints,
+            "files": files,
+            "indexes": build_indexes(files)}
+
+
+def save_bundle(bundle, filepath):
+    """Write a bundle to file, replacing any old one at once."""
+    temporary = "{}.{}.tmp".format(filepath, os.getpid())
+    with open(temporary, "wb") as f_obj:
+        pickle.dump(bundle, f_obj, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, filepath)
+
+
+def read_bundle(filepath):
+    """
+    Read a bundle from file.
+
+    :return: the bundle, or None if it's missing or can't be read
+    """
+    try:
+        with open(filepath, "rb") as f_obj:
+            bundle = pickle.load(f_obj)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+        return None
+    if not isinstance(bundle, dict):
+        return None
+    return bundle
+
+
+def is_current(bundle, data_dir):
+    """Check if a bundle was built from the current mapping files."""
+    return (bundle is not None and
+            bundle.get("version") == BUNDLE_VERSION and
+            bundle.get("fingerprints") == get_fingerprints(data_dir))
+
+
+def load_bundle(data_dir=None):
+    """
+    Load the mapping bundle, rebuilding it if it's out of date.
+
+    :param data_dir: directory with the mapping files,
+                     the data directory by default
+    :return: the bundle, see build_bundle
+    """
+    if data_dir is None:
+        data_dir = get_data_dir()
+    filepath = os.path.join(data_dir, BUNDLE_FILE)
+    bundle = read_bundle(filepath)
+    if not is_current(bundle, data_dir):
+        print("Building mapping bundle {}.".format(filepath))
+        bundle = build_bundle(data_dir)
+        try:
+            save_bundle(bundle, filepath)
+        except OSError as error:
+            print("Could not save mapping bundle: {}".format(error))
+    return bundle
+
+
+if __name__ == "__main__":
+    data_dir = get_data_dir()
+    bundle = build_bundle(data_dir)
+    save_bundle(bundle, os.path.join(data_dir, BUNDLE_FILE))
+    print("Built {} from {} files.".format(BUNDLE_FILE, len(MAPPING_FILES)))
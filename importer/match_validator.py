@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Check the Wikidata items matched to nature areas before upload.
+
+The matches come either from items that already have the
+nature ID, or from the mapping files, which for nature
+reserves were generated from svwp articles by
+reserve_harvester.py. Many of those articles describe a lake,
+an island or a valley as much as the reserve, and their items
+can have been merged or deleted since the mapping was made.
+
+All matched items of a run are fetched in a few batched
+requests, and:
+* items that have been merged are replaced by the target
+  of the redirect,
+* areas matched to deleted items are not uploaded,
+* areas matched via the mapping files to an item whose P31
+  is set, but not to a kind of protected area, are
+  not uploaded, since the item probably describes
+  the natural feature rather than the reserve.
+
+All of these are collected in a report, grouped by problem.
+"""
+import importer_utils as utils
+
+ACCEPTED_TYPES = ["nature_reserve", "national_park", "protected_area"]
+
+
+def get_matched_items(areas):
+    """Get the distinct Q-ids matched to a list of nature areas."""
+    return sorted(set(x.wd_item["wd-item"] for x in areas
+                      if x.wd_item["wd-item"] is not None))
+
+
+def make_report_entry(area, item, details=None):
+    """Create an entry of the validation report."""
+    entry = {"nature_id": area.raw_data["NVRID"],
+             "name": area.raw_data["NAMN"],
+             "item": item}
+    if details is not None:
+        entry["details"] = details
+    return entry
+
+
+def validate_matches(repo, areas, items):
+    """
+    Validate the matched items of nature areas, in bulk.
+
+    Redirected matches are rewritten, and areas with
+    deleted or suspicious matches are marked as not
+    to be uploaded.
+
+    :param repo: Wikidata site instance
+    :param areas: list of NatureArea objects
+    :param items: the items.json mapping file
+    :return: dictionary of problem -> list of report entries
+    """
+    accepted = set(items[x] for x in ACCEPTED_TYPES)
+    matched = get_matched_items(areas)
+    if not matched:
+        return {}
+    print("Validating {} matched items.".format(len(matched)))
+    entities = utils.get_entities(repo, matched)
+    report = {}
+    for area in areas:
+        item = area.wd_item["wd-item"]
+        if item is None:
+            continue
+        entity = entities.get(item)
+        if entity is None or "missing" in entity:
+            report.setdefault("deleted", []).append(
+                make_report_entry(area, item))
+            area.wd_item["upload"] = False
+            continue
+        if entity["id"] != item:
+            report.setdefault("redirect", []).append(
+                make_report_entry(area, item, entity["id"]))
+            area.associate_wd_item(entity["id"])
+        instance_of = utils.get_claim_values(entity, "P31")
+        if (getattr(area, "match_source", None) == "mapping" and
+                instance_of and not accepted.intersection(instance_of)):
+            report.setdefault("suspicious_p31", []).append(
+                make_report_entry(area, entity["id"], instance_of))
+            area.wd_item["upload"] = False
+    return report
+
+
+def print_report(report):
+    """Print a summary of the validation report."""
+    for problem in sorted(report):
+        print("Matched items, {}: {}".format(problem, len(report[problem])))
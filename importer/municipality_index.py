@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Check the municipalities of nature areas against their boundaries.
+
+The municipalities (P131) of an area come from the free-text
+KOMMUN column of the source data, which has old and
+misspelled names in it. If the municipality boundaries are
+available as newline-delimited GeoJSON
+(data/municipality_polygons.geojsonl, e.g. from Lantmäteriet
+via `ogr2ogr -f GeoJSONSeq`), every area with a polygon is
+located in them instead:
+
+* points spread evenly inside the area's polygon are looked
+  up in a PolygonIndex of the municipalities,
+* a municipality holding at least MIN_SHARE of the points,
+  or the representative point of the area, is one
+  the area lies in.
+
+The result is compared with KOMMUN, and the differences are
+collected in a report, grouped by problem. When KOMMUN has
+a name that can't be matched to a municipality, the area
+gets the municipalities found from its polygon instead.
+
+Every feature of the boundary file is matched to a municipality
+by an "item" property with its Q-id, or by its name in one
+of NAME_PROPERTIES, see preflight.find_municipality. Both files
+can be in WGS84 or SWEREF99 TM.
+"""
+import area_geometry
+import preflight
+
+BOUNDARY_FILE = "municipality_polygons.geojsonl"
+NAME_PROPERTIES = ["KnNamn", "KOMMUNNAMN", "name"]
+MIN_SHARE = 0.1
+SAMPLE_GRID = 8
+
+
+def get_feature_item(properties, indexes):
+    """Get the municipality item of a feature of the boundary file."""
+    if properties.get("item"):
+        return properties["item"]
+    for key in NAME_PROPERTIES:
+        if properties.get(key):
+            return preflight.find_municipality(str(properties[key]), indexes)
+    return None
+
+
+def load_boundaries(filepath, indexes):
+    """
+    Load the municipality boundaries into a PolygonIndex.
+
+    :param filepath: newline-delimited GeoJSON file
+    :param indexes: the indexes of the mapping bundle
+    :return: tuple (PolygonIndex keyed by Q-id,
+             list of properties of the features
+             that could not be matched to a municipality)
+    """
+    features = []
+    unmatched = []
+    for feature in area_geometry.iter_features(filepath):
+        properties = feature.get("properties") or {}
+        item = get_feature_item(properties, indexes)
+        if item is None:
+            unmatched.append(properties)
+            continue
+        features.append((item, feature.get("geometry")))
+    return (area_geometry.PolygonIndex(features), unmatched)
+
+
+def locate_area(index, geometry, point=None):
+    """
+    Find the municipalities an area lies in.
+
+    :param index: PolygonIndex of the municipalities
+    :param geometry: GeoJSON (Multi)Polygon of the area
+    :param point: representative point of the area, (x, y) in
+                  either system, computed from the geometry if None
+    :return: dictionary of Q-id -> share of the area in it,
+             empty if the area is outside all of them
+    """
+    if point is None:
+        summary = area_geometry.summarize_geometry(geometry)
+        if summary is None:
+            return {}
+        point = summary["point"]
+    points = area_geometry.interior_points(geometry, SAMPLE_GRID)
+    hits = {}
+    for sample in points:
+        x, y = area_geometry.to_system(sample, index.projected)
+        for item in index.lookup(x, y):
+            hits[item] = hits.get(item, 0) + 1
+    shares = {k: v / len(points) for k, v in hits.items()}
+    x, y = area_geometry.to_system(point, index.projected)
+    for item in index.lookup(x, y):
+        shares.setdefault(item, 0.0)
+        shares[item] = max(shares[item], MIN_SHARE)
+    return shares
+
+
+def make_report_entry(row, **details):
+    """Create an entry of the municipality report."""
+    entry = {"nature_id": row["NVRID"], "name": row["NAMN"],
+             "kommun": row["KOMMUN"]}
+    entry.update(details)
+    return entry
+
+
+def check_area(index, geometry, row, indexes, point=None):
+    """
+    Locate a nature area in the municipalities and compare with KOMMUN.
+
+    :param index: PolygonIndex of the municipalities
+    :param geometry: GeoJSON (Multi)Polygon of the area
+    :param row: the source data of the area
+    :param indexes: the indexes of the mapping bundle
+    :param point: representative point of the area, see locate_area
+    :return: tuple (Q-ids of the municipalities found,
+             dictionary of problem -> report entry)
+    """
+    shares = locate_area(index, geometry, point)
+    located = sorted(x for x, share in shares.items()
+                     if share >= MIN_SHARE)
+    problems = {}
+    listed, unknown = preflight.resolve_municipalities(
+        row["KOMMUN"], indexes)
+    if unknown:
+        problems["unknown_name"] = make_report_entry(
+            row, unknown=unknown, found=located)
+    if not shares:
+        problems["outside_boundaries"] = make_report_entry(row)
+        return (located, problems)
+    missing = [x for x in located if x not in listed]
+    if missing and not unknown:
+        problems["not_in_kommun"] = make_report_entry(row, items=missing)
+    outside = [x for x in listed if x not in shares]
+    if outside:
+        problems["outside_polygon"] = make_report_entry(row, items=outside)
+    return (located, problems)
+
+
+def check_areas(filepath, index, rows, indexes, geometry=None):
+    """
+    Locate nature areas in the municipalities and compare with KOMMUN.
+
+    The polygon file is streamed one feature at a time,
+    and only the areas in rows are processed. If an area has
+    more than one feature, the same one is used as for its
+    coordinates, see area_geometry.is_preferred_feature.
+
+    :param filepath: newline-delimited GeoJSON file of the areas
+    :param index: PolygonIndex of the municipalities
+    :param rows: the source data of the areas to check
+    :param indexes: the indexes of the mapping bundle
+    :param geometry: the points of the areas, if already
+                     loaded by area_geometry.load_geometry
+    :return: tuple (dictionary of NVRID -> Q-ids of the
+             municipalities found, dictionary of problem ->
+             list of report entries)
+    """
+    by_id = {x["NVRID"]: x for x in rows}
+    checked = {}
+    for feature in area_geometry.iter_features(filepath):
+        properties = feature.get("properties") or {}
+        nature_id = str(properties.get("NVRID"))
+        row = by_id.get(nature_id)
+        if row is None or not area_geometry.is_preferred_feature(
+                nature_id, properties, checked):
+            continue
+        point = None
+        if geometry and nature_id in geometry:
+            point = (geometry[nature_id]["longitude"],
+                     geometry[nature_id]["latitude"])
+        checked[nature_id] = check_area(
+            index, feature.get("geometry"), row, indexes, point)
+    found = {}
+    report = {}
+    for nature_id, row in by_id.items():
+        if nature_id not in checked:
+            report.setdefault("no_polygon", []).append(
+                make_report_entry(row))
+            continue
+        found[nature_id], problems = checked[nature_id]
+        for problem, entry in problems.items():
+            report.setdefault(problem, []).append(entry)
+    return (found, report)
+
+
+def print_report(report):
+    """Print a summary of the municipality report."""
+    for problem in sorted(report):
+        print("Municipalities, {}: {}".format(problem, len(report[problem])))
@@ -1,18 +1,35 @@
 #!/usr/bin/env python3
 import argparse
+import datetime
+import itertools
+import json
 import os
 
-import wikidataStuff.wdqsLookup as lookup
-
 from NatureArea import NatureArea
+from pipeline import Pipeline
 from PreviewTable import PreviewTable
 from Uploader import Uploader
+from UploadThrottle import UploadThrottle
+import api_costs
+import area_columns
+import area_geometry
+import changeset
+import datasets
+import http_cache
 import importer_utils as utils
+import item_serializer
+import mapping_bundle
+import match_validator
+import municipality_index
+import preflight
+import reference_refresh
+import sharding
+import upload_estimate
+import wdqs
 
-reserves_file = "NR_polygon.csv"
-nationalparks_file = "NP_polygon.csv"
-edit_summary_reserves = "#WLESE #naturreservat"
-edit_summary_nationalparks = "#WLESE #nationalpark"
+VALIDATE_BATCH_SIZE = 200
+REFRESH_BATCH_SIZE = 500
+REFRESH_SUMMARY = "#WLESE updating the dates of the source data"
 
 
 def get_status(row):
@@ -84,27 +101,192 @@ def remove_duplicate_entries(nature_dataset):
     return results
 
 
-def load_nature_area_file(which_one):
+def load_nature_area_file(dataset, nature_ids=None):
     """
     Load source file with nature area data.
 
-    :param which_one: nr for reserves or np for parks.
+    :param dataset: the Dataset to load, see datasets.py.
+    :param nature_ids: only load the rows of these areas,
+                       using the index of the source file
     """
-    if which_one == "nr":
-        filepath = utils.get_file_from_subdir("data", reserves_file)
-    elif which_one == "np":
-        filepath = utils.get_file_from_subdir("data", nationalparks_file)
-    print("Loading dataset: {}".format(filepath))
-    dataset = utils.get_data_from_csv_file(filepath)
-    print("Source dataset: {} rows.".format(str(len(dataset))))
-    no_invalid = remove_invalid_entries(dataset)
+    print("Loading dataset: {}".format(dataset.get_source_path()))
+    if nature_ids:
+        nature_dataset, missing = dataset.load_rows_by_id(nature_ids)
+        if missing:
+            print("Not in {}: {}.".format(dataset.source_file,
+                                          ", ".join(missing)))
+    else:
+        nature_dataset = dataset.load_rows()
+    print("Source dataset: {} rows.".format(str(len(nature_dataset))))
+    return clean_nature_dataset(nature_dataset)
+
+
+def clean_nature_dataset(nature_dataset):
+    """Remove invalid and duplicate entries from a loaded dataset."""
+    no_invalid = remove_invalid_entries(nature_dataset)
     no_duplicates = remove_duplicate_entries(no_invalid)
     print("Cleaned up duplicates and invalid items: {} rows left.".format(
         str(len(no_duplicates))))
     return no_duplicates
 
 
-def get_wd_items_using_prop(prop):
+def keep_changed_entries(dataset, nature_dataset, previous_dir,
+                         current_time, nature_ids=None):
+    """
+    Keep only the areas that changed since the previous release.
+
+    The previous release is expected in previous_dir,
+    under the same filenames as the current source and geometry files.
+    It's cleaned the same way as the current one before comparing.
+    If both releases have a geometry file, areas whose coordinates
+    moved count as changed too.
+    The changeset is saved to file.
+
+    :param dataset: the Dataset being processed
+    :param nature_dataset: cleaned rows of the current release
+    :param previous_dir: directory with the previous release
+    :param current_time: timestamp of the run, used in filenames
+    :param nature_ids: optionally, the areas selected with --nvrid;
+                       the rest of the previous release is ignored
+    """
+    filepath = os.path.join(previous_dir, dataset.source_file)
+    if not os.path.isfile(filepath):
+        print("No previous release {}, all areas are new.".format(filepath))
+        previous_dataset = []
+    else:
+        print("Loading previous release: {}".format(filepath))
+        previous_dataset = clean_nature_dataset(
+            utils.get_data_from_csv_file(filepath))
+    if nature_ids:
+        selected = set(nature_ids)
+        previous_dataset = [x for x in previous_dataset
+                            if get_nature_id(x) in selected]
+    old_fingerprints, new_fingerprints = load_geometry_fingerprints(
+        dataset, previous_dir, previous_dataset, nature_dataset)
+    changes = changeset.compare_releases(
+        previous_dataset, nature_dataset, old_fingerprints,
+        new_fingerprints, nature_ids)
+    changeset.print_changeset(changes)
+    filename = "changeset_{}_{}.json".format(dataset.code, current_time)
+    utils.json_to_file(filename, changes)
+    return changeset.filter_changed(nature_dataset, changes)
+
+
+def load_geometry_fingerprints(dataset, previous_dir, previous_dataset,
+                               nature_dataset):
+    """
+    Load the locations of the areas in both releases, for comparing.
+
+    :return: tuple (previous fingerprints, current fingerprints),
+             both None unless both releases have a geometry file
+    """
+    current_path = dataset.get_geometry_path()
+    previous_path = os.path.join(previous_dir,
+                                 os.path.basename(current_path))
+    if not (os.path.isfile(current_path) and
+            os.path.isfile(previous_path)):
+        print("No geometry files in both releases, "
+              "not comparing coordinates.")
+        return None, None
+    fingerprints = []
+    for filepath, rows in ((previous_path, previous_dataset),
+                           (current_path, nature_dataset)):
+        wanted_ids = set(get_nature_id(x) for x in rows)
+        geometry = area_geometry.load_geometry(filepath, wanted_ids)
+        fingerprints.append(changeset.geometry_fingerprints(
+            geometry, area_geometry.COORDINATE_PRECISION))
+    return tuple(fingerprints)
+
+
+def load_geometry_file(dataset, nature_dataset):
+    """
+    Load representative points of the nature areas from polygon data.
+
+    The polygons are streamed one feature at a time,
+    and only the areas in the dataset are processed.
+    If there is no geometry file, the areas get no coordinates.
+
+    :param dataset: the Dataset whose polygons to load
+    :param nature_dataset: the rows that will be processed
+    """
+    filepath = dataset.get_geometry_path()
+    if not os.path.isfile(filepath):
+        print("No geometry file {}, skipping coordinates.".format(filepath))
+        return {}
+    wanted_ids = set(get_nature_id(x) for x in nature_dataset)
+    geometry = area_geometry.load_geometry(filepath, wanted_ids)
+    print("Computed coordinates of {} areas.".format(len(geometry)))
+    return geometry
+
+
+def check_municipalities(dataset, nature_dataset, data_files, run):
+    """
+    Locate the nature areas in the municipality boundaries.
+
+    The municipalities found from the polygons are compared
+    with the KOMMUN column, and the problems are reported
+    and saved to file. If the boundary file or the polygons
+    are missing, nothing is checked.
+
+    :param dataset: the Dataset whose polygons to use
+    :param nature_dataset: the rows that will be processed
+    :param data_files: the mapping files, with their indexes
+    :param run: state shared by the whole run, see main
+    :return: dictionary of NVRID -> Q-ids of the municipalities
+    """
+    boundary_path = utils.get_file_from_subdir(
+        "data", municipality_index.BOUNDARY_FILE)
+    geometry_path = dataset.get_geometry_path()
+    if not (os.path.isfile(boundary_path) and
+            os.path.isfile(geometry_path)):
+        print("No municipality boundaries or polygons, "
+              "skipping the municipality check.")
+        return {}
+    index, unmatched = municipality_index.load_boundaries(
+        boundary_path, data_files["indexes"])
+    if unmatched:
+        print("{} features of {} are not a known municipality.".format(
+            len(unmatched), boundary_path))
+    found, report = municipality_index.check_areas(
+        geometry_path, index, nature_dataset, data_files["indexes"],
+        data_files.get("geometry"))
+    print("Located {} areas in the municipalities.".format(len(found)))
+    if report:
+        municipality_index.print_report(report)
+        filename = "municipality_problems_{}_{}.json".format(
+            dataset.code, run["timestamp"])
+        utils.json_to_file(filename, report)
+    return found
+
+
+def check_rows(dataset, nature_dataset, column_problems, data_files, run):
+    """
+    Check all the rows against the mapping files before building.
+
+    The report is saved to file, and the problems of every
+    row are kept in data_files, to be added to the problem
+    report of its NatureArea, see preflight.py.
+
+    :param dataset: the Dataset being processed
+    :param nature_dataset: the rows that will be processed
+    :param column_problems: the problems found by area_columns
+    :param data_files: the mapping files, with their indexes
+    :param run: state shared by the whole run, see main
+    :return: the rows without errors
+    """
+    report = preflight.validate_rows(nature_dataset, data_files,
+                                     column_problems)
+    preflight.print_report(report)
+    if report["problems"]:
+        filename = "preflight_{}_{}.json".format(
+            dataset.code, run["timestamp"])
+        utils.json_to_file(filename, preflight.report_to_json(report))
+    data_files["problems"] = report["problems"]
+    return preflight.exclude_rows(nature_dataset, report)
+
+
+def get_wd_items_using_prop(prop, page_size=None,
+                            endpoint=wdqs.WDQS_ENDPOINT, existing_file=None):
     """
     Get WD items that already have some value of a unique ID.
 
@@ -114,81 +296,701 @@ def get_wd_items_using_prop(prop):
     some items. When matching, these should take predecence
     over any hardcoded matching files.
 
+    With a page size, the query is split into pages that are
+    streamed one at a time, retrying on timeouts.
+    Otherwise it is sent as a single query.
+    With an existing file, made by dump_reader.py from
+    a Wikidata dump, no query is sent at all.
+
+    If the same ID is used on several items, the conflict is
+    reported and saved to file, and the oldest item is used.
+
     The output is a dictionary of ID's and items
     that looks like this:
     {'4420': 'Q28936211', '2041': 'Q28933898'}
+
+    :param prop: the ID property, e.g. P3613
+    :param page_size: number of results per query, or None
+    :param endpoint: url of the SPARQL endpoint, used with a page size
+    :param existing_file: json file of ID -> items using it
     """
-    items = {}
+    if existing_file:
+        print("LOADING WD ITEMS THAT USE {} FROM {}".format(
+            prop, existing_file))
+        data = utils.load_json(existing_file)
+        pairs = ((value, item) for value, found in data.items()
+                 for item in found)
+        return group_existing_items(prop, pairs)
     print("WILL NOW DOWNLOAD WD ITEMS THAT USE " + prop)
     query = "SELECT DISTINCT ?item ?value  WHERE {?item p:" + \
         prop + "?statement. OPTIONAL { ?item wdt:" + prop + " ?value. }}"
-    data = lookup.make_simple_wdqs_query(query, verbose=False)
-    for x in data:
-        key = lookup.sanitize_wdqs_result(x['item'])
-        value = x['value']
-        items[value] = key
+    if page_size:
+        rows = wdqs.iter_paged_query(query, "?item ?value", page_size,
+                                     endpoint=endpoint)
+        pairs = ((x["value"], x["item"]) for x in rows if x["value"])
+    else:
+        import wikidataStuff.wdqsLookup as lookup
+        data = lookup.make_simple_wdqs_query(query, verbose=False)
+        pairs = ((x["value"], lookup.sanitize_wdqs_result(x["item"]))
+                 for x in data)
+    return group_existing_items(prop, pairs)
+
+
+def group_existing_items(prop, pairs):
+    """
+    Get the item of every ID, reporting IDs used on several items.
+
+    :param prop: the ID property, e.g. P3613
+    :param pairs: iterable of (ID, item) pairs
+    :return: dictionary of ID -> oldest item with it
+    """
+    grouped = wdqs.group_values(pairs)
+    items = {value: found[0] for value, found in grouped.items()}
+    conflicts = {value: found for value, found in grouped.items()
+                 if len(found) > 1}
     print("FOUND {} WD ITEMS WITH PROP {}".format(len(items), prop))
+    if conflicts:
+        filename = "conflicts_{}.json".format(prop)
+        print("{} IDS ARE USED ON SEVERAL ITEMS, SEE {}".format(
+            len(conflicts), filename))
+        utils.json_to_file(filename, conflicts)
     return items
 
 
-def load_mapping_files():
-    """Load the files with mappings of various values."""
-    mapping_files = {}
-    files_to_get = ["glossary.json",
-                    "forvaltare.json",
-                    "iucn_categories.json",
-                    "mapping_nationalparks.json",
-                    "svwp_to_nature_id_exact.json",
-                    "municipalities.json",
-                    "items.json",
-                    "properties.json"]
-    for filename in files_to_get:
-        filename_base = os.path.splitext(filename)[0]
-        file_content = utils.load_json(
-            utils.get_file_from_subdir("data", filename))
-        mapping_files[filename_base] = file_content
+def load_mapping_files(bundle=None):
+    """
+    Load the files with mappings of various values.
+
+    They come from the compiled mapping bundle, together
+    with the indexes used to look values up in them,
+    see mapping_bundle.py.
+
+    :param bundle: a bundle that is already loaded,
+                   otherwise it's loaded from file
+    """
+    if bundle is None:
+        bundle = mapping_bundle.load_bundle()
+    mapping_files = dict(bundle["files"])
+    mapping_files["indexes"] = bundle["indexes"]
     return mapping_files
 
 
-def main(arguments):
-    """Process the arguments and fetch data according to them"""
-    arguments = vars(arguments)
-    current_time = utils.get_current_timestamp()
-    wikidata_site = utils.create_site_instance("wikidata", "wikidata")
-    existing_areas = get_wd_items_using_prop("P3613")
-    area_data = load_nature_area_file(arguments["dataset"])
-    data_files = load_mapping_files()
+def get_site(arguments, run):
+    """
+    Get the site to work on, set up the first time it's needed.
+
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    if run["site"] is None:
+        run["site"] = utils.create_site_instance(*arguments["site"])
+    return run["site"]
+
+
+def get_existing(arguments, run):
+    """
+    Get the items that already have a nature ID, when first needed.
+
+    When uploading from an export file, they are not downloaded,
+    see upload_exported.
+
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    if run["existing"] is None:
+        if arguments["from_export"]:
+            run["existing"] = {}
+        else:
+            run["existing"] = get_wd_items_using_prop(
+                "P3613", page_size=arguments["wdqs_page_size"],
+                endpoint=arguments["sparql_endpoint"],
+                existing_file=arguments["existing_file"])
+    return run["existing"]
+
+
+def get_throttle(arguments, run):
+    """
+    Get the upload throttle, set up the first time it's needed.
+
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    if run["throttle"] is None:
+        # In the sandbox all edits go to the same item,
+        # so they are never concurrent there.
+        if arguments["upload"] == "live":
+            max_workers = arguments["workers"]
+        else:
+            max_workers = 1
+        run["throttle"] = UploadThrottle(
+            site=get_site(arguments, run),
+            min_interval=arguments["min_interval"],
+            start_interval=arguments["start_interval"],
+            max_workers=max_workers,
+            target_lag=arguments["maxlag"])
+    return run["throttle"]
+
+
+def prepare_upload(reserve, dataset, arguments, run):
+    """
+    Set up the upload of a single nature area.
+
+    In live mode, the content of the item it will be
+    uploaded to is fetched already, before the upload
+    gets a slot from the throttle.
+    The API requests made are counted for the area,
+    see api_costs.py.
+
+    :param reserve: the NatureArea to upload
+    :param dataset: the Dataset it belongs to
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    :return: tuple (reserve, Uploader, cost record)
+    """
+    live = True if arguments["upload"] == "live" else False
+    nature_id = get_nature_id(reserve.raw_data)
+    is_new = live and reserve.wd_item["wd-item"] is None
+    record = api_costs.new_record(nature_id, dataset.code, is_new)
+    with api_costs.counting(record):
+        uploader = Uploader(reserve,
+                            repo=run["site"],
+                            live=live,
+                            edit_summary=dataset.edit_summary)
+        uploader.prefetch()
+    return (reserve, uploader, record)
+
+
+def upload_area(prepared, arguments, run):
+    """
+    Upload a single nature area, set up by prepare_upload.
+
+    If a new item is created, it's added to the existing items,
+    so that it's matched if the area is processed again.
+    With a journal, live uploads are recorded in it.
+
+    :param prepared: tuple (reserve, Uploader, cost record)
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    reserve, uploader, record = prepared
+    live = True if arguments["upload"] == "live" else False
+    nature_id = get_nature_id(reserve.raw_data)
+    try:
+        with api_costs.counting(record):
+            uploader.upload()
+    finally:
+        api_costs.finish(record)
+    if uploader.created:
+        run["existing"][nature_id] = uploader.wd_item_q
+        reserve.associate_wd_item(uploader.wd_item_q)
+    if live and arguments["journal"] and reserve.wd_item["upload"]:
+        item_serializer.append_journal(
+            arguments["journal"], nature_id, uploader.wd_item_q)
+
+
+def add_upload_stages(pipeline, dataset, arguments, run):
+    """
+    Add the stages that upload nature areas to a pipeline.
+
+    The prefetch stage skips the areas already in the journal
+    and fetches the items to be edited, the upload stage
+    uploads at the pace allowed by the throttle.
+    Both run as many workers as the throttle allows
+    concurrent uploads. A failed upload is reported and
+    the rest continue, unless all the recent ones failed.
+
+    :param pipeline: the Pipeline to add the stages to
+    :param dataset: the Dataset the areas belong to
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    throttle = get_throttle(arguments, run)
+    max_workers = throttle.max_workers
+    uploaded = itertools.count(1)
+
+    def prefetch(reserve):
+        if get_nature_id(reserve.raw_data) in run["journaled"]:
+            return None
+        return prepare_upload(reserve, dataset, arguments, run)
+
+    def upload_in_slot(prepared):
+        try:
+            with throttle.slot():
+                upload_area(prepared, arguments, run)
+        except Exception as error:
+            print("Upload failed: {}".format(error))
+            if throttle.is_failing():
+                raise
+        if next(uploaded) % 10 == 0:
+            throttle.print_metrics()
+
+    pipeline.add_stage("prefetch", prefetch, workers=max_workers)
+    pipeline.add_stage("upload", upload_in_slot, workers=max_workers)
+
+
+def run_pipeline(pipeline, items, dataset, arguments, run):
+    """
+    Run items through a pipeline and save its metrics.
+
+    :param pipeline: the Pipeline to run
+    :param items: iterable of items for its first stage
+    :param dataset: the Dataset the items belong to
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    pipeline.run(items)
+    pipeline.print_metrics()
+    filename = "pipeline_{}_{}.json".format(dataset.code, run["timestamp"])
+    utils.json_to_file(filename, pipeline.metrics())
+    if arguments["upload"]:
+        throttle = get_throttle(arguments, run)
+        throttle.print_metrics()
+        filename = "throttle_{}_{}.json".format(
+            dataset.code, run["timestamp"])
+        utils.json_to_file(filename, throttle.metrics())
+
+
+def process_dataset(dataset, arguments, run):
+    """
+    Process and optionally upload the areas of a single dataset.
+
+    The source file is loaded and cleaned as a whole,
+    since duplicates can be anywhere in it. The areas are
+    then built, validated, written to the preview table and
+    the export, and uploaded in a pipeline, so that building
+    the next areas overlaps with the uploads in flight,
+    see pipeline.py.
+
+    :param dataset: the Dataset to process
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    data_files = run["data_files"]
+    area_data = load_nature_area_file(dataset, arguments["nvrid"])
+    if arguments["previous"]:
+        area_data = keep_changed_entries(
+            dataset, area_data, arguments["previous"], run["timestamp"],
+            arguments["nvrid"])
+    if arguments["shard"]:
+        area_data = sharding.select_shard(
+            area_data, arguments["shard"], arguments["shard_by"])
+        print("Shard {}: {} areas.".format(
+            "/".join(str(x) for x in arguments["shard"]), len(area_data)))
     if arguments["offset"]:
         print("Using offset: {}.".format(str(arguments["offset"])))
         area_data = area_data[arguments["offset"]:]
     if arguments["limit"]:
         print("Using limit: {}.".format(str(arguments["limit"])))
         area_data = area_data[:arguments["limit"]]
-    for area in area_data:
-        reserve = NatureArea(area, wikidata_site, data_files, existing_areas)
+    columns = area_columns.load_area_columns(area_data)
+    column_problems = area_columns.validate_area_columns(columns)
+    data_files["geometry"] = load_geometry_file(dataset, area_data)
+    data_files["municipalities_found"] = check_municipalities(
+        dataset, area_data, data_files, run)
+    area_data = check_rows(dataset, area_data, column_problems, data_files,
+                           run)
+    report = {}
+    table_file = "{}_{}.txt".format(dataset.code, run["timestamp"])
+    site = get_site(arguments, run)
+    existing = get_existing(arguments, run)
+
+    def build(area):
+        return NatureArea(area, site, data_files, existing,
+                          properties=arguments["properties"])
+
+    def validate(reserves):
+        batch_report = match_validator.validate_matches(
+            site, reserves, data_files["items"])
+        for problem, entries in batch_report.items():
+            report.setdefault(problem, []).extend(entries)
+        return reserves
+
+    def output(reserve):
         if arguments["table"]:
-            filename = "{}_{}.txt".format(arguments["dataset"], current_time)
             preview = PreviewTable(reserve)
-            utils.append_line_to_file(preview.make_table(), filename)
-        if arguments["upload"]:
-            live = True if arguments["upload"] == "live" else False
-            if arguments["dataset"] == "nr":
-                edit_summary = edit_summary_reserves
-            elif arguments["dataset"] == "np":
-                edit_summary = edit_summary_nationalparks
-            uploader = Uploader(reserve,
-                                repo=wikidata_site,
-                                live=live,
-                                edit_summary=edit_summary)
-            uploader.upload()
+            utils.append_line_to_file(preview.make_table(), table_file)
+        if arguments["export"]:
+            run["exported"].write(
+                item_serializer.encode_item(reserve, dataset.code))
+        return reserve
 
+    def estimate(reserve):
+        if get_nature_id(reserve.raw_data) not in run["journaled"]:
+            run["estimated"].append(
+                upload_estimate.count_item(reserve, dataset.code))
 
-if __name__ == "__main__":
-    arguments = {}
+    pipeline = Pipeline(queue_size=arguments["queue_size"])
+    pipeline.add_stage("build", build)
+    pipeline.add_stage("validate", validate, batch_size=VALIDATE_BATCH_SIZE)
+    if arguments["table"] or arguments["export"]:
+        pipeline.add_stage("output", output)
+    if arguments["estimate"]:
+        pipeline.add_stage("estimate", estimate)
+    elif arguments["upload"]:
+        add_upload_stages(pipeline, dataset, arguments, run)
+    run_pipeline(pipeline, area_data, dataset, arguments, run)
+    if report:
+        match_validator.print_report(report)
+        filename = "match_problems_{}_{}.json".format(
+            dataset.code, run["timestamp"])
+        utils.json_to_file(filename, report)
+
+
+def upload_exported(arguments, run):
+    """
+    Upload the items of an export file.
+
+    The items were built and validated by an earlier run with
+    --export, so the source data and the existing items
+    are not needed. They are decoded in the first stage
+    of the upload pipeline. With an estimate, they are
+    only counted, without being decoded.
+
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    by_dataset = {}
+    for record in item_serializer.iter_records(arguments["from_export"]):
+        row = {"NVRID": record["key"], "LAN": record.get("county")}
+        if arguments["shard"] and not sharding.in_shard(
+                row, arguments["shard"], arguments["shard_by"]):
+            continue
+        if arguments["estimate"]:
+            if record["key"] not in run["journaled"]:
+                run["estimated"].append(upload_estimate.count_record(record))
+            continue
+        by_dataset.setdefault(record["dataset"], []).append(record)
+
+    if not by_dataset:
+        return
+    site = get_site(arguments, run)
+    get_existing(arguments, run)
+
+    def decode(record):
+        return item_serializer.decode_item(record, site)
+
+    for code, records in sorted(by_dataset.items()):
+        print("Loaded {} items of dataset {} from {}.".format(
+            len(records), code, arguments["from_export"]))
+        dataset = datasets.get_dataset(code)
+        pipeline = Pipeline(queue_size=arguments["queue_size"])
+        pipeline.add_stage("decode", decode)
+        add_upload_stages(pipeline, dataset, arguments, run)
+        run_pipeline(pipeline, records, dataset, arguments, run)
+
+
+def save_estimate(arguments, run):
+    """
+    Print and save the estimated costs of uploading the counted items.
+
+    The estimate is based on the throttle settings and,
+    if given, the cost report of an earlier run,
+    see upload_estimate.py. If no site was needed,
+    as when counting an export file, pywikibot's
+    default put_throttle is assumed.
+
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    phase_costs = None
+    if arguments["cost_report"]:
+        phase_costs = upload_estimate.load_phase_costs(
+            arguments["cost_report"])
+    settings = {"workers": arguments["workers"],
+                "min_interval": arguments["min_interval"]}
+    if run["site"] is not None:
+        # pywikibot is loaded already, with the user's config.
+        import pywikibot
+        settings["put_throttle"] = pywikibot.config.put_throttle
+    estimate = upload_estimate.make_estimate(
+        run["estimated"], phase_costs, **settings)
+    upload_estimate.print_estimate(estimate)
+    filename = "estimate_{}.json".format(run["timestamp"])
+    utils.json_to_file(filename, estimate)
+
+
+def refresh_references(arguments, run):
+    """
+    Set new dates in the references the importer added.
+
+    All the existing items are fetched in batches, and the
+    references made by NatureArea (stated in one of the
+    datasets, with a reference URL to the nature registry)
+    get the publication and retrieval dates of the arguments,
+    see reference_refresh.py. Only the statements whose
+    references changed are sent, in one edit per item,
+    based on the revision that was fetched.
+    Without --upload live, nothing is edited, and the
+    number of edits that would be made is reported.
+    A failed edit is reported and the rest continue,
+    unless all the recent ones failed.
+
+    :param arguments: the command line arguments, as a dictionary
+    :param run: state shared by the whole run, see main
+    """
+    site = get_site(arguments, run)
+    throttle = get_throttle(arguments, run)
+    live = arguments["upload"] == "live"
+    items = run["data_files"]["items"]
+    stated_in = set(items[datasets.get_dataset(code).source_item]
+                    for code in datasets.get_dataset_codes())
+    url_pattern = reference_refresh.make_url_pattern(NatureArea.REFERENCE_URL)
+    dates = {"publication": arguments["publication_date"],
+             "retrieved": arguments["retrieval_date"]}
+    report = {"dates": dates, "live": live, "items": 0, "changed_items": 0,
+              "references": 0, "edits": 0, "failed": {}}
+    qids = sorted(set(get_existing(arguments, run).values()))
+    done = set()
+    for start in range(0, len(qids), REFRESH_BATCH_SIZE):
+        batch = qids[start:start + REFRESH_BATCH_SIZE]
+        entities = utils.get_entities(site, batch, props="info|claims")
+        for entity in entities.values():
+            if "missing" in entity or entity["id"] in done:
+                continue
+            done.add(entity["id"])
+            report["items"] += 1
+            statements, references = reference_refresh.refresh_entity(
+                entity, stated_in, url_pattern, dates)
+            if not statements:
+                continue
+            report["changed_items"] += 1
+            report["references"] += references
+            if not live:
+                continue
+            data = reference_refresh.make_edit_data(statements)
+            try:
+                with throttle.slot():
+                    site.simple_request(
+                        action="wbeditentity", id=entity["id"],
+                        data=json.dumps(data), summary=REFRESH_SUMMARY,
+                        baserevid=entity["lastrevid"],
+                        token=site.tokens["csrf"], bot=True).submit()
+                report["edits"] += 1
+            except Exception as error:
+                print("Refreshing {} failed: {}".format(entity["id"], error))
+                report["failed"][entity["id"]] = str(error)
+                if throttle.is_failing():
+                    raise
+        print("Checked the references of {} of {} items.".format(
+            min(start + REFRESH_BATCH_SIZE, len(qids)), len(qids)))
+    print("{} references on {} of {} items {}.".format(
+        report["references"], report["changed_items"], report["items"],
+        "refreshed" if live else "would be refreshed"))
+    if report["failed"]:
+        print("{} edits failed.".format(len(report["failed"])))
+    if live:
+        throttle.print_metrics()
+    filename = "refresh_{}.json".format(run["timestamp"])
+    utils.json_to_file(filename, report)
+
+
+def parse_datasets(text):
+    """
+    Parse a comma-separated list of dataset codes.
+
+    :param text: e.g. "nr,np"
+    :return: list of Dataset objects
+    """
+    selected = []
+    for code in text.split(","):
+        dataset = datasets.get_dataset(code.strip())
+        if dataset is None:
+            raise argparse.ArgumentTypeError(
+                "unknown dataset {}, use one of: {}".format(
+                    code, ", ".join(datasets.get_dataset_codes())))
+        selected.append(dataset)
+    return selected
+
+
+def parse_nature_ids(text):
+    """
+    Parse a comma-separated list of nature IDs.
+
+    :param text: e.g. "2000283,2002631"
+    :return: list of NVRIDs
+    """
+    nature_ids = [x.strip() for x in text.split(",") if x.strip()]
+    if not nature_ids:
+        raise argparse.ArgumentTypeError("no nature IDs in {}".format(text))
+    return nature_ids
+
+
+def parse_date(text):
+    """
+    Parse a date of the source data.
+
+    :param text: e.g. "2015-12-18"
+    :return: the date, as given
+    """
+    try:
+        datetime.datetime.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "dates should look like YYYY-MM-DD, not {}".format(text))
+    return text
+
+
+def parse_properties(text):
+    """
+    Parse a comma-separated list of statement groups to build.
+
+    :param text: e.g. "area,iucn"
+    :return: list of names from NatureArea.PROPERTY_NAMES
+    """
+    selected = [x.strip() for x in text.split(",")]
+    for name in selected:
+        if name not in NatureArea.PROPERTY_NAMES:
+            raise argparse.ArgumentTypeError(
+                "unknown property {}, use any of: {}".format(
+                    name, ", ".join(NatureArea.PROPERTY_NAMES)))
+    return selected
+
+
+def parse_site(text):
+    """
+    Parse the language and family of a site.
+
+    :param text: e.g. "wikidata:wikidata"
+    :return: tuple (language, family)
+    """
+    language, _, family = text.partition(":")
+    if not language or not family:
+        raise argparse.ArgumentTypeError(
+            "site should look like language:family, not {}".format(text))
+    return (language, family)
+
+
+def main(arguments):
+    """
+    Process the arguments and fetch data according to them.
+
+    The site, the existing items, the mapping files and
+    the upload throttle are only set up once and shared
+    by all the datasets processed in the run. The site,
+    the existing items and the throttle are set up when
+    they're first needed, so nothing is fetched before
+    the source data has been loaded and checked.
+    When uploading from an export file, the existing
+    items are not downloaded.
+    When refreshing references, the source data is not loaded.
+    The files written by a shard have the shard in their names.
+    An estimate never uploads.
+    Exported items are written to the export file as they are
+    built, so an interrupted run keeps what it exported.
+    With an HTTP cache, it's installed before any request is
+    made, so the whole run can be replayed, see http_cache.py.
+
+    :return: the state shared by the whole run, with the
+             throttle and the costs, e.g. for uploader_benchmark.py
+    """
+    arguments = vars(arguments)
+    if arguments["estimate"]:
+        arguments["upload"] = None
+    cache = http_cache.install_from_arguments(arguments)
+    run = {"timestamp": utils.get_current_timestamp(),
+           "site": None,
+           "existing": None,
+           "data_files": load_mapping_files(),
+           "throttle": None,
+           "costs": api_costs.CostLedger(),
+           "exported": None,
+           "estimated": [],
+           "journaled": {}}
+    if arguments["shard"]:
+        run["timestamp"] = "{}_{}".format(
+            run["timestamp"], sharding.get_shard_suffix(arguments["shard"]))
+    if arguments["journal"]:
+        run["journaled"] = item_serializer.read_journal(arguments["journal"])
+    if arguments["upload"]:
+        api_costs.install(run["costs"])
+    if arguments["from_export"]:
+        upload_exported(arguments, run)
+    if arguments["refresh_references"]:
+        refresh_references(arguments, run)
+    if arguments["export"]:
+        run["exported"] = item_serializer.RecordWriter(arguments["export"])
+    try:
+        for dataset in arguments["dataset"] or []:
+            process_dataset(dataset, arguments, run)
+    finally:
+        if run["exported"] is not None:
+            run["exported"].close()
+            print("Exported {} items to {}.".format(
+                run["exported"].count, arguments["export"]))
+    if arguments["estimate"]:
+        save_estimate(arguments, run)
+    if run["costs"].items:
+        run["costs"].print_summary()
+        filename = "costs_{}.json".format(run["timestamp"])
+        utils.json_to_file(filename, run["costs"].make_report())
+    if cache is not None:
+        cache.print_stats()
+    return run
+
+
+def make_parser():
+    """Create the parser of the command line arguments."""
     parser = argparse.ArgumentParser()
-    parser.add_argument("--dataset", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dataset",
+                        type=parse_datasets,
+                        help="comma-separated, one or more of: {}".format(
+                            ", ".join(datasets.get_dataset_codes())))
+    source.add_argument("--from-export",
+                        help="upload the items of a file made with --export")
+    source.add_argument("--refresh-references",
+                        action='store_true',
+                        help="set the dates below in the references "
+                             "of all the existing items")
     parser.add_argument("--upload", action='store')
+    parser.add_argument("--estimate",
+                        action='store_true',
+                        help="estimate what an upload would cost, "
+                             "without uploading")
+    parser.add_argument("--cost-report",
+                        help="costs_<timestamp>.json of an earlier run, "
+                             "to base the estimate on")
     parser.add_argument("--table", action='store_true')
+    parser.add_argument("--workers",
+                        type=int,
+                        default=3,
+                        help="most concurrent uploads")
+    parser.add_argument("--min-interval",
+                        type=float,
+                        default=1.0,
+                        help="shortest time between uploads, in seconds")
+    parser.add_argument("--start-interval",
+                        type=float,
+                        default=5.0,
+                        help="time between the first uploads, in seconds")
+    parser.add_argument("--queue-size",
+                        type=int,
+                        default=20,
+                        help="most areas waiting between two steps")
+    parser.add_argument("--maxlag",
+                        type=float,
+                        default=5.0,
+                        help="slow down when the lag is above this")
+    parser.add_argument("--properties",
+                        type=parse_properties,
+                        help="only build and upload these, any of: {}".format(
+                            ", ".join(NatureArea.PROPERTY_NAMES)))
+    parser.add_argument("--previous",
+                        help="directory with the previous release, "
+                             "only process areas that changed since")
+    parser.add_argument("--wdqs-page-size",
+                        type=int,
+                        default=5000,
+                        help="results per query when downloading existing "
+                             "items, 0 for a single query")
+    parser.add_argument("--existing-file",
+                        help="read the items that have a nature ID from "
+                             "this file, made by dump_reader.py, "
+                             "instead of querying WDQS")
+    parser.add_argument("--nvrid",
+                        type=parse_nature_ids,
+                        help="only process these areas, as comma-separated "
+                             "nature IDs, reading only their rows")
     parser.add_argument("--offset",
                         nargs='?',
                         type=int,
@@ -197,5 +999,40 @@ if __name__ == "__main__":
                         nargs='?',
                         type=int,
                         action='store')
-    args = parser.parse_args()
+    parser.add_argument("--export",
+                        help="save the built items to this file")
+    parser.add_argument("--journal",
+                        help="record uploaded items in this file, and "
+                             "skip the items already recorded in it")
+    parser.add_argument("--shard",
+                        type=sharding.parse_shard,
+                        help="only process shard i of N, as i/N")
+    parser.add_argument("--shard-by",
+                        choices=sorted(sharding.SHARD_COLUMNS),
+                        default="nvrid",
+                        help="assign areas to shards by nature ID "
+                             "or by county")
+    parser.add_argument("--site",
+                        type=parse_site,
+                        default="wikidata:wikidata",
+                        help="site to upload to, as language:family")
+    parser.add_argument("--sparql-endpoint",
+                        default=wdqs.WDQS_ENDPOINT,
+                        help="SPARQL endpoint used to find existing items")
+    parser.add_argument("--publication-date",
+                        type=parse_date,
+                        default=NatureArea.PUBLICATION_DATE,
+                        help="with --refresh-references, the publication "
+                             "date of the source data, as YYYY-MM-DD")
+    parser.add_argument("--retrieval-date",
+                        type=parse_date,
+                        default=NatureArea.RETRIEVAL_DATE,
+                        help="with --refresh-references, the date the "
+                             "source data was retrieved, as YYYY-MM-DD")
+    http_cache.add_arguments(parser)
+    return parser
+
+
+if __name__ == "__main__":
+    args = make_parser().parse_args()
     main(args)
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keep the importer running, to build or upload single areas on demand.
+
+A run of nature_importer logs in, downloads the items that
+already have a nature ID, loads the mapping files and cleans
+the whole source file before it gets to the first area.
+To fix one area, the service does all of that once and keeps
+it in memory, and answers HTTP requests on localhost:
+
+* GET /build?nvrid=2000283,2002631 -- build the areas and
+  return them as in an export file, see item_serializer.py,
+  together with their pre-flight problems,
+* GET /preview?nvrid=... -- the preview table of the areas,
+* POST /upload?nvrid=...&mode=sandbox -- build and upload
+  the areas, to the sandbox or, with mode=live, to their items,
+  skipping the areas whose matched items don't pass
+  match_validator.py, as a run of nature_importer does,
+* POST /reload -- load everything again, including
+  the existing items,
+* GET /status -- what is loaded, and since when.
+
+/build and /upload also take properties=area,iucn, to only
+build some groups of statements, as --properties does.
+
+POST requests edit Wikidata, so they must carry the token of
+the service in an X-Service-Token header, and are refused if
+they come from a web page on another origin. A form on a web
+page can't set the header, so it can't make the service edit.
+The token is given with --token, or generated and printed at
+startup.
+
+Before every request, the mapping files, the source files and
+the polygon files are checked for changes, and whatever changed
+is loaded again. A changed mapping file is picked up by
+rebuilding the mapping bundle, see mapping_bundle.py.
+
+Requests are answered one at a time, so an upload never
+overlaps with a reload.
+
+Usage: python3 nature_service.py --port 8765
+"""
+import argparse
+import hmac
+import json
+import os
+import secrets
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from NatureArea import NatureArea
+from PreviewTable import PreviewTable
+from UploadThrottle import UploadThrottle
+import api_costs
+import area_columns
+import datasets
+import http_cache
+import importer_utils as utils
+import item_serializer
+import mapping_bundle
+import match_validator
+import nature_importer
+import preflight
+import wdqs
+
+UPLOAD_MODES = ["sandbox", "live"]
+POST_PATHS = ["/upload", "/reload"]
+TOKEN_HEADER = "X-Service-Token"
+
+
+class RequestError(Exception):
+    """A request to the service can't be answered."""
+
+    def __init__(self, message, status=400):
+        """Initialize the error with the HTTP status to answer with."""
+        super().__init__(message)
+        self.status = status
+
+
+def get_fingerprint(filepath):
+    """Get the modification time and size of a file, or None."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class NatureService(object):
+    """The state shared by all requests to the service."""
+
+    def __init__(self, arguments):
+        """
+        Log in and load everything needed to build the areas.
+
+        The API requests of all uploads are counted in
+        a single ledger, see api_costs.py.
+
+        :param arguments: the command line arguments, as a dictionary
+        """
+        self.arguments = arguments
+        self.started = time.time()
+        self.costs = api_costs.CostLedger()
+        api_costs.install(self.costs)
+        site = utils.create_site_instance(*arguments["site"])
+        site.login()
+        self.run = {"timestamp": utils.get_current_timestamp(),
+                    "site": site,
+                    "throttle": UploadThrottle(
+                        site=site,
+                        min_interval=arguments["min_interval"],
+                        max_workers=1,
+                        target_lag=arguments["maxlag"]),
+                    "journaled": {}}
+        self.bundle = None
+        self.sources = {}
+        self.reload()
+
+    def reload(self):
+        """Load the existing items, the mapping files and source files."""
+        self.run["existing"] = nature_importer.get_wd_items_using_prop(
+            "P3613", page_size=self.arguments["wdqs_page_size"],
+            endpoint=self.arguments["sparql_endpoint"],
+            existing_file=self.arguments["existing_file"])
+        self.bundle = None
+        self.sources = {}
+        self.refresh()
+        self.loaded = time.time()
+
+    def refresh(self):
+        """
+        Load again whatever changed on disk since it was loaded.
+
+        If the mapping files changed, the municipalities of
+        the areas are located again, since the names of the
+        municipalities may have changed with them.
+        """
+        data_dir = mapping_bundle.get_data_dir()
+        if not mapping_bundle.is_current(self.bundle, data_dir):
+            if self.bundle is not None:
+                print("Mapping files changed, reloading.")
+            self.bundle = mapping_bundle.load_bundle(data_dir)
+            self.run["data_files"] = nature_importer.load_mapping_files(
+                self.bundle)
+            for source in self.sources.values():
+                source["fingerprint"] = None
+        for code in datasets.get_dataset_codes():
+            self.refresh_dataset(datasets.get_dataset(code))
+
+    def refresh_dataset(self, dataset):
+        """
+        Load the source and polygon files of a dataset, if they changed.
+
+        The rows are cleaned as a whole, as in a run of
+        nature_importer, and kept by nature ID.
+        """
+        fingerprint = (get_fingerprint(dataset.get_source_path()),
+                       get_fingerprint(dataset.get_geometry_path()))
+        source = self.sources.get(dataset.code)
+        if source is not None and source["fingerprint"] == fingerprint:
+            return
+        if fingerprint[0] is None:
+            self.sources.pop(dataset.code, None)
+            return
+        rows = nature_importer.load_nature_area_file(dataset)
+        data_files = dict(self.run["data_files"])
+        data_files["geometry"] = nature_importer.load_geometry_file(
+            dataset, rows)
+        found = nature_importer.check_municipalities(
+            dataset, rows, data_files, self.run)
+        self.sources[dataset.code] = {
+            "fingerprint": fingerprint,
+            "rows": {nature_importer.get_nature_id(x): x for x in rows},
+            "geometry": data_files["geometry"],
+            "municipalities_found": found,
+            "loaded": time.time()}
+
+    def find_rows(self, nature_ids):
+        """
+        Find the rows of some areas in the loaded datasets.
+
+        :param nature_ids: list of NVRIDs
+        :return: dictionary of dataset code -> list of rows
+        :raise: RequestError if an area is in none of them
+        """
+        found = {}
+        missing = []
+        for nature_id in nature_ids:
+            for code, source in sorted(self.sources.items()):
+                if nature_id in source["rows"]:
+                    found.setdefault(code, []).append(
+                        source["rows"][nature_id])
+                    break
+            else:
+                missing.append(nature_id)
+        if missing:
+            raise RequestError("unknown nature IDs: {}".format(
+                ", ".join(missing)), status=404)
+        return found
+
+    def build(self, nature_ids, properties=None):
+        """
+        Build some areas, leaving out those with pre-flight errors.
+
+        The matched items of the areas are validated, so that
+        areas matched to deleted or suspicious items are
+        not uploaded, see match_validator.py.
+
+        :param nature_ids: list of NVRIDs
+        :param properties: only build these groups of statements
+        :return: tuple (list of (Dataset, NatureArea), pre-flight
+                 report of the areas, see preflight.validate_rows,
+                 with the problems of the matched items in "matches")
+        """
+        built = []
+        report = {"errors": {}, "warnings": {}, "problems": {},
+                  "excluded": set(), "matches": {}}
+        for code, rows in self.find_rows(nature_ids).items():
+            source = self.sources[code]
+            data_files = dict(self.run["data_files"])
+            data_files["geometry"] = source["geometry"]
+            data_files["municipalities_found"] = (
+                source["municipalities_found"])
+            columns = area_columns.load_area_columns(rows)
+            found = preflight.validate_rows(
+                rows, data_files, area_columns.validate_area_columns(columns))
+            for group in ["errors", "warnings"]:
+                for problem, entries in found[group].items():
+                    report[group].setdefault(problem, []).extend(entries)
+            report["problems"].update(found["problems"])
+            report["excluded"].update(found["excluded"])
+            data_files["problems"] = found["problems"]
+            dataset = datasets.get_dataset(code)
+            for row in preflight.exclude_rows(rows, found):
+                area = NatureArea(row, self.run["site"], data_files,
+                                  self.run["existing"],
+                                  properties=properties)
+                built.append((dataset, area))
+        report["matches"] = match_validator.validate_matches(
+            self.run["site"], [area for _, area in built],
+            self.run["data_files"]["items"])
+        return (built, report)
+
+    def upload(self, built, mode):
+        """
+        Upload built areas, one at a time.
+
+        :param built: list of (Dataset, NatureArea), see build
+        :param mode: one of UPLOAD_MODES
+        :return: tuple (dictionary of NVRID -> item uploaded to,
+                 the error that stopped the upload, or the item
+                 that was skipped after validation, summary of
+                 the API costs of the uploads)
+        """
+        arguments = dict(self.arguments, upload=mode, journal=None)
+        results = {}
+        records = []
+        for dataset, area in built:
+            nature_id = nature_importer.get_nature_id(area.raw_data)
+            if area.wd_item["upload"] is False:
+                results[nature_id] = {"skipped": area.wd_item["wd-item"]}
+                continue
+            try:
+                prepared = nature_importer.prepare_upload(
+                    area, dataset, arguments, self.run)
+                records.append(prepared[2])
+                with self.run["throttle"].slot():
+                    nature_importer.upload_area(prepared, arguments,
+                                                self.run)
+                results[nature_id] = {"item": prepared[1].wd_item_q}
+            except Exception as error:
+                results[nature_id] = {"error": str(error)}
+        return (results, self.costs.summarize_items(records))
+
+    def get_status(self):
+        """Describe what is loaded."""
+        return {"started": self.started,
+                "loaded": self.loaded,
+                "existing": len(self.run["existing"]),
+                "uploaded": len(self.costs.items),
+                "mapping_files": sorted(self.bundle["files"]),
+                "datasets": {code: {"rows": len(x["rows"]),
+                                    "loaded": x["loaded"]}
+                             for code, x in self.sources.items()}}
+
+
+def parse_nature_ids(params):
+    """Get the nature IDs of a request."""
+    try:
+        return nature_importer.parse_nature_ids(params.get("nvrid", ""))
+    except argparse.ArgumentTypeError:
+        raise RequestError("no nature IDs, use nvrid=<id>,<id>")
+
+
+def parse_request_properties(params):
+    """Get the groups of statements to build of a request, or None."""
+    if not params.get("properties"):
+        return None
+    try:
+        return nature_importer.parse_properties(params["properties"])
+    except argparse.ArgumentTypeError as error:
+        raise RequestError(str(error))
+
+
+def report_to_json(report):
+    """Get a pre-flight report as it's sent to the client."""
+    content = preflight.report_to_json(report)
+    content["problems"] = report["problems"]
+    content["matches"] = report.get("matches", {})
+    return content
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Answer requests to the service."""
+
+    def read_params(self):
+        """Read the parameters from the query string and the body."""
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query, keep_blank_values=True)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            params.update(parse_qs(body, keep_blank_values=True))
+        return (parsed.path, {k: v[-1] for k, v in params.items()})
+
+    def send_body(self, body, content_type, status=200):
+        """Send a response."""
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, content, status=200):
+        """Send a JSON response."""
+        self.send_body(json.dumps(content, ensure_ascii=False, indent=2),
+                       "application/json; charset=utf-8", status)
+
+    def do_GET(self):
+        """Handle a GET request."""
+        self.handle_request("GET")
+
+    def do_POST(self):
+        """Handle a POST request."""
+        self.handle_request("POST")
+
+    def check_post(self):
+        """
+        Check that a POST request may edit.
+
+        :raise: RequestError if it comes from another origin
+                or doesn't have the token of the service
+        """
+        origin = self.headers.get("Origin")
+        if origin is not None and origin != self.server.get_origin():
+            raise RequestError("requests from {} are not allowed".format(
+                origin), 403)
+        token = self.headers.get(TOKEN_HEADER) or ""
+        if not hmac.compare_digest(token.encode("utf-8"),
+                                   self.server.token.encode("utf-8")):
+            raise RequestError("missing or wrong {} header".format(
+                TOKEN_HEADER), 403)
+
+    def handle_request(self, method):
+        """Refresh the service and dispatch a request to an action."""
+        path, params = self.read_params()
+        action = getattr(self, "action_" + path.strip("/"), None)
+        if action is None:
+            self.send_json({"error": "unknown path {}".format(path)}, 404)
+            return
+        start = time.time()
+        try:
+            if path in POST_PATHS and method != "POST":
+                raise RequestError("use POST for {}".format(path), 405)
+            if method == "POST":
+                self.check_post()
+            if path != "/reload":
+                self.server.service.refresh()
+            result = action(params)
+        except RequestError as error:
+            self.send_json({"error": str(error)}, error.status)
+            return
+        except Exception as error:
+            self.send_json({"error": "{}: {}".format(
+                type(error).__name__, error)}, 500)
+            return
+        if isinstance(result, str):
+            self.send_body(result, "text/plain; charset=utf-8")
+        else:
+            result["seconds"] = round(time.time() - start, 3)
+            self.send_json(result)
+
+    def action_status(self, params):
+        """Describe what is loaded."""
+        return self.server.service.get_status()
+
+    def action_reload(self, params):
+        """Load everything again."""
+        self.server.service.reload()
+        return self.server.service.get_status()
+
+    def action_build(self, params):
+        """Build areas and return them as export records."""
+        built, report = self.server.service.build(
+            parse_nature_ids(params), parse_request_properties(params))
+        return {"items": [item_serializer.encode_item(area, dataset.code)
+                          for dataset, area in built],
+                "preflight": report_to_json(report)}
+
+    def action_preview(self, params):
+        """Build areas and return their preview tables."""
+        built, report = self.server.service.build(parse_nature_ids(params))
+        tables = [PreviewTable(area).make_table() for _, area in built]
+        for nature_id in sorted(report["excluded"]):
+            tables.append("{}: not built, {}\n".format(
+                nature_id, ", ".join(sorted(report["problems"][nature_id]))))
+        return "".join(tables)
+
+    def action_upload(self, params):
+        """Build and upload areas."""
+        mode = params.get("mode", "sandbox")
+        if mode not in UPLOAD_MODES:
+            raise RequestError("mode should be one of: {}".format(
+                ", ".join(UPLOAD_MODES)))
+        service = self.server.service
+        built, report = service.build(
+            parse_nature_ids(params), parse_request_properties(params))
+        uploaded, costs = service.upload(built, mode)
+        return {"uploaded": uploaded,
+                "costs": costs,
+                "preflight": report_to_json(report)}
+
+
+class ServiceServer(HTTPServer):
+    """An HTTP server holding the state of the service."""
+
+    def __init__(self, address, service, token):
+        """
+        Initialize the server, answering requests with the service.
+
+        :param token: the token POST requests must carry
+        """
+        HTTPServer.__init__(self, address, ServiceHandler)
+        self.service = service
+        self.token = token
+
+    def get_origin(self):
+        """Get the origin of the pages of the service itself."""
+        return "http://{}:{}".format(*self.server_address[:2])
+
+
+def make_parser():
+    """Create the parser of the command line arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token",
+                        help="token POST requests must carry in an "
+                             "{} header, generated if not given".format(
+                                 TOKEN_HEADER))
+    parser.add_argument("--site",
+                        type=nature_importer.parse_site,
+                        default="wikidata:wikidata",
+                        help="site to upload to, as language:family")
+    parser.add_argument("--min-interval",
+                        type=float,
+                        default=1.0,
+                        help="shortest time between uploads, in seconds")
+    parser.add_argument("--maxlag",
+                        type=float,
+                        default=5.0,
+                        help="slow down when the lag is above this")
+    parser.add_argument("--wdqs-page-size",
+                        type=int,
+                        default=5000,
+                        help="results per query when downloading existing "
+                             "items, 0 for a single query")
+    parser.add_argument("--existing-file",
+                        help="read the items that have a nature ID from "
+                             "this file, made by dump_reader.py, "
+                             "instead of querying WDQS")
+    parser.add_argument("--sparql-endpoint",
+                        default=wdqs.WDQS_ENDPOINT,
+                        help="SPARQL endpoint used to find existing items")
+    http_cache.add_arguments(parser)
+    return parser
+
+
+if __name__ == "__main__":
+    arguments = vars(make_parser().parse_args())
+    http_cache.install_from_arguments(arguments)
+    token = arguments["token"] or secrets.token_urlsafe(16)
+    server = ServiceServer((arguments["host"], arguments["port"]),
+                           NatureService(arguments), token)
+    print("Serving nature areas at {}/".format(server.get_origin()))
+    print("POST requests need the header {}: {}".format(
+        TOKEN_HEADER, token))
+    server.serve_forever()
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Run the steps of an import as a pipeline of threads.
+
+Building an area and writing its preview is CPU work,
+validating and uploading it is waiting for the network.
+Run one after the other, one of them is always idle.
+In a pipeline every step is a stage with its own threads,
+and the stages are connected by bounded queues:
+
+    pipeline = Pipeline(queue_size=20)
+    pipeline.add_stage("build", build)
+    pipeline.add_stage("validate", validate, batch_size=200)
+    pipeline.add_stage("upload", upload, workers=3)
+    pipeline.run(rows)
+
+so the next areas are built while the previous ones are
+being uploaded. When a stage is slower than the one before
+it, its queue fills up and the stage before it waits
+(backpressure), so at most queue_size items are waiting
+between two stages, however large the dataset.
+
+A stage function takes an item and returns the item to
+pass on to the next stage, or None to drop it. With a batch
+size it takes and returns lists of items instead. The items
+leave a stage in the order they came in if it has a single
+worker. If a stage function raises, the pipeline stops and
+run() raises the same error.
+
+Every stage counts the items it took and passed on, and
+the time its workers spent working, waiting for items
+and waiting for room in the next queue, see metrics().
+"""
+import queue
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 20
+POLL_INTERVAL = 0.1
+
+DONE = object()
+
+
+class Aborted(Exception):
+    """The pipeline was stopped by an error in another stage."""
+
+
+class Stage(object):
+    """A step of a pipeline, run by one or more threads."""
+
+    def __init__(self, name, function, workers=1, batch_size=None):
+        """
+        Initialize the stage.
+
+        :param name: name used in the metrics, e.g. "build"
+        :param function: takes an item (or a list of items, with a
+                         batch size), returns what to pass on
+        :param workers: number of threads running the function
+        :param batch_size: number of items given to the function
+                           at once, or None for one at a time
+        """
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.active = 0
+        self.started = None
+        self.finished = None
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.blocked = 0.0
+
+    def process(self, items):
+        """
+        Run the function on items taken from the queue.
+
+        :param items: list of items
+        :return: list of items to pass on
+        """
+        start = time.time()
+        if self.batch_size:
+            results = self.function(items) or []
+        else:
+            result = self.function(items[0])
+            results = [] if result is None else [result]
+        elapsed = time.time() - start
+        with self.lock:
+            self.busy += elapsed
+            self.items_in += len(items)
+            self.items_out += len(results)
+        return results
+
+    def metrics(self):
+        """Get the throughput and time spent by the stage."""
+        end = self.finished or time.time()
+        seconds = end - self.started if self.started else 0.0
+        capacity = seconds * self.workers
+        with self.lock:
+            metrics = {"stage": self.name,
+                       "workers": self.workers,
+                       "items_in": self.items_in,
+                       "items_out": self.items_out,
+                       "seconds": round(seconds, 3),
+                       "per_second": (round(self.items_in / seconds, 3)
+                                      if seconds else None)}
+            for key in ["busy", "waiting", "blocked"]:
+                value = getattr(self, key)
+                metrics[key] = (round(value / capacity, 3)
+                                if capacity else None)
+        return metrics
+
+
+class Pipeline(object):
+    """Stages connected by bounded queues."""
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Initialize an empty pipeline.
+
+        :param queue_size: most items waiting before every stage
+        """
+        self.queue_size = queue_size
+        self.stages = []
+        self.abort = threading.Event()
+        self.errors = []
+
+    def add_stage(self, name, function, workers=1, batch_size=None):
+        """Add a stage at the end of the pipeline, see Stage."""
+        self.stages.append(Stage(name, function, workers, batch_size))
+
+    def put(self, target, item, stage=None):
+        """Put an item in a queue, waiting for room unless aborted."""
+        start = time.time()
+        while True:
+            if self.abort.is_set():
+                raise Aborted()
+            try:
+                target.put(item, timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        if stage is not None:
+            with stage.lock:
+                stage.blocked += time.time() - start
+
+    def get(self, source, stage):
+        """Get an item from a queue, waiting for one unless aborted."""
+        start = time.time()
+        while True:
+            if self.abort.is_set():
+                raise Aborted()
+            try:
+                item = source.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        with stage.lock:
+            stage.waiting += time.time() - start
+        return item
+
+    def pass_on(self, stage, items, target):
+        """Process items and put the results in the next queue."""
+        for result in stage.process(items):
+            if target is not None:
+                self.put(target, result, stage)
+
+    def work(self, stage, source, target):
+        """
+        Run one worker of a stage until its input is exhausted.
+
+        The end of the input is marked by DONE. The worker that
+        takes it puts it back for the other workers of the stage,
+        and the last worker to finish passes it on.
+        """
+        batch = []
+        try:
+            while True:
+                item = self.get(source, stage)
+                if item is DONE:
+                    self.put(source, DONE)
+                    break
+                if not stage.batch_size:
+                    self.pass_on(stage, [item], target)
+                    continue
+                batch.append(item)
+                if len(batch) >= stage.batch_size:
+                    self.pass_on(stage, batch, target)
+                    batch = []
+            if batch:
+                self.pass_on(stage, batch, target)
+        except Aborted:
+            pass
+        except Exception as error:
+            self.errors.append(error)
+            self.abort.set()
+        finally:
+            with stage.lock:
+                stage.active -= 1
+                last = stage.active == 0
+            if last:
+                stage.finished = time.time()
+                if target is not None and not self.abort.is_set():
+                    try:
+                        self.put(target, DONE)
+                    except Aborted:
+                        pass
+
+    def run(self, items):
+        """
+        Run all the items through the pipeline.
+
+        Returns when every stage is done with every item.
+
+        :param items: iterable of items for the first stage,
+                      consumed only as fast as it's processed
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for number, stage in enumerate(self.stages):
+            source = queues[number]
+            target = queues[number + 1] if number + 1 < len(queues) else None
+            stage.active = stage.workers
+            stage.started = time.time()
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self.work,
+                                          args=(stage, source, target),
+                                          daemon=True)
+                thread.start()
+                threads.append(thread)
+        try:
+            for item in items:
+                self.put(queues[0], item)
+            self.put(queues[0], DONE)
+        except Aborted:
+            pass
+        except BaseException:
+            self.abort.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def metrics(self):
+        """Get the metrics of every stage, see Stage.metrics."""
+        return [x.metrics() for x in self.stages]
+
+    def print_metrics(self):
+        """Print the throughput and time spent by every stage."""
+        for metrics in self.metrics():
+            rate = metrics["per_second"] or 0.0
+            shares = ["{} {:.0%}".format(x, metrics[x] or 0.0)
+                      for x in ["busy", "waiting", "blocked"]]
+            print("Stage {}: {} in, {} out, {:.2f}/s, {}.".format(
+                metrics["stage"], metrics["items_in"],
+                metrics["items_out"], rate, ", ".join(shares)))
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Check every row of a dataset before any item is built.
+
+The free-text columns of the source data are looked up in
+the mapping files while the items are built, and a value
+that is missing from them used to stop the run with an
+exception, possibly hours into an upload. Here all the
+cleaned rows are checked against the indexes of the mapping
+bundle in a single pass instead, using the same lookups as
+NatureArea, and the problems are collected in a report,
+grouped by problem.
+
+Errors, which would stop or corrupt the build, exclude
+the row from the run:
+* unknown protection type (SKYDDSTYP),
+* no known municipality in KOMMUN, and none found from the
+  polygon of the area, see municipality_index.py,
+* county (LAN) missing from location_in in the glossary,
+* unknown IUCN category (IUCNKAT),
+* area values that are not numbers and inception dates
+  that can't be parsed, see area_columns.py.
+
+Warnings are reported, but the row is kept:
+* operator (FORVALTARE) that is not mapped to an item,
+  the area gets no operator,
+* municipality names in KOMMUN that are unknown, but
+  completed with the municipalities found from the polygon,
+* the other problems found by area_columns.py.
+"""
+PROTECTION_TYPES = ["Nationalpark", "Naturreservat"]
+NAME_CHANGES = {"Malung": "Malung-Sälen",  # Changed in 2007.
+                "Göteborg": "Gothenburg"}
+OPERATOR_CHANGES = {"Hässelholms kommun": "Hässleholms kommun",
+                    "Malungs kommun": "Malung-Sälens kommun"}
+COLUMN_ERRORS = ["is not a number", "is not a date"]
+
+
+def find_municipality(name, indexes):
+    """
+    Get the item of a municipality from its name.
+
+    :param name: e.g. "Solna", as in the KOMMUN column
+    :param indexes: the indexes of the mapping bundle
+    :return: Q-id, or None if the name is unknown
+    """
+    name = name.strip()
+    name = NAME_CHANGES.get(name, name)
+    for index, pattern in [("municipalities_en", "{} municipality"),
+                           ("municipalities_sv", "{} kommun"),
+                           ("municipalities_sv", "{}s kommun")]:
+        item = indexes[index].get(pattern.format(name).lower())
+        if item is not None:
+            return item
+    return None
+
+
+def resolve_municipalities(kommun, indexes):
+    """
+    Get the items of the municipalities listed in a KOMMUN value.
+
+    :param kommun: comma-separated municipality names
+    :param indexes: the indexes of the mapping bundle
+    :return: tuple (list of distinct Q-ids, list of unknown names)
+    """
+    items = []
+    unknown = []
+    for name in kommun.split(","):
+        if not name.strip():
+            continue
+        item = find_municipality(name, indexes)
+        if item is None:
+            unknown.append(name.strip())
+        elif item not in items:
+            items.append(item)
+    return (items, unknown)
+
+
+def find_operator(forvaltare, indexes):
+    """
+    Get the item of the operator of an area.
+
+    :param forvaltare: the FORVALTARE value
+    :param indexes: the indexes of the mapping bundle
+    :return: Q-id, or None if the operator is unknown
+    """
+    forvaltare = OPERATOR_CHANGES.get(forvaltare, forvaltare)
+    item = indexes["forvaltare_sv"].get(forvaltare.lower())
+    if item is None and "kommun" in forvaltare.lower():
+        item = indexes["municipalities_sv"].get(forvaltare.lower())
+    return item
+
+
+def get_county_name(lan):
+    """
+    Get the name of a county as used in the descriptions.
+
+    :param lan: the LAN value, e.g. "Stockholms län"
+    :return: e.g. "Stockholm"
+    """
+    county_name = " ".join(lan.split(" ")[:-1])
+    if county_name.endswith("s"):
+        county_name = county_name[:-1]
+    return county_name
+
+
+def get_iucn_code(iucnkat):
+    """
+    Get the IUCN category of an IUCNKAT value.
+
+    :param iucnkat: e.g. "II, Nationalpark"
+    :return: e.g. "II", the key in iucn_categories.json
+    """
+    return iucnkat.split(",")[0]
+
+
+def check_row(row, data_files):
+    """
+    Check a row against the mapping files.
+
+    :param row: the source data of an area
+    :param data_files: the mapping files, with their indexes,
+                       and the municipalities found from the
+                       polygons, if any
+    :return: tuple (dictionary of error -> details,
+             dictionary of warning -> details)
+    """
+    indexes = data_files["indexes"]
+    errors = {}
+    warnings = {}
+    skyddstyp = row["SKYDDSTYP"]
+    if skyddstyp not in PROTECTION_TYPES:
+        errors["unknown protection type"] = skyddstyp
+    items, unknown = resolve_municipalities(row["KOMMUN"], indexes)
+    if unknown or not items:
+        located = data_files.get("municipalities_found", {}).get(
+            row["NVRID"])
+        if located:
+            warnings["municipality from polygon"] = {"unknown": unknown,
+                                                     "found": located}
+        elif not items:
+            errors["unknown municipality"] = row["KOMMUN"]
+        else:
+            warnings["unknown municipality"] = unknown
+    if skyddstyp == "Naturreservat":
+        county_name = get_county_name(row["LAN"])
+        missing = [x for x in ["fi", "ru"] if county_name not in
+                   data_files["glossary"]["location_in"][x]]
+        if missing:
+            errors["county not in glossary"] = {"county": county_name,
+                                                "languages": missing}
+    if get_iucn_code(row["IUCNKAT"]) not in data_files["iucn_categories"]:
+        errors["unknown IUCN category"] = row["IUCNKAT"]
+    if find_operator(row["FORVALTARE"], indexes) is None:
+        warnings["unmapped operator"] = row["FORVALTARE"]
+    return (errors, warnings)
+
+
+def make_entry(row, detail):
+    """Create an entry of the report."""
+    return {"nature_id": row["NVRID"], "name": row["NAMN"],
+            "detail": detail}
+
+
+def add_column_problems(report, rows, column_problems):
+    """
+    Add the problems found by area_columns to a report.
+
+    :param column_problems: dictionary of problem -> list of NVRIDs,
+                            see area_columns.validate_area_columns
+    """
+    by_id = {x["NVRID"]: x for x in rows}
+    for problem, nature_ids in column_problems.items():
+        error = any(problem.endswith(x) for x in COLUMN_ERRORS)
+        group = report["errors" if error else "warnings"]
+        column = problem.split(" ")[0]
+        for nature_id in nature_ids:
+            row = by_id[nature_id]
+            group.setdefault(problem, []).append(
+                make_entry(row, row.get(column)))
+            report["problems"].setdefault(nature_id, {})[problem] = (
+                row.get(column))
+            if error:
+                report["excluded"].add(nature_id)
+
+
+def validate_rows(rows, data_files, column_problems=None):
+    """
+    Check all the rows of a dataset.
+
+    :param rows: the cleaned source data
+    :param data_files: the mapping files, see check_row
+    :param column_problems: the problems found by
+                            area_columns.validate_area_columns
+    :return: dictionary with "errors" and "warnings", both
+             problem -> list of report entries, "problems",
+             NVRID -> problem -> details of every row with
+             a problem, and "excluded", the set of NVRIDs
+             of the rows with errors
+    """
+    report = {"errors": {}, "warnings": {}, "problems": {},
+              "excluded": set()}
+    for row in rows:
+        errors, warnings = check_row(row, data_files)
+        for group, found in [("errors", errors), ("warnings", warnings)]:
+            for problem, detail in found.items():
+                report[group].setdefault(problem, []).append(
+                    make_entry(row, detail))
+                report["problems"].setdefault(
+                    row["NVRID"], {})[problem] = detail
+        if errors:
+            report["excluded"].add(row["NVRID"])
+    add_column_problems(report, rows, column_problems or {})
+    return report
+
+
+def exclude_rows(rows, report):
+    """Remove the rows with errors from a dataset."""
+    return [x for x in rows if x["NVRID"] not in report["excluded"]]
+
+
+def report_to_json(report):
+    """Get the parts of a report that are saved to file."""
+    return {"errors": report["errors"], "warnings": report["warnings"],
+            "excluded": sorted(report["excluded"])}
+
+
+def print_report(report):
+    """Print a summary of the report."""
+    for group in ["errors", "warnings"]:
+        for problem in sorted(report[group]):
+            print("Pre-flight {}, {}: {}".format(
+                group[:-1], problem, len(report[group][problem])))
+    print("Pre-flight: {} rows excluded.".format(len(report["excluded"])))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Update the dates in the references added by the importer.
+
+Every statement uploaded by nature_importer has a reference
+made by NatureArea.create_sources, with:
+
+* stated in (P248) -- the item of the dataset, e.g. source_nr,
+* reference URL (P854) -- the area in the nature registry,
+  see NatureArea.REFERENCE_URL,
+* publication date (P577) and retrieved (P813) -- the dates
+  of the release of the source data.
+
+When a new release is imported, the dates of the references
+that are already on the items have to follow. Removing and
+adding the statements again would take several edits per
+statement, so instead the references are found by their
+stated in and reference URL, their dates are set in the
+JSON of the item, and all the changed statements of an item
+are sent in a single wbeditentity edit.
+
+The functions here only work on the JSON of the items,
+nature_importer --refresh-references fetches and edits them.
+"""
+import re
+
+STATED_IN = "P248"
+REFERENCE_URL = "P854"
+DATE_PROPS = {"publication": "P577", "retrieved": "P813"}
+GREGORIAN = "http://www.wikidata.org/entity/Q1985727"
+DAY_PRECISION = 11
+
+
+def make_url_pattern(url_template):
+    """
+    Make a pattern matching the URLs made from a template.
+
+    :param url_template: e.g. "http://example.org/area/{}"
+    :return: compiled pattern, e.g. matching
+             "http://example.org/area/2000283"
+    """
+    parts = [re.escape(x) for x in url_template.split("{}")]
+    return re.compile("^{}$".format("[^/]+".join(parts)))
+
+
+def make_time_snak(prop, date):
+    """
+    Make a snak with a date, as in the JSON of an item.
+
+    :param prop: e.g. "P577"
+    :param date: in the format "2015-12-18"
+    """
+    value = {"time": "+{}T00:00:00Z".format(date),
+             "timezone": 0, "before": 0, "after": 0,
+             "precision": DAY_PRECISION, "calendarmodel": GREGORIAN}
+    return {"snaktype": "value", "property": prop,
+            "datavalue": {"value": value, "type": "time"},
+            "datatype": "time"}
+
+
+def get_snak_values(reference, prop):
+    """Get the values of a property in a reference, as in the JSON."""
+    return [x["datavalue"]["value"] for x in reference["snaks"].get(prop, [])
+            if x.get("snaktype") == "value" and "datavalue" in x]
+
+
+def is_importer_reference(reference, stated_in, url_pattern):
+    """
+    Check if a reference was added by the importer.
+
+    :param reference: a reference, as in the JSON of an item
+    :param stated_in: the Q-ids of the datasets, see datasets.py
+    :param url_pattern: pattern of the reference URLs,
+                        see make_url_pattern
+    """
+    sources = [x.get("id") for x in get_snak_values(reference, STATED_IN)
+               if isinstance(x, dict)]
+    urls = get_snak_values(reference, REFERENCE_URL)
+    return (any(x in stated_in for x in sources) and
+            any(url_pattern.match(x) for x in urls))
+
+
+def refresh_reference(reference, dates):
+    """
+    Set the dates of a reference.
+
+    Dates that are not in the reference are added, so that
+    references made without a retrieval date get one.
+
+    :param reference: a reference, as in the JSON of an item,
+                      changed in place
+    :param dates: dictionary with the "publication" and
+                  "retrieved" dates, e.g. "2015-12-18"
+    :return: whether anything changed
+    """
+    changed = False
+    for name, prop in sorted(DATE_PROPS.items()):
+        snak = make_time_snak(prop, dates[name])
+        current = get_snak_values(reference, prop)
+        if current == [snak["datavalue"]["value"]]:
+            continue
+        reference["snaks"][prop] = [snak]
+        if prop not in reference.get("snaks-order", [prop]):
+            reference["snaks-order"].append(prop)
+        changed = True
+    if changed:
+        reference.pop("hash", None)
+    return changed
+
+
+def refresh_entity(entity, stated_in, url_pattern, dates):
+    """
+    Set the dates of all the importer's references in an item.
+
+    :param entity: the JSON of the item, changed in place
+    :param stated_in: the Q-ids of the datasets
+    :param url_pattern: pattern of the reference URLs
+    :param dates: the new dates, see refresh_reference
+    :return: tuple (list of the changed statements,
+             number of references changed)
+    """
+    statements = []
+    references = 0
+    for claims in entity.get("claims", {}).values():
+        for claim in claims:
+            changed = 0
+            for reference in claim.get("references", []):
+                if (is_importer_reference(reference, stated_in,
+                                          url_pattern) and
+                        refresh_reference(reference, dates)):
+                    changed += 1
+            if changed:
+                statements.append(claim)
+                references += changed
+    return (statements, references)
+
+
+def make_edit_data(statements):
+    """
+    Make the data of a wbeditentity edit changing some statements.
+
+    Statements are sent with their IDs, so they are replaced,
+    and the other statements of the item are left as they are.
+    """
+    return {"claims": statements}
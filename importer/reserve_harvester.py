@@ -33,28 +33,38 @@ In a considerable number of cases, the svwp article describes
 both a natural feature (island, lake, valley) and a reserve.
 Because of that, its WD item can have its P31 set to this
 natural feature. This script collects all WD items associated
-with articles, without checking the P31, this check should probably
-be done as part of the actual upload.
+with articles, without checking the P31, this check is done
+before the actual upload, see match_validator.py.
+
+With --http-cache, the requests to svwp and Wikidata are
+recorded, and can be replayed offline with
+--http-cache-mode replay, see http_cache.py.
 """
-import pywikibot
+import argparse
 
+import http_cache
 import importer_utils as utils
 
 reserves_file = "petscan_naturreservat.json"
 reserves_source = "NR_polygon.csv"
 
 municip_cache_global = {}
+pages_global = None
 
 
-def read_reserve_csv():
+def read_reserve_csv(filepath=None):
     """
     Load source data about nature reserves from csv file.
 
     Since we don't need all the data, only the name, nature ID,
     protection status and municipalities are extracted.
+
+    :param filepath: the source file, NR_polygon.csv
+                     in the data directory by default
     """
     reserves = []
-    filepath = utils.get_file_from_subdir("data", reserves_source)
+    if filepath is None:
+        filepath = utils.get_file_from_subdir("data", reserves_source)
     reserves_raw = utils.get_data_from_csv_file(filepath)
     for area in reserves_raw:
         reserve = {}
@@ -66,9 +76,10 @@ def read_reserve_csv():
     return reserves
 
 
-def read_wp_nr_list():
+def read_wp_nr_list(filepath=None):
     """Load the content of petscan list of nature reserves."""
-    filepath = utils.get_file_from_subdir("data", reserves_file)
+    if filepath is None:
+        filepath = utils.get_file_from_subdir("data", reserves_file)
     content = utils.load_json(filepath)
     return content["*"][0]["a"]["*"]
 
@@ -80,12 +91,17 @@ def get_municipalities(title):
     Get the names of categories to which the article
     belongs, and extract the names of municipalities
     from them.
+    With --pages, the categories are read from the file.
     """
     municipalities = []
-    site = pywikibot.Site("sv", "wikipedia")
-    page = pywikibot.Page(site, title)
-    for cat in page.categories():
-        cat_title = cat.titleWithoutNamespace()
+    if pages_global is not None:
+        cat_titles = pages_global.get(title, {}).get("categories", [])
+    else:
+        import pywikibot
+        site = pywikibot.Site("sv", "wikipedia")
+        page = pywikibot.Page(site, title)
+        cat_titles = [x.titleWithoutNamespace() for x in page.categories()]
+    for cat_title in cat_titles:
         if cat_title not in municip_cache_global:
             possible_m = utils.extract_municipality_name(cat_title)
             municip_cache_global[cat_title] = possible_m
@@ -94,7 +110,19 @@ def get_municipalities(title):
     return municipalities
 
 
-def process_wp_reserves():
+def get_item(title):
+    """
+    Get the WD item of an svwp article.
+
+    With --pages, it's read from the file, and no item is
+    created for an article without one.
+    """
+    if pages_global is not None:
+        return pages_global.get(title.replace("_", " "), {}).get("item")
+    return utils.q_from_wikipedia("sv", title)
+
+
+def process_wp_reserves(source_file=None, petscan_file=None):
     """
     Process a Petscan-generated list of nature reserves on svwp.
 
@@ -106,6 +134,9 @@ def process_wp_reserves():
     after every lookup rather than after the finished run,
     so that the current result can be peeked into
     before the processing is done.
+
+    :param source_file: the source file, see read_reserve_csv
+    :param petscan_file: the Petscan dump, see read_wp_nr_list
     """
     results_file_exact = "svwp_to_nature_id_exact.json"
     results_file_none = "svwp_to_nature_id_none.json"
@@ -113,9 +144,9 @@ def process_wp_reserves():
     results = []
     results_none = []
     results_multiple = []
-    reserves_on_wp = read_wp_nr_list()
+    reserves_on_wp = read_wp_nr_list(petscan_file)
     article_count = len(reserves_on_wp)
-    reserves_source = read_reserve_csv()
+    reserves_source = read_reserve_csv(source_file)
     print("Processing {} svwp articles.".format(article_count))
     counter = 0
     for article_title in reserves_on_wp:
@@ -131,7 +162,7 @@ def process_wp_reserves():
                 entry["wp_article"] = article_title
                 entry["source_name"] = guesses[0]["name"]
                 entry["nature_id"] = guesses[0]["nature_id"]
-                entry["item"] = utils.q_from_wikipedia("sv", article_title)
+                entry["item"] = get_item(article_title)
                 results.append(entry)
                 utils.json_to_file(results_file_exact, results)
             elif len(guesses) > 1:
@@ -198,4 +229,22 @@ def find_wp_reserve_in_data_file(article_title, reserves_source):
 
 
 if __name__ == "__main__":
-    process_wp_reserves()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source",
+                        help="source file to match the articles to, "
+                             "instead of data/{}".format(reserves_source))
+    parser.add_argument("--petscan",
+                        help="Petscan dump of the articles, "
+                             "instead of data/{}".format(reserves_file))
+    parser.add_argument("--pages",
+                        help="read the categories and items of the "
+                             "articles from this file instead of the API, "
+                             "e.g. made by synthetic_data.py")
+    http_cache.add_arguments(parser)
+    args = parser.parse_args()
+    cache = http_cache.install_from_arguments(vars(args))
+    if args.pages:
+        pages_global = utils.load_json(args.pages)
+    process_wp_reserves(args.source, args.petscan)
+    if cache is not None:
+        cache.print_stats()
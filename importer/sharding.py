@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Split an import between several processes or hosts.
+
+With --shard i/N, nature_importer only handles the areas
+of shard i of N (counting from 1). Areas are assigned to
+shards by a CRC-32 hash of their nature ID, or of their
+county, so every host computes the same partition without
+coordinating, and every area ends up in exactly one shard.
+Sharding by county keeps the areas of a county together,
+but the shards are less even, as there are only 21 counties.
+
+The journals, preview tables and json reports written
+by the shards can then be combined:
+
+    python3 sharding.py --kind journal --output journal.jsonl \
+        journal_1.jsonl journal_2.jsonl
+    python3 sharding.py --kind report --output match_problems.json \
+        match_problems_nr_*_shard1of2.json match_problems_nr_*_shard2of2.json
+
+Cost reports have their own kind, so that their totals and
+percentiles are recomputed rather than listed per shard,
+see api_costs.merge_reports.
+"""
+import argparse
+import json
+import zlib
+
+import api_costs
+
+SHARD_COLUMNS = {"nvrid": "NVRID", "county": "LAN"}
+MERGE_KINDS = ["journal", "preview", "report", "costs"]
+
+
+def parse_shard(text):
+    """
+    Parse a shard given as i/N.
+
+    :param text: e.g. "2/4" for the second of four shards
+    :return: tuple (index, count), the index counting from 1
+    """
+    try:
+        index, count = [int(x) for x in text.split("/")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "shard should look like i/N, not {}".format(text))
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "shard {} is not between 1 and {}".format(index, count))
+    return (index, count)
+
+
+def shard_of(key, count):
+    """
+    Get the shard of a key.
+
+    :param key: the nature ID or county of an area
+    :param count: number of shards
+    :return: shard number, counting from 1
+    """
+    return zlib.crc32(key.encode("utf-8")) % count + 1
+
+
+def in_shard(row, shard, by="nvrid"):
+    """
+    Check if an area belongs to a shard.
+
+    :param row: the source data of the area
+    :param shard: tuple (index, count)
+    :param by: "nvrid" or "county", see SHARD_COLUMNS
+    """
+    index, count = shard
+    return shard_of(row[SHARD_COLUMNS[by]], count) == index
+
+
+def select_shard(rows, shard, by="nvrid"):
+    """Keep the areas that belong to a shard."""
+    return [x for x in rows if in_shard(x, shard, by)]
+
+
+def get_shard_suffix(shard):
+    """Get the suffix added to the names of the files of a shard."""
+    return "shard{}of{}".format(*shard)
+
+
+def merge_journals(filepaths):
+    """
+    Combine upload journals.
+
+    :return: tuple (list of journal entries,
+             dictionary of key -> items for keys
+             that were uploaded to different items)
+    """
+    entries = {}
+    conflicts = {}
+    for filepath in filepaths:
+        with open(filepath) as f_obj:
+            for line in f_obj:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                known = entries.setdefault(entry["key"], entry)
+                if known["item"] != entry["item"]:
+                    items = conflicts.setdefault(entry["key"], [known["item"]])
+                    if entry["item"] not in items:
+                        items.append(entry["item"])
+    return (list(entries.values()), conflicts)
+
+
+def merge_values(values):
+    """
+    Combine the same value from several json reports.
+
+    Lists are concatenated and dictionaries merged key by key.
+    Anything else, like totals, is kept from every report,
+    as a list.
+    """
+    if all(isinstance(x, list) for x in values):
+        return [y for x in values for y in x]
+    if all(isinstance(x, dict) for x in values):
+        return merge_reports(values)
+    return values
+
+
+def merge_reports(reports):
+    """Combine json reports, see merge_values."""
+    merged = {}
+    keys = []
+    for report in reports:
+        keys.extend(x for x in report if x not in keys)
+    for key in keys:
+        values = [x[key] for x in reports if key in x]
+        merged[key] = values[0] if len(values) == 1 else merge_values(values)
+    return merged
+
+
+def merge_files(kind, filepaths, output):
+    """
+    Combine the files of the same kind written by several shards.
+
+    :param kind: "journal", "preview", "report" or "costs"
+    :param filepaths: the files of the shards
+    :param output: the file to write
+    """
+    if kind == "journal":
+        entries, conflicts = merge_journals(filepaths)
+        with open(output, "w") as f_obj:
+            for entry in entries:
+                f_obj.write(json.dumps(entry) + "\n")
+        print("Merged {} journal entries.".format(len(entries)))
+        for key, items in sorted(conflicts.items()):
+            print("{} was uploaded to several items: {}".format(
+                key, ", ".join(items)))
+    elif kind == "preview":
+        with open(output, "w") as out_obj:
+            for filepath in filepaths:
+                with open(filepath) as f_obj:
+                    out_obj.write(f_obj.read())
+    elif kind in ("report", "costs"):
+        reports = []
+        for filepath in filepaths:
+            with open(filepath) as f_obj:
+                reports.append(json.load(f_obj))
+        if kind == "costs":
+            merged = api_costs.merge_reports(reports)
+        else:
+            merged = merge_reports(reports)
+        with open(output, "w") as f_obj:
+            json.dump(merged, f_obj, sort_keys=True,
+                      indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kind", required=True, choices=MERGE_KINDS)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args()
+    merge_files(args.kind, args.files, args.output)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generate source data, Petscan dumps and category data at any scale.
+
+The only real data are the files in the data directory, so
+this makes files that look like them, with as many nature
+reserves as needed, to stress-test the loading, the matching
+and the uploading well beyond today's volume:
+
+* NR_polygon.csv -- the source file of the nature reserves,
+  with reserves in several municipalities, duplicate rows
+  of a reserve with another status than "Gällande", and
+  reserves that are no longer valid at all,
+* petscan_naturreservat.json -- the svwp articles about
+  the reserves, in the format of a Petscan dump, including
+  lists and articles that don't match any reserve,
+* svwp_pages.json -- the categories and the Wikidata item of
+  every article, which reserve_harvester otherwise gets
+  from the API, see its --pages option.
+
+Counties, municipalities, operators and IUCN categories
+are picked from the mapping files, so that all of them
+can be mapped to items.
+
+Usage: python3 synthetic_data.py --scale 10 --output-dir synthetic
+"""
+import argparse
+import csv
+import json
+import os
+import random
+
+BASE_ROWS = 5000  # About the number of nature reserves in 2017.
+FIRST_NATURE_ID = 9000000
+FIRST_ITEM = 900000000
+SOURCE_FILE = "NR_polygon.csv"
+PETSCAN_FILE = "petscan_naturreservat.json"
+PAGES_FILE = "svwp_pages.json"
+COLUMNS = ["OBJECTID", "NVRID", "NAMN", "SKYDDSTYP", "BESLSTATUS",
+           "URSBESLDAT", "LAN", "KOMMUN", "FORVALTARE", "IUCNKAT",
+           "AREA_HA", "LAND_HA", "VATTEN_HA", "SKOG_HA"]
+INVALID_STATUSES = ["Upphävt", "Överklagat"]
+NAME_PARTS = (["", "Norra ", "Södra ", "Stora ", "Lilla "],
+              ["Björk", "Ek", "Gran", "Tall", "Sjö", "Myr", "Ås", "Berg",
+               "Ängs", "Lund", "Hassel", "Lind"],
+              ["udden", "mossen", "berget", "skogen", "ön", "dalen",
+               "ängen", "viken", "kärret", "hagen"])
+OTHER_CATEGORIES = ["Natura 2000-områden i Sverige",
+                    "Ädellövskogar i Sverige"]
+
+
+def load_data_file(filename):
+    """Load one of the mapping files."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "data", filename)
+    with open(path) as f_obj:
+        return json.load(f_obj)
+
+
+def load_choices():
+    """
+    Get the values the rows are made of, from the mapping files.
+
+    :return: dictionary with the counties, municipalities
+             (as tuples of KOMMUN name, name in svwp categories),
+             operators, IUCN categories and the nature reserves
+             of the svwp mapping file
+    """
+    return {"counties": sorted(
+                load_data_file("glossary.json")["location_in"]["fi"]),
+            "municipalities": [
+                (x["en"][:-len(" Municipality")], x["sv"])
+                for x in load_data_file("municipalities.json")
+                if x["en"].endswith(" Municipality") and x.get("sv")],
+            "operators": [x["sv"] for x in load_data_file("forvaltare.json")],
+            "iucn": [x for x in load_data_file("iucn_categories.json")
+                     if x != "0"],
+            "mapped": load_data_file("svwp_to_nature_id_exact.json")}
+
+
+def make_name(choice):
+    """Make up the name of a nature reserve."""
+    name = "".join(choice.choice(x) for x in NAME_PARTS)
+    if choice.random() < 0.3:
+        name += " naturreservat"
+    return name
+
+
+def make_row(choice, choices, nature_id, municipalities):
+    """
+    Make up a row of the source file.
+
+    :param choice: the random.Random to pick values with
+    :param choices: the values to pick from, see load_choices
+    :param nature_id: the NVRID of the row
+    :param municipalities: the KOMMUN names of the row
+    """
+    land = round(choice.uniform(1, 500), 1)
+    water = round(choice.uniform(0, 100), 1)
+    return {
+        "OBJECTID": "",
+        "NVRID": nature_id,
+        "NAMN": make_name(choice),
+        "SKYDDSTYP": "Naturreservat",
+        "BESLSTATUS": "Gällande",
+        "LAN": "{}s län".format(choice.choice(choices["counties"])),
+        "KOMMUN": ", ".join(municipalities),
+        "FORVALTARE": choice.choice(choices["operators"]),
+        "IUCNKAT": "{}, Naturreservat".format(choice.choice(choices["iucn"])),
+        "URSBESLDAT": "'{}-{:02d}-{:02d}'".format(
+            choice.randint(1910, 2016), choice.randint(1, 12),
+            choice.randint(1, 28)),
+        "AREA_HA": str(round(land + water, 1)),
+        "LAND_HA": str(land),
+        "VATTEN_HA": str(water),
+        "SKOG_HA": str(round(land * choice.random(), 1))}
+
+
+def make_rows(count, existing_share, seed=None, multi_share=0.0,
+              duplicate_share=0.0, invalid_share=0.0):
+    """
+    Generate rows that look like the nature reserve source file.
+
+    Duplicate and invalid rows come on top of count, and are
+    removed again when the file is cleaned, see
+    nature_importer.clean_nature_dataset.
+
+    :param count: number of valid nature reserves
+    :param existing_share: share of the reserves that get the nature ID
+                           of a reserve in the svwp mapping file
+    :param seed: seed of the random choices
+    :param multi_share: share of the reserves in 2-3 municipalities
+    :param duplicate_share: share of the reserves that also have
+                            a row with another status
+    :param invalid_share: number of reserves that are no longer
+                          valid, as a share of count
+    :return: tuple (rows, Q-ids of the matched items)
+    """
+    choice = random.Random(seed)
+    choices = load_choices()
+    mapped = list(choices["mapped"])
+    choice.shuffle(mapped)
+    mapped = mapped[:int(count * existing_share)]
+    names = [x[0] for x in choices["municipalities"]]
+    rows = []
+    for index in range(count + int(count * invalid_share)):
+        if index < len(mapped):
+            nature_id = mapped[index]["nature_id"]
+        else:
+            nature_id = str(FIRST_NATURE_ID + index)
+        size = choice.randint(2, 3) if choice.random() < multi_share else 1
+        row = make_row(choice, choices, nature_id,
+                       choice.sample(names, size))
+        row["OBJECTID"] = str(len(rows) + 1)
+        if index >= count:
+            row["BESLSTATUS"] = choice.choice(INVALID_STATUSES)
+        rows.append(row)
+    valid = rows[:count]
+    for index in range(int(count * duplicate_share)):
+        row = dict(choice.choice(valid))
+        row["OBJECTID"] = str(len(rows) + 1)
+        row["BESLSTATUS"] = choice.choice(INVALID_STATUSES)
+        rows.insert(choice.randint(0, len(rows)), row)
+    return (rows, [x["item"] for x in mapped])
+
+
+def get_article_title(row, choice):
+    """Get the title of a made-up svwp article about a reserve."""
+    title = row["NAMN"]
+    if not title.endswith(" naturreservat") and choice.random() < 0.3:
+        title += " naturreservat"
+    return title.replace(" ", "_")
+
+
+def make_articles(rows, seed=None, article_share=0.8, other_share=0.1):
+    """
+    Generate svwp articles about the valid reserves of some rows.
+
+    :param rows: rows made by make_rows
+    :param seed: seed of the random choices
+    :param article_share: share of the reserves with an article
+    :param other_share: number of articles that are not about any
+                        reserve, as a share of the reserves
+    :return: tuple (titles, as in a Petscan dump, dictionary of
+             title -> {"categories", "item"}, the svwp pages)
+    """
+    choice = random.Random(seed)
+    svwp_names = dict(x for x in load_choices()["municipalities"])
+    valid = [x for x in rows if x["BESLSTATUS"] == "Gällande"]
+    titles = []
+    pages = {}
+    for index, row in enumerate(valid):
+        if choice.random() >= article_share:
+            continue
+        municipalities = [svwp_names[x] for x in row["KOMMUN"].split(", ")]
+        title = get_article_title(row, choice)
+        if title.replace("_", " ") in pages:
+            title = "{},_{}".format(title,
+                                    municipalities[0].replace(" ", "_"))
+            if title.replace("_", " ") in pages:
+                continue
+        categories = ["Naturreservat i {}".format(x) for x in municipalities]
+        categories.append(choice.choice(OTHER_CATEGORIES))
+        titles.append(title)
+        pages[title.replace("_", " ")] = {
+            "categories": categories,
+            "item": "Q{}".format(FIRST_ITEM + index)}
+    for county in sorted(set(x["LAN"] for x in valid)):
+        titles.append("Lista_över_naturreservat_i_{}".format(
+            county.replace(" ", "_")))
+    for index in range(int(len(valid) * other_share)):
+        title = "{}_({})".format(make_name(choice).replace(" ", "_"),
+                                 choice.choice(["sjö", "ö", "berg"]))
+        if title.replace("_", " ") in pages:
+            continue
+        titles.append(title)
+        pages[title.replace("_", " ")] = {
+            "categories": [choice.choice(OTHER_CATEGORIES)],
+            "item": "Q{}".format(FIRST_ITEM + len(valid) + index)}
+    choice.shuffle(titles)
+    return (titles, pages)
+
+
+def make_petscan(titles):
+    """Wrap article titles in the format of a Petscan dump."""
+    return {"*": [{"a": {"*": titles}}]}
+
+
+def write_csv(rows, filepath):
+    """Write rows in the format of the source file."""
+    with open(filepath, "w", newline="") as f_obj:
+        writer = csv.DictWriter(f_obj, fieldnames=COLUMNS, delimiter=",")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(content, filepath):
+    """Write a generated json file."""
+    with open(filepath, "w") as f_obj:
+        json.dump(content, f_obj, ensure_ascii=False, indent=1)
+
+
+def generate(output_dir, count, seed=None, **shares):
+    """
+    Generate the source file, the Petscan dump and the svwp pages.
+
+    :param output_dir: directory to write the files to
+    :param count: number of valid nature reserves
+    :param seed: seed of the random choices
+    :param shares: the shares of make_rows
+    :return: dictionary of file -> number of rows or articles
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rows, _ = make_rows(count, seed=seed, **shares)
+    titles, pages = make_articles(rows, seed=seed)
+    write_csv(rows, os.path.join(output_dir, SOURCE_FILE))
+    write_json(make_petscan(titles), os.path.join(output_dir, PETSCAN_FILE))
+    write_json(pages, os.path.join(output_dir, PAGES_FILE))
+    return {SOURCE_FILE: len(rows), PETSCAN_FILE: len(titles),
+            PAGES_FILE: len(pages)}
+
+
+def main():
+    """Generate the files with the command line arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output-dir", default="synthetic")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="number of reserves, as a multiple "
+                             "of {}".format(BASE_ROWS))
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--existing-share", type=float, default=0.1,
+                        help="share of the reserves that have "
+                             "the nature ID of a mapped reserve")
+    parser.add_argument("--multi-share", type=float, default=0.05,
+                        help="share of the reserves in several "
+                             "municipalities")
+    parser.add_argument("--duplicate-share", type=float, default=0.02,
+                        help="share of the reserves with a duplicate row")
+    parser.add_argument("--invalid-share", type=float, default=0.02,
+                        help="invalid reserves, as a share of the "
+                             "valid ones")
+    args = parser.parse_args()
+    written = generate(args.output_dir, int(BASE_ROWS * args.scale),
+                       seed=args.seed,
+                       existing_share=args.existing_share,
+                       multi_share=args.multi_share,
+                       duplicate_share=args.duplicate_share,
+                       invalid_share=args.invalid_share)
+    for filename, number in sorted(written.items()):
+        print("{:8d} {}".format(number, os.path.join(args.output_dir,
+                                                     filename)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Estimate what uploading the built items would cost, without uploading.
+
+With --estimate, nature_importer builds and validates
+the items as usual, but instead of uploading them counts
+what the upload would do:
+
+* items that would be created, in a single edit each,
+* items that already exist,
+* the labels, descriptions and claims that would be sent,
+  to both, in total and by new vs existing items,
+
+and turns that into API reads and writes, and wall time.
+Every upload is made of phases, the same as in the cost
+reports of api_costs.py: "create" for new items, and
+"prefetch", "labels", "descriptions" and "claim <prop>"
+for existing ones. What a phase costs is taken from
+the cost report of an earlier run if one is given,
+and otherwise from a simple model: one read to fetch
+the item, and one write per label and description
+language and per claim. Since labels and claims that
+are already on an item are not sent again, the model is
+an upper bound for existing items.
+
+The wall time is limited by whichever is slowest of:
+the interval between upload slots, the per-edit throttle
+of pywikibot (put_throttle), and the time the items take
+divided by the number of concurrent uploads. It assumes
+the throttle is at its fastest and the lag stays low,
+so it's a lower bound of what a live run takes.
+"""
+import json
+
+READ_SECONDS = 0.3
+WRITE_SECONDS = 1.0
+STAT_KEYS = ["reads", "writes", "seconds"]
+
+
+def make_counts(key, dataset, new, upload, labels, descriptions, props):
+    """
+    Describe what the upload of an item would send.
+
+    :param key: identifier of the item, e.g. the nature ID
+    :param dataset: short name of its dataset, e.g. "nr"
+    :param new: whether the item would be created
+    :param upload: whether the item would be uploaded at all
+    :param labels: number of label languages
+    :param descriptions: number of description languages
+    :param props: list of the properties of the claims
+    """
+    return {"key": key, "dataset": dataset, "new": new, "upload": upload,
+            "labels": labels, "descriptions": descriptions,
+            "claims": list(props)}
+
+
+def count_item(area, dataset_code):
+    """Describe the upload of a built NatureArea, see make_counts."""
+    wd_item = area.wd_item
+    return make_counts(area.raw_data["NVRID"], dataset_code,
+                       wd_item["wd-item"] is None,
+                       wd_item["upload"] is not False,
+                       len(wd_item["labels"]), len(wd_item["descriptions"]),
+                       [x["prop"] for x in wd_item["statements"]])
+
+
+def count_record(record):
+    """Describe the upload of an item of an export file."""
+    return make_counts(record["key"], record["dataset"],
+                       record["item"] is None,
+                       record["upload"] is not False,
+                       len(record["labels"]), len(record["descriptions"]),
+                       [x["prop"] for x in record["statements"]])
+
+
+def get_phases(counts):
+    """
+    Get the phases of the upload of an item.
+
+    :return: list of tuples (phase, number of values sent in it)
+    """
+    if not counts["upload"]:
+        return []
+    if counts["new"]:
+        return [("create", 1)]
+    phases = [("prefetch", 0)]
+    if counts["labels"]:
+        phases.append(("labels", counts["labels"]))
+    if counts["descriptions"]:
+        phases.append(("descriptions", counts["descriptions"]))
+    phases.extend(("claim {}".format(x), 1) for x in counts["claims"])
+    return phases
+
+
+def mean(summary):
+    """Get the mean of a summary made by api_costs.summarize."""
+    if not summary["count"]:
+        return 0.0
+    return summary["total"] / summary["count"]
+
+
+def load_phase_costs(filepath):
+    """
+    Get the mean cost of every phase from a cost report.
+
+    :param filepath: costs_<timestamp>.json of an earlier run
+    :return: dictionary of "new"/"existing" ->
+             phase -> {"reads", "writes", "seconds"}
+    """
+    with open(filepath) as f_obj:
+        report = json.load(f_obj)
+    costs = {}
+    for status, summary in report["by_status"].items():
+        costs[status] = {
+            name: {key: mean(phase[key]) for key in STAT_KEYS}
+            for name, phase in summary["phases"].items()}
+    return costs
+
+
+def get_phase_cost(name, size, costs, put_throttle):
+    """
+    Get what a phase costs.
+
+    :param name: the phase, e.g. "claim P31"
+    :param size: number of values sent in it, see get_phases
+    :param costs: the measured phase costs of new or existing
+                  items, see load_phase_costs, or None
+    :param put_throttle: seconds pywikibot waits between edits
+    :return: dictionary with the reads, writes and seconds
+    """
+    if costs:
+        if name in costs:
+            return costs[name]
+        if name.startswith("claim "):
+            claims = [v for k, v in costs.items() if k.startswith("claim ")]
+            if claims:
+                return {key: sum(x[key] for x in claims) / len(claims)
+                        for key in STAT_KEYS}
+    reads = 1 if name == "prefetch" else 0
+    writes = size
+    return {"reads": reads, "writes": writes,
+            "seconds": (reads * READ_SECONDS +
+                        writes * max(WRITE_SECONDS, put_throttle))}
+
+
+def summarize_counts(items, phase_costs, workers, min_interval,
+                     put_throttle):
+    """
+    Estimate the costs of uploading a group of items.
+
+    :param items: list of counts, see make_counts
+    :param phase_costs: measured costs, see load_phase_costs, or None
+    :param workers: most concurrent uploads
+    :param min_interval: shortest time between uploads, in seconds
+    :param put_throttle: seconds pywikibot waits between edits
+    :return: dictionary with the number of items, values sent,
+             in total and in "sent" by new/existing,
+             API calls and the estimated wall time
+    """
+    summary = {"items": len(items), "new": 0, "existing": 0, "skipped": 0,
+               "labels": 0, "descriptions": 0, "claims": 0,
+               "sent": {x: {"labels": 0, "descriptions": 0, "claims": 0}
+                        for x in ["new", "existing"]},
+               "reads": 0.0, "writes": 0.0, "item_seconds": 0.0}
+    for counts in items:
+        if not counts["upload"]:
+            summary["skipped"] += 1
+            continue
+        status = "new" if counts["new"] else "existing"
+        summary[status] += 1
+        sent = {"labels": counts["labels"],
+                "descriptions": counts["descriptions"],
+                "claims": len(counts["claims"])}
+        for key, value in sent.items():
+            summary[key] += value
+            summary["sent"][status][key] += value
+        costs = (phase_costs or {}).get(status)
+        for name, size in get_phases(counts):
+            cost = get_phase_cost(name, size, costs, put_throttle)
+            summary["reads"] += cost["reads"]
+            summary["writes"] += cost["writes"]
+            summary["item_seconds"] += cost["seconds"]
+    uploads = summary["new"] + summary["existing"]
+    limits = {"interval": uploads * min_interval,
+              "put_throttle": summary["writes"] * put_throttle,
+              "workers": summary["item_seconds"] / max(workers, 1)}
+    limited_by = max(sorted(limits), key=lambda x: limits[x])
+    summary["reads"] = round(summary["reads"])
+    summary["writes"] = round(summary["writes"])
+    summary["item_seconds"] = round(summary["item_seconds"], 1)
+    summary["seconds"] = round(limits[limited_by], 1)
+    summary["limited_by"] = limited_by
+    return summary
+
+
+def make_estimate(items, phase_costs=None, workers=1, min_interval=1.0,
+                  put_throttle=10.0):
+    """
+    Estimate the costs of an upload, in total and by dataset.
+
+    :param items: list of counts, see make_counts
+    :return: dictionary with the settings it's based on,
+             the summary of all items and one per dataset,
+             see summarize_counts
+    """
+    settings = (phase_costs, workers, min_interval, put_throttle)
+    by_dataset = {}
+    for counts in items:
+        by_dataset.setdefault(counts["dataset"], []).append(counts)
+    return {"settings": {"workers": workers,
+                         "min_interval": min_interval,
+                         "put_throttle": put_throttle,
+                         "measured_costs": phase_costs is not None},
+            "all": summarize_counts(items, *settings),
+            "by_dataset": {k: summarize_counts(v, *settings)
+                           for k, v in by_dataset.items()}}
+
+
+def format_duration(seconds):
+    """Format a number of seconds as hours and minutes."""
+    minutes = int(round(seconds / 60))
+    return "{}h{:02d}m".format(minutes // 60, minutes % 60)
+
+
+def print_estimate(estimate):
+    """Print the summary of an estimate."""
+    summary = estimate["all"]
+    print("Estimate: {} new items, {} existing, {} skipped, "
+          "sending {} labels, {} descriptions and {} claims.".format(
+              summary["new"], summary["existing"], summary["skipped"],
+              summary["labels"], summary["descriptions"],
+              summary["claims"]))
+    print("Estimate: {} reads, {} writes, at least {}, "
+          "limited by {}.".format(
+              summary["reads"], summary["writes"],
+              format_duration(summary["seconds"]), summary["limited_by"]))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load-test the uploader against a local Wikibase stand-in.
+
+Starts the stand-in of wikibase_standin.py, registers a
+pywikibot family for it (next to the families of the
+normal user-config.py), and runs nature_importer with live uploads
+of nature reserves generated by synthetic_data.py. A share of
+the reserves is matched to items that already exist in the stand-in,
+via the mapping files, so both creating and editing
+items are measured.
+
+The throttle and cost reports of nature_importer are
+written as usual, and an uploader_benchmark_<timestamp>.json report
+adds the wall time, the upload rate, the most workers the
+throttle allowed and the most uploads that actually ran at once,
+and the requests the stand-in received per action.
+
+Usage:
+    python3 uploader_benchmark.py --items 500 --workers 8 --min-interval 0 \
+        --latency 0.05 --maxlag-rate 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from Uploader import Uploader
+import datasets
+import nature_importer
+import synthetic_data
+import wikibase_standin
+
+FAMILY = "standin"
+
+
+class GeneratedDataset(datasets.Dataset):
+    """The nature reserve dataset, with generated rows."""
+
+    def __init__(self, rows):
+        """Initialize the dataset like the real one, with given rows."""
+        real = datasets.get_dataset("nr")
+        datasets.Dataset.__init__(self,
+                                  code=real.code,
+                                  source_file="generated",
+                                  geometry_file="generated.geojsonl",
+                                  edit_summary=real.edit_summary,
+                                  source_item=real.source_item,
+                                  protection_type=real.protection_type)
+        self.rows = rows
+
+    def load_rows(self):
+        """Get the generated rows."""
+        return [dict(x) for x in self.rows]
+
+
+def configure_pywikibot(server, put_throttle):
+    """
+    Make the stand-in available to pywikibot as a site.
+
+    :param server: the running StandinServer
+    :param put_throttle: seconds pywikibot waits between edits
+    """
+    import pywikibot
+    directory = tempfile.mkdtemp(prefix="standin_")
+    pywikibot.config.family_files[FAMILY] = (
+        wikibase_standin.write_family_file(directory, server, FAMILY))
+    pywikibot.config.usernames[FAMILY][FAMILY] = "Standin bot"
+    pywikibot.config.put_throttle = put_throttle
+
+
+def run_benchmark(arguments):
+    """
+    Start the stand-in and upload the generated reserves to it.
+
+    :param arguments: the command line arguments
+    :return: the report of the load test
+    """
+    server = wikibase_standin.start_server(
+        port=arguments.port,
+        latency=arguments.latency,
+        maxlag_rate=arguments.maxlag_rate,
+        lag=arguments.lag,
+        error_rate=arguments.error_rate,
+        seed=arguments.seed)
+    rows, matched = synthetic_data.make_rows(
+        arguments.items, arguments.existing_share, seed=arguments.seed)
+    for item in matched:
+        server.store.add_item(item)
+    server.store.add_item(Uploader.TEST_ITEM)
+    configure_pywikibot(server, arguments.put_throttle)
+    datasets.register_dataset(GeneratedDataset(rows))
+    importer_arguments = nature_importer.make_parser().parse_args([
+        "--dataset", "nr",
+        "--upload", "live",
+        "--site", "{0}:{0}".format(FAMILY),
+        "--sparql-endpoint",
+        server.get_url() + wikibase_standin.SPARQL_PATH,
+        "--workers", str(arguments.workers),
+        "--min-interval", str(arguments.min_interval),
+        "--start-interval", str(arguments.start_interval),
+        "--maxlag", str(arguments.maxlag)])
+    print("Uploading {} reserves ({} existing) to {}.".format(
+        len(rows), len(matched), server.get_url()))
+    start = time.time()
+    run = nature_importer.main(importer_arguments)
+    elapsed = time.time() - start
+    server.shutdown()
+    throttle = run["throttle"].metrics() if run["throttle"] else {}
+    return {"items": len(rows),
+            "existing": len(matched),
+            "seconds": elapsed,
+            "items_per_minute": len(rows) * 60 / elapsed,
+            "peak_workers": throttle.get("peak_workers", 0),
+            "peak_active": throttle.get("peak_active", 0),
+            "settings": vars(arguments),
+            "requests": dict(server.stats),
+            "entities": len(server.store.entities)}
+
+
+def make_parser():
+    """Create the parser of the command line arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8181,
+                        help="port of the stand-in; keep it the same "
+                             "between runs, pywikibot caches site info")
+    parser.add_argument("--items", type=int, default=100,
+                        help="number of reserves to upload")
+    parser.add_argument("--existing-share", type=float, default=0.5,
+                        help="share of the reserves that match an item")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--min-interval", type=float, default=0.0)
+    parser.add_argument("--start-interval", type=float, default=5.0)
+    parser.add_argument("--maxlag", type=float, default=5.0)
+    parser.add_argument("--put-throttle", type=float, default=0,
+                        help="pywikibot's own pause between edits")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="seconds the stand-in waits per request")
+    parser.add_argument("--maxlag-rate", type=float, default=0.0,
+                        help="share of requests during which it's lagged")
+    parser.add_argument("--lag", type=float, default=10.0,
+                        help="the lag when lagged, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of edits that fail")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+def main():
+    """Run a benchmark with the command line arguments."""
+    report = run_benchmark(make_parser().parse_args())
+    print("Uploaded {items} items in {seconds:.1f} s, "
+          "{items_per_minute:.1f} items per minute, "
+          "at most {peak_active} at once.".format(**report))
+    filename = "uploader_benchmark_{}.json".format(
+        time.strftime("%Y-%m-%d_%H-%M-%S"))
+    with open(filename, "w") as f_obj:
+        json.dump(report, f_obj, sort_keys=True, indent=4)
+
+
+if __name__ == "__main__":
+    main()
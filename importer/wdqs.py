@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Paginated, streaming queries to the Wikidata Query Service.
+
+A query is split into pages with ORDER BY / LIMIT / OFFSET,
+so that no single request has to return the whole result.
+Every page is fetched as tab-separated values and parsed
+line by line as it arrives, so memory use depends on
+what the caller keeps, not on the size of the result.
+
+Timeouts, dropped connections and overload responses
+are retried with exponential backoff. If a page fails
+halfway through, it is fetched again and the rows
+that were already returned are skipped.
+"""
+import itertools
+import time
+
+import requests
+
+WDQS_ENDPOINT = "https://query.wikidata.org/sparql"
+USER_AGENT = "WLE_import (https://github.com/Vesihiisi/WLE_import)"
+RETRY_STATUS = (429, 500, 502, 503, 504)
+ENTITY_PREFIX = "http://www.wikidata.org/entity/"
+TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\"": "\"", "\\": "\\"}
+
+
+class QueryError(Exception):
+    """A query that failed even after retrying."""
+
+
+def parse_tsv_value(text):
+    """
+    Parse a single value of a SPARQL TSV result.
+
+    IRIs of Wikidata entities are reduced to the entity ID,
+    literals lose their quotes, language tag and datatype.
+
+    :param text: e.g. '<http://www.wikidata.org/entity/Q42>'
+                 or '"2000283"'
+    :return: e.g. 'Q42' or '2000283', or None if unbound
+    """
+    if not text:
+        return None
+    if text.startswith("<") and text.endswith(">"):
+        iri = text[1:-1]
+        if iri.startswith(ENTITY_PREFIX):
+            return iri[len(ENTITY_PREFIX):]
+        return iri
+    if text.startswith("\""):
+        end = text.rindex("\"")
+        literal = text[1:end]
+        if "\\" not in literal:
+            return literal
+        chars = []
+        escaped = False
+        for char in literal:
+            if escaped:
+                chars.append(TSV_ESCAPES.get(char, char))
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            else:
+                chars.append(char)
+        return "".join(chars)
+    return text
+
+
+def iter_tsv_lines(query, endpoint, timeout):
+    """
+    Send a query and stream the lines of the TSV response.
+
+    :raise: requests.RequestException on failure
+    """
+    response = requests.post(
+        endpoint,
+        data={"query": query},
+        headers={"Accept": "text/tab-separated-values",
+                 "User-Agent": USER_AGENT},
+        stream=True,
+        timeout=timeout)
+    with response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            yield line
+
+
+def get_retry_delay(error, attempt):
+    """
+    Get the number of seconds to wait before retrying a failed request.
+
+    Uses the Retry-After header if the server sent one,
+    otherwise backs off exponentially.
+
+    :return: seconds, or None if the error should not be retried
+    """
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        if response is None or response.status_code not in RETRY_STATUS:
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+    elif not isinstance(error, (requests.Timeout, requests.ConnectionError,
+                                requests.exceptions.ChunkedEncodingError)):
+        return None
+    return 2 ** attempt
+
+
+def iter_query(query, endpoint=WDQS_ENDPOINT, retries=5, timeout=120):
+    """
+    Run a query and yield the rows of the result one by one.
+
+    :param query: SPARQL query
+    :param endpoint: url of the SPARQL endpoint
+    :param retries: how many times to retry a failed request
+    :param timeout: seconds to wait for the server, per request
+    :return: generator of dictionaries, variable name -> value
+    """
+    done = 0
+    for attempt in itertools.count():
+        try:
+            lines = iter_tsv_lines(query, endpoint, timeout)
+            header = [x.lstrip("?") for x in next(lines).split("\t")]
+            seen = 0
+            for line in lines:
+                if not line:
+                    continue
+                seen += 1
+                if seen <= done:
+                    continue
+                values = [parse_tsv_value(x) for x in line.split("\t")]
+                done += 1
+                yield dict(zip(header, values))
+            return
+        except StopIteration:
+            return
+        except requests.RequestException as error:
+            delay = get_retry_delay(error, attempt)
+            if delay is None or attempt >= retries:
+                raise QueryError("Query failed: {}".format(error))
+            print("Query failed ({}), retrying in {} s.".format(
+                error, delay))
+            time.sleep(delay)
+
+
+def iter_paged_query(query, order_by, page_size, **kwargs):
+    """
+    Run a query in pages and yield the rows of the result one by one.
+
+    :param query: SPARQL query without ORDER BY, LIMIT and OFFSET
+    :param order_by: variables giving a stable order, e.g. "?item ?value"
+    :param page_size: number of rows per request
+    :param kwargs: passed on to iter_query
+    """
+    for offset in itertools.count(0, page_size):
+        paged_query = "{} ORDER BY {} LIMIT {} OFFSET {}".format(
+            query, order_by, page_size, offset)
+        rows = 0
+        for row in iter_query(paged_query, **kwargs):
+            rows += 1
+            yield row
+        if rows < page_size:
+            return
+
+
+def group_values(pairs):
+    """
+    Group (value, item) pairs by value.
+
+    :return: dictionary of value -> sorted list of items
+    """
+    grouped = {}
+    for value, item in pairs:
+        items = grouped.setdefault(value, [])
+        if item not in items:
+            items.append(item)
+    for items in grouped.values():
+        items.sort(key=q_number)
+    return grouped
+
+
+def q_number(item):
+    """Get the numeric part of a Q-id, for sorting."""
+    try:
+        return int(item[1:])
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,851 @@
+# -*- coding: utf-8 -*-
+"""
+A local stand-in for the Wikibase API, for load-testing the uploader.
+
+It implements the parts of the MediaWiki/Wikibase API that
+pywikibot and the uploader use: site info, login, tokens,
+reading entities and the editing actions used for labels,
+descriptions, aliases, claims, qualifiers and references,
+as well as creating items. Entities are kept in memory.
+A /sparql endpoint answers the query for items with a
+certain property that nature_importer sends to WDQS.
+
+To simulate a loaded server, it can:
+* wait before every response (latency),
+* be lagged during some of the requests (maxlag_rate),
+  which makes requests with a lower maxlag parameter fail
+  with a maxlag error and a Retry-After header,
+* fail edits with an internal error (error_rate).
+
+It's not a complete Wikibase. There is no validation
+beyond what's needed to keep the store consistent,
+no history and no permissions.
+
+Usage: python3 wikibase_standin.py --port 8181 --latency 0.05
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+SCRIPT_PATH = "/w"
+API_PATH = SCRIPT_PATH + "/api.php"
+SPARQL_PATH = "/sparql"
+CONCEPT_BASE = "http://www.wikidata.org/entity/"
+BOT_RIGHTS = ["read", "edit", "createpage", "writeapi", "bot",
+              "apihighlimits", "noratelimit", "item-merge"]
+DATATYPES = {"P17": "wikibase-item", "P18": "commonsMedia",
+             "P31": "wikibase-item", "P131": "wikibase-item",
+             "P137": "wikibase-item", "P248": "wikibase-item",
+             "P276": "wikibase-item", "P373": "string",
+             "P518": "wikibase-item", "P571": "time",
+             "P577": "time", "P580": "time", "P625": "globe-coordinate",
+             "P813": "time", "P814": "wikibase-item",
+             "P854": "url", "P2046": "quantity",
+             "P3613": "external-id"}
+WRITE_ACTIONS = ["wbeditentity", "wbcreateclaim", "wbsetclaim",
+                 "wbsetclaimvalue", "wbremoveclaims", "wbsetlabel",
+                 "wbsetdescription", "wbsetaliases", "wbsetreference",
+                 "wbsetqualifier"]
+
+ACTIONS = ["query", "login", "clientlogin", "logout", "paraminfo",
+           "wbgetentities"] + WRITE_ACTIONS
+QUERY_MODULES = {"prop": ["info"],
+                 "list": ["allpages"],
+                 "meta": ["siteinfo", "userinfo", "tokens", "wikibase"]}
+TOKEN_TYPES = ["csrf", "login", "watch", "patrol", "rollback",
+               "userrights", "createaccount"]
+MODULES = dict([("main", ""), ("query+info", "in"),
+                ("query+allpages", "ap"), ("query+siteinfo", "si"),
+                ("query+userinfo", "ui"), ("query+tokens", ""),
+                ("query+wikibase", "wb")] +
+               [(x, "") for x in ACTIONS])
+
+
+class ApiError(Exception):
+    """An error to be returned in the API response."""
+
+    def __init__(self, code, info):
+        """Initialize the error with an API error code and message."""
+        Exception.__init__(self, info)
+        self.code = code
+        self.info = info
+
+
+def snak_hash(snak):
+    """Get a stable hash of a snak or a group of snaks."""
+    content = json.dumps(snak, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(content).hexdigest()
+
+
+class EntityStore(object):
+    """Items and properties kept in memory."""
+
+    def __init__(self, first_id=1000000):
+        """Initialize the store with the properties the importer uses."""
+        self.lock = threading.RLock()
+        self.entities = {}
+        self.next_id = first_id
+        self.revision = 1
+        for prop, datatype in DATATYPES.items():
+            self.entities[prop] = self.make_entity(prop, "property")
+            self.entities[prop]["datatype"] = datatype
+
+    def make_entity(self, entity_id, entity_type="item"):
+        """Create an empty entity."""
+        return {"id": entity_id, "type": entity_type,
+                "labels": {}, "descriptions": {}, "aliases": {},
+                "claims": {}, "sitelinks": {},
+                "lastrevid": self.revision,
+                "modified": "2017-01-01T00:00:00Z",
+                "pageid": 0, "ns": 0, "title": entity_id}
+
+    def touch(self, entity):
+        """Register a new revision of an entity."""
+        self.revision += 1
+        entity["lastrevid"] = self.revision
+        entity["modified"] = time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                                           time.gmtime())
+
+    def get(self, entity_id):
+        """Get an entity, or raise an API error if it doesn't exist."""
+        entity = self.entities.get(entity_id.upper())
+        if entity is None:
+            raise ApiError("no-such-entity",
+                           "Could not find an entity with the ID "
+                           "\"{}\".".format(entity_id))
+        return entity
+
+    def create_item(self):
+        """Create a new, empty item."""
+        entity_id = "Q{}".format(self.next_id)
+        self.next_id += 1
+        entity = self.make_entity(entity_id)
+        self.entities[entity_id] = entity
+        return entity
+
+    def add_item(self, entity_id):
+        """Add an empty item with a given ID, unless it exists."""
+        with self.lock:
+            if entity_id not in self.entities:
+                self.entities[entity_id] = self.make_entity(entity_id)
+            return self.entities[entity_id]
+
+    def find_claim(self, guid):
+        """Find a claim by its GUID."""
+        entity = self.get(guid.split("$")[0])
+        for claims in entity["claims"].values():
+            for claim in claims:
+                if claim["id"].lower() == guid.lower():
+                    return (entity, claim)
+        raise ApiError("no-such-claim",
+                       "Could not find the claim {}.".format(guid))
+
+    def normalize_snak(self, snak):
+        """Fill in the datatype and hash of a snak."""
+        snak = dict(snak)
+        snak["datatype"] = DATATYPES.get(snak["property"], "string")
+        snak.pop("hash", None)
+        snak["hash"] = snak_hash(snak)
+        return snak
+
+    def normalize_reference(self, reference):
+        """Fill in the hashes of a reference."""
+        snaks = {}
+        for prop, prop_snaks in reference.get("snaks", {}).items():
+            snaks[prop] = [self.normalize_snak(x) for x in prop_snaks]
+        normalized = {"snaks": snaks,
+                      "snaks-order": reference.get("snaks-order",
+                                                   list(snaks))}
+        normalized["hash"] = snak_hash(snaks)
+        return normalized
+
+    def normalize_claim(self, entity, claim):
+        """Fill in the ID, hashes and defaults of a claim."""
+        claim = dict(claim)
+        if not claim.get("id"):
+            claim["id"] = "{}${}".format(entity["id"], uuid.uuid4())
+        claim["type"] = "statement"
+        claim.setdefault("rank", "normal")
+        claim["mainsnak"] = self.normalize_snak(claim["mainsnak"])
+        qualifiers = {}
+        for prop, prop_snaks in claim.get("qualifiers", {}).items():
+            qualifiers[prop] = [self.normalize_snak(x) for x in prop_snaks]
+        claim["qualifiers"] = qualifiers
+        claim["qualifiers-order"] = list(qualifiers)
+        claim["references"] = [self.normalize_reference(x)
+                               for x in claim.get("references", [])]
+        return claim
+
+    def set_claim(self, entity, claim):
+        """Add a claim to an entity, replacing one with the same ID."""
+        claim = self.normalize_claim(entity, claim)
+        prop = claim["mainsnak"]["property"]
+        for claims in entity["claims"].values():
+            for index, existing in enumerate(claims):
+                if existing["id"] == claim["id"]:
+                    del claims[index]
+                    break
+        entity["claims"].setdefault(prop, []).append(claim)
+        entity["claims"] = {k: v for k, v in entity["claims"].items() if v}
+        return claim
+
+    def remove_claim(self, entity, guid):
+        """Remove a claim from an entity."""
+        for prop in list(entity["claims"]):
+            entity["claims"][prop] = [x for x in entity["claims"][prop]
+                                      if x["id"] != guid]
+            if not entity["claims"][prop]:
+                del entity["claims"][prop]
+
+    def edit_terms(self, entity, data):
+        """Apply labels, descriptions and aliases of wbeditentity data."""
+        for key in ["labels", "descriptions"]:
+            terms = data.get(key, {})
+            if isinstance(terms, list):
+                terms = {x["language"]: x for x in terms}
+            for language, term in terms.items():
+                if "remove" in term or not term.get("value"):
+                    entity[key].pop(language, None)
+                else:
+                    entity[key][language] = {"language": language,
+                                             "value": term["value"]}
+        aliases = data.get("aliases", {})
+        if isinstance(aliases, dict):
+            aliases = [x for values in aliases.values()
+                       for x in (values if isinstance(values, list)
+                                 else [values])]
+        for alias in aliases:
+            language = alias["language"]
+            current = entity["aliases"].setdefault(language, [])
+            if "remove" in alias:
+                current[:] = [x for x in current
+                              if x["value"] != alias["value"]]
+            elif alias["value"] not in [x["value"] for x in current]:
+                current.append({"language": language,
+                                "value": alias["value"]})
+            if not current:
+                del entity["aliases"][language]
+
+    def edit_entity(self, entity, data, clear=False):
+        """Apply the data of a wbeditentity request to an entity."""
+        if clear:
+            for key in ["labels", "descriptions", "aliases", "claims"]:
+                entity[key] = {}
+        self.edit_terms(entity, data)
+        claims = data.get("claims", [])
+        if isinstance(claims, dict):
+            claims = [x for values in claims.values() for x in values]
+        for claim in claims:
+            if "remove" in claim:
+                self.remove_claim(entity, claim["id"])
+            else:
+                self.set_claim(entity, claim)
+        self.touch(entity)
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    """HTTP server holding the store and the simulated server load."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, maxlag_rate=0.0, lag=10.0,
+                 retry_after=1, error_rate=0.0, seed=None):
+        """
+        Initialize the server.
+
+        :param address: tuple (host, port)
+        :param latency: seconds to wait before every response
+        :param maxlag_rate: fraction of requests during which
+                            the servers are lagged
+        :param lag: the lag when lagged, in seconds; requests
+                    with a lower maxlag fail with a maxlag error
+        :param retry_after: the Retry-After of maxlag errors, seconds
+        :param error_rate: fraction of edits that fail
+        :param seed: seed of the random choice of failing requests
+        """
+        HTTPServer.__init__(self, address, StandinHandler)
+        self.store = EntityStore()
+        self.latency = latency
+        self.maxlag_rate = maxlag_rate
+        self.lag = lag
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+
+    def get_lag(self):
+        """Get the simulated replication lag of this request."""
+        if self.random.random() < self.maxlag_rate:
+            return self.lag
+        return 0.0
+
+    def count(self, action):
+        """Count a request to an action."""
+        with self.stats_lock:
+            self.stats[action] = self.stats.get(action, 0) + 1
+
+    def get_url(self):
+        """Get the base url of the server."""
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Handle requests to the API and the SPARQL endpoint."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Don't log every request."""
+
+    def read_params(self):
+        """Read the parameters from the query string and the body."""
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query, keep_blank_values=True)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            content_type = self.headers.get("Content-Type", "")
+            if content_type.startswith("multipart/form-data"):
+                params.update(self.parse_multipart(body, content_type))
+            else:
+                params.update(parse_qs(body, keep_blank_values=True))
+        return (parsed.path, {k: v[-1] for k, v in params.items()})
+
+    def parse_multipart(self, body, content_type):
+        """Parse a multipart/form-data body without file fields."""
+        boundary = content_type.split("boundary=")[-1].strip("\"")
+        params = {}
+        for part in body.split("--" + boundary):
+            if "name=\"" not in part:
+                continue
+            headers, _, value = part.partition("\r\n\r\n")
+            name = re.search("name=\"([^\"]+)\"", headers).group(1)
+            params[name] = [value.rstrip("\r\n")]
+        return params
+
+    def send_json(self, content, status=200, headers=None):
+        """Send a JSON response."""
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, text, content_type):
+        """Send a plain text response."""
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Handle a GET request."""
+        self.handle_request()
+
+    def do_POST(self):
+        """Handle a POST request."""
+        self.handle_request()
+
+    def handle_request(self):
+        """Dispatch a request to the API or the SPARQL endpoint."""
+        path, params = self.read_params()
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if path == SPARQL_PATH:
+            server.count("sparql")
+            self.send_text(self.answer_sparql(params.get("query", "")),
+                           "text/tab-separated-values; charset=utf-8")
+            return
+        if path != API_PATH:
+            self.send_error(404)
+            return
+        action = params.get("action", "")
+        server.count(action)
+        if "maxlag" in params:
+            lag = server.get_lag()
+            if lag > float(params["maxlag"]):
+                self.send_json(
+                    {"error": {"code": "maxlag",
+                               "info": "Waiting for a database server: "
+                                       "{} seconds lagged.".format(lag),
+                               "host": "standin", "lag": lag,
+                               "type": "db"}},
+                    headers={"Retry-After": str(server.retry_after),
+                             "X-Database-Lag": str(lag)})
+                return
+        if (action in WRITE_ACTIONS and
+                server.random.random() < server.error_rate):
+            self.send_json({"error": {
+                "code": "internal_api_error_DBQueryError",
+                "info": "Simulated failure of the stand-in."}})
+            return
+        handler = getattr(self, "action_" + action, None)
+        if handler is None:
+            self.send_json({"error": {
+                "code": "badvalue",
+                "info": "Unrecognized value for parameter \"action\": "
+                        "{}.".format(action)}})
+            return
+        try:
+            with server.store.lock:
+                result = handler(params)
+        except ApiError as error:
+            result = {"error": {"code": error.code, "info": error.info}}
+        except (KeyError, ValueError) as error:
+            result = {"error": {"code": "invalid-params",
+                                "info": "Invalid request: {}".format(error)}}
+        self.send_json(result)
+
+    def answer_sparql(self, query):
+        """
+        Answer a query for items using a property, as TSV.
+
+        Only the shape of query sent by get_wd_items_using_prop
+        is understood: items with some value of a property,
+        with LIMIT and OFFSET.
+        """
+        prop = re.search("p:(P[0-9]+)", query)
+        limit = re.search("LIMIT ([0-9]+)", query)
+        offset = re.search("OFFSET ([0-9]+)", query)
+        rows = []
+        if prop:
+            for entity in self.server.store.entities.values():
+                for claim in entity["claims"].get(prop.group(1), []):
+                    datavalue = claim["mainsnak"].get("datavalue")
+                    value = datavalue["value"] if datavalue else ""
+                    rows.append((entity["id"], value))
+        rows = sorted(set(rows), key=lambda x: (int(x[0][1:]), x[1]))
+        start = int(offset.group(1)) if offset else 0
+        end = start + int(limit.group(1)) if limit else None
+        lines = ["?item\t?value"]
+        for item, value in rows[start:end]:
+            lines.append("<{}{}>\t{}".format(
+                CONCEPT_BASE, item, json.dumps(value) if value else ""))
+        return "\n".join(lines) + "\n"
+
+    def action_query(self, params):
+        """Answer site info, user info and token queries."""
+        result = {"batchcomplete": ""}
+        meta = params.get("meta", "").split("|")
+        query = {}
+        if "siteinfo" in meta:
+            query.update(self.get_siteinfo())
+        if "userinfo" in meta:
+            query["userinfo"] = {"id": 1, "name": self.get_username(),
+                                 "groups": ["*", "user", "bot"],
+                                 "rights": BOT_RIGHTS,
+                                 "editcount": 0, "messages": False}
+        if "tokens" in meta:
+            token_types = params.get("type", "csrf").split("|")
+            query["tokens"] = {"{}token".format(x): "standin+\\"
+                               for x in token_types}
+        if "wikibase" in meta:
+            url = self.server.get_url()
+            query["wikibase"] = {
+                "repo": {"url": {"base": url, "scriptpath": SCRIPT_PATH,
+                                 "articlepath": "/wiki/$1"}},
+                "siteid": "standin"}
+        if query:
+            result["query"] = query
+        return result
+
+    def get_username(self):
+        """Get the name of the user every request is made as."""
+        return "Standin bot"
+
+    def get_siteinfo(self):
+        """Get a minimal site info."""
+        url = self.server.get_url()
+        general = {
+            "mainpage": "Main Page", "base": url + "/wiki/Main_Page",
+            "sitename": "Wikibase stand-in", "generator": "MediaWiki 1.39.0",
+            "phpversion": "8.1", "dbtype": "sqlite", "case": "first-letter",
+            "lang": "en", "fallback": [], "rtl": False,
+            "fallback8bitEncoding": "windows-1252", "writeapi": "",
+            "timezone": "UTC", "timeoffset": 0,
+            "articlepath": "/wiki/$1", "scriptpath": SCRIPT_PATH,
+            "script": SCRIPT_PATH + "/index.php", "server": url,
+            "servername": "localhost", "wikiid": "standin",
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "maxarticlesize": 2097152, "legaltitlechars":
+            " %!\"$&'()*,\\-.\\/0-9:;=?@A-Z\\\\^_`a-z~\\x80-\\xFF+",
+            "max-page-id": 0, "linktrail": "/^([a-z]+)(.*)$/sD",
+            "thumblimits": {"0": 120}, "imagelimits": {"0": {
+                "width": 320, "height": 240}}, "magiclinks": {},
+            "wikibase-conceptbaseuri": CONCEPT_BASE}
+        namespaces = {
+            "-2": {"id": -2, "case": "first-letter", "name": "Media",
+                   "canonical": "Media", "content": False},
+            "-1": {"id": -1, "case": "first-letter", "name": "Special",
+                   "canonical": "Special", "content": False},
+            "0": {"id": 0, "case": "first-letter", "name": "",
+                  "content": True, "subpages": False,
+                  "defaultcontentmodel": "wikibase-item"},
+            "2": {"id": 2, "case": "first-letter", "name": "User",
+                  "canonical": "User", "content": False},
+            "4": {"id": 4, "case": "first-letter", "name": "Project",
+                  "canonical": "Project", "content": False},
+            "6": {"id": 6, "case": "first-letter", "name": "File",
+                  "canonical": "File", "content": False},
+            "10": {"id": 10, "case": "first-letter", "name": "Template",
+                   "canonical": "Template", "content": False},
+            "14": {"id": 14, "case": "first-letter", "name": "Category",
+                   "canonical": "Category", "content": False},
+            "120": {"id": 120, "case": "first-letter", "name": "Property",
+                    "canonical": "Property", "content": True,
+                    "defaultcontentmodel": "wikibase-property"}}
+        return {"general": general, "namespaces": namespaces,
+                "namespacealiases": [], "extensions": [
+                    {"name": "WikibaseRepository"},
+                    {"name": "WikibaseClient"}],
+                "restrictions": {"types": ["edit"], "levels": [""],
+                                 "cascadinglevels": [],
+                                 "semiprotectedlevels": []},
+                "magicwords": [], "specialpagealiases": [],
+                "interwikimap": [], "languages": [],
+                "namespaceprotection": [], "skins": [],
+                "extensiontags": [], "functionhooks": [],
+                "fileextensions": [], "usergroups": []}
+
+    def action_login(self, params):
+        """Accept any login."""
+        if not params.get("lgtoken"):
+            return {"login": {"result": "NeedToken", "token": "standin+\\"}}
+        return {"login": {"result": "Success", "lguserid": 1,
+                          "lgusername": self.get_username()}}
+
+    def action_clientlogin(self, params):
+        """Accept any login."""
+        return {"clientlogin": {"status": "PASS",
+                                "username": self.get_username()}}
+
+    def action_logout(self, params):
+        """Accept any logout."""
+        return {}
+
+    def action_paraminfo(self, params):
+        """Describe the requested modules, see describe_module."""
+        modules = []
+        for path in params.get("modules", "").split("|"):
+            if path:
+                modules.append(describe_module(path))
+        return {"paraminfo": {"modules": modules}}
+
+    def entity_json(self, entity, props):
+        """Get the parts of an entity that were asked for."""
+        result = {"id": entity["id"], "type": entity["type"]}
+        parts = props.split("|")
+        if "info" in parts:
+            for key in ["lastrevid", "modified", "pageid", "ns", "title"]:
+                result[key] = entity[key]
+        for key in ["labels", "descriptions", "aliases",
+                    "claims", "sitelinks", "datatype"]:
+            if key in entity and (key in parts or key == "datatype"):
+                result[key] = entity[key]
+        return result
+
+    def action_wbgetentities(self, params):
+        """Get entities by ID."""
+        props = params.get("props",
+                           "info|sitelinks|aliases|labels|descriptions|"
+                           "claims|datatype")
+        entities = {}
+        for entity_id in params.get("ids", "").split("|"):
+            entity = self.server.store.entities.get(entity_id.upper())
+            if entity is None:
+                entities[entity_id] = {"id": entity_id, "missing": ""}
+            else:
+                entities[entity["id"]] = self.entity_json(entity, props)
+        return {"entities": entities, "success": 1}
+
+    def edit_result(self, entity, extra=None):
+        """Create the response of a successful edit."""
+        result = {"success": 1,
+                  "entity": {"id": entity["id"], "type": entity["type"],
+                             "lastrevid": entity["lastrevid"]},
+                  "pageinfo": {"lastrevid": entity["lastrevid"]}}
+        result.update(extra or {})
+        return result
+
+    def action_wbeditentity(self, params):
+        """Create or edit an entity."""
+        store = self.server.store
+        data = json.loads(params.get("data", "{}"))
+        if params.get("new"):
+            entity = store.create_item()
+        else:
+            entity = store.get(params["id"])
+        store.edit_entity(entity, data, clear=bool(params.get("clear")))
+        result = self.edit_result(entity)
+        result["entity"] = dict(entity)
+        return result
+
+    def action_wbsetlabel(self, params):
+        """Set the label of an entity in a language."""
+        return self.set_term(params, "labels")
+
+    def action_wbsetdescription(self, params):
+        """Set the description of an entity in a language."""
+        return self.set_term(params, "descriptions")
+
+    def set_term(self, params, key):
+        """Set a label or description."""
+        store = self.server.store
+        entity = store.get(params["id"])
+        store.edit_terms(entity, {key: {params["language"]: {
+            "language": params["language"],
+            "value": params.get("value", "")}}})
+        store.touch(entity)
+        return self.edit_result(entity)
+
+    def action_wbsetaliases(self, params):
+        """Add, remove or set aliases of an entity in a language."""
+        store = self.server.store
+        entity = store.get(params["id"])
+        language = params["language"]
+        if "set" in params:
+            entity["aliases"].pop(language, None)
+        aliases = []
+        for key in ["set", "add"]:
+            for value in params.get(key, "").split("|"):
+                if value:
+                    aliases.append({"language": language, "value": value})
+        for value in params.get("remove", "").split("|"):
+            if value:
+                aliases.append({"language": language, "value": value,
+                                "remove": ""})
+        store.edit_terms(entity, {"aliases": aliases})
+        store.touch(entity)
+        return self.edit_result(entity)
+
+    def action_wbcreateclaim(self, params):
+        """Add a claim to an entity."""
+        store = self.server.store
+        entity = store.get(params["entity"])
+        snak = {"snaktype": params.get("snaktype", "value"),
+                "property": params["property"]}
+        if snak["snaktype"] == "value":
+            snak["datavalue"] = self.make_datavalue(
+                params["property"], json.loads(params["value"]))
+        claim = store.set_claim(entity, {"mainsnak": snak})
+        store.touch(entity)
+        return self.edit_result(entity, {"claim": claim})
+
+    def make_datavalue(self, prop, value):
+        """Wrap a raw value of a claim or qualifier in a datavalue."""
+        datatype = DATATYPES.get(prop, "string")
+        value_types = {"wikibase-item": "wikibase-entityid",
+                       "time": "time", "quantity": "quantity",
+                       "globe-coordinate": "globecoordinate"}
+        return {"value": value,
+                "type": value_types.get(datatype, "string")}
+
+    def action_wbsetclaim(self, params):
+        """Add or replace a whole claim."""
+        store = self.server.store
+        claim = json.loads(params["claim"])
+        entity = store.get(claim["id"].split("$")[0])
+        claim = store.set_claim(entity, claim)
+        store.touch(entity)
+        return self.edit_result(entity, {"claim": claim})
+
+    def action_wbremoveclaims(self, params):
+        """Remove claims."""
+        store = self.server.store
+        guids = params["claim"].split("|")
+        entity = store.get(guids[0].split("$")[0])
+        for guid in guids:
+            store.remove_claim(entity, guid)
+        store.touch(entity)
+        return self.edit_result(entity, {"claims": guids})
+
+    def action_wbsetqualifier(self, params):
+        """Add a qualifier to a claim."""
+        store = self.server.store
+        entity, claim = store.find_claim(params["claim"])
+        snak = {"snaktype": params.get("snaktype", "value"),
+                "property": params["property"]}
+        if snak["snaktype"] == "value":
+            snak["datavalue"] = self.make_datavalue(
+                params["property"], json.loads(params["value"]))
+        claim.setdefault("qualifiers", {}).setdefault(
+            params["property"], []).append(snak)
+        claim = store.set_claim(entity, claim)
+        store.touch(entity)
+        return self.edit_result(entity, {"claim": claim})
+
+    def action_wbsetreference(self, params):
+        """Add or replace a reference of a claim."""
+        store = self.server.store
+        entity, claim = store.find_claim(params["statement"])
+        reference = {"snaks": json.loads(params["snaks"])}
+        if "snaks-order" in params:
+            reference["snaks-order"] = params["snaks-order"].split("|")
+        references = claim.setdefault("references", [])
+        old_hash = params.get("reference")
+        references[:] = [x for x in references if x.get("hash") != old_hash]
+        references.append(reference)
+        claim = store.set_claim(entity, claim)
+        store.touch(entity)
+        return self.edit_result(
+            entity, {"reference": claim["references"][-1]})
+
+
+def describe_parameter(name, values=None, group=None):
+    """
+    Describe a parameter of an API module, for paraminfo.
+
+    :param name: name of the parameter
+    :param values: the allowed values, if restricted
+    :param group: if the values are submodules, the path
+                  of the module they belong to
+    """
+    parameter = {"name": name, "type": "string", "multi": True,
+                 "limit": 50, "lowlimit": 50, "highlimit": 500}
+    if values is not None:
+        parameter["type"] = list(values)
+    if group is not None:
+        parameter["submodules"] = {
+            x: x if group == "main" else "{}+{}".format(group, x)
+            for x in values}
+    return parameter
+
+
+def describe_module(path):
+    """
+    Describe an API module, for paraminfo.
+
+    Only the modules the stand-in implements are described,
+    with just enough detail for pywikibot to build requests.
+    """
+    name = path.split("+")[-1]
+    if path not in MODULES:
+        return {"name": name, "path": path, "missing": ""}
+    parameters = []
+    if path == "main":
+        parameters = [describe_parameter("action", ACTIONS, "main"),
+                      describe_parameter("format", ["json"])]
+    elif path == "query":
+        for group in ["prop", "list", "meta"]:
+            parameters.append(describe_parameter(
+                group, QUERY_MODULES[group], "query"))
+        parameters.append(describe_parameter("generator",
+                                             QUERY_MODULES["list"]))
+    elif path == "query+tokens":
+        parameters = [describe_parameter("type", TOKEN_TYPES)]
+    return {"name": name, "path": path, "classname": name,
+            "group": "action", "prefix": MODULES[path],
+            "source": "MediaWiki", "parameters": parameters,
+            "mustbeposted": name in WRITE_ACTIONS, "helpurls": []}
+
+
+def start_server(host="127.0.0.1", port=0, **kwargs):
+    """
+    Start a stand-in server in a background thread.
+
+    :param port: port to listen on, 0 for any free port
+    :param kwargs: passed on to StandinServer
+    :return: the running StandinServer
+    """
+    server = StandinServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def write_family_file(directory, server, name="standin"):
+    """
+    Write a pywikibot family file for a stand-in server.
+
+    :param directory: the pywikibot user directory
+    :param server: the running StandinServer
+    :param name: name of the family, which is also its only code
+    :return: path of the family file
+    """
+    host, port = server.server_address[:2]
+    content = FAMILY_TEMPLATE.format(name=name,
+                                     domain="{}:{}".format(host, port),
+                                     scriptpath=SCRIPT_PATH)
+    families_dir = os.path.join(directory, "families")
+    os.makedirs(families_dir, exist_ok=True)
+    filepath = os.path.join(families_dir, "{}_family.py".format(name))
+    with open(filepath, "w") as f_obj:
+        f_obj.write(content)
+    return filepath
+
+
+FAMILY_TEMPLATE = '''# -*- coding: utf-8 -*-
+"""Family of a local Wikibase stand-in, see wikibase_standin.py."""
+from pywikibot import family
+
+
+class Family(family.SingleSiteFamily):
+    """Family class of the stand-in."""
+
+    name = "{name}"
+    code = "{name}"
+    domain = "{domain}"
+
+    def protocol(self, code):
+        """Use plain http."""
+        return "http"
+
+    def scriptpath(self, code):
+        """Get the path of the API."""
+        return "{scriptpath}"
+
+    def interface(self, code):
+        """Treat the site as a Wikibase repository."""
+        return "DataSite"
+
+    def calendarmodel(self, code):
+        """Use the Gregorian calendar."""
+        return "http://www.wikidata.org/entity/Q1985727"
+
+    def default_globe(self, code):
+        """Use the earth as globe."""
+        return "earth"
+
+    def globes(self, code):
+        """Support the earth as globe."""
+        return {{"earth": "http://www.wikidata.org/entity/Q2"}}
+
+    def entity_sources(self, code):
+        """Keep all entity types on this site."""
+        return {{}}
+'''
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8181)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--maxlag-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    standin = StandinServer((args.host, args.port),
+                            latency=args.latency,
+                            maxlag_rate=args.maxlag_rate,
+                            error_rate=args.error_rate)
+    print("Serving the stand-in API at {}{}".format(
+        standin.get_url(), API_PATH))
+    standin.serve_forever()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8  -*-
+"""
+Make the scripts of the importer importable, as they import each other.
+
+The scripts in importer/ are run from that directory and import
+their siblings by name (e.g. "import importer_utils"), so a test
+of one of them imports this first.
+"""
+import os
+import sys
+
+IMPORTER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "importer")
+
+if IMPORTER_DIR not in sys.path:
+    sys.path.insert(0, IMPORTER_DIR)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8  -*-
+"""
+Give the tests a pywikibot site, backed by a local Wikibase stand-in.
+
+pywikibot keeps its sites and families for the whole process,
+so a single stand-in is started, the first time it's needed,
+and shared by all the tests. See importer/wikibase_standin.py.
+pywikibot gets a directory of its own, with an empty
+user-config.py, so its cache and throttle files are not
+written to the working directory.
+"""
+import os
+import tempfile
+
+import importer_path  # noqa: F401
+import wikibase_standin
+
+FAMILY = "teststandin"
+
+server = None
+site = None
+
+
+def make_pywikibot_dir():
+    """Give pywikibot a temporary directory, unless it has one."""
+    if "PYWIKIBOT_DIR" in os.environ:
+        return
+    directory = tempfile.mkdtemp(prefix="pywikibot_")
+    with open(os.path.join(directory, "user-config.py"), "w") as f_obj:
+        f_obj.write("# Written by tests/standin_site.py.\n")
+    os.environ["PYWIKIBOT_DIR"] = directory
+
+
+make_pywikibot_dir()
+
+
+def get_site():
+    """
+    Get the site of the stand-in, starting it if needed.
+
+    :return: tuple (StandinServer, pywikibot DataSite)
+    """
+    global server, site
+    if site is None:
+        import pywikibot
+        server = wikibase_standin.start_server()
+        directory = tempfile.mkdtemp(prefix="standin_")
+        pywikibot.config.family_files[FAMILY] = (
+            wikibase_standin.write_family_file(directory, server, FAMILY))
+        pywikibot.config.usernames[FAMILY][FAMILY] = "Standin bot"
+        site = pywikibot.Site(FAMILY, FAMILY)
+    return (server, site)
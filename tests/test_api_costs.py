@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+import importer.api_costs as api_costs
+
+
+class TestPercentile(unittest.TestCase):
+    """Tests for percentiles of the cost report."""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(api_costs.percentile(values, 50), 50)
+        self.assertEqual(api_costs.percentile(values, 99), 99)
+        self.assertEqual(api_costs.percentile([3], 90), 3)
+
+    def test_percentile_empty(self):
+        self.assertIsNone(api_costs.percentile([], 50))
+
+
+class TestGetAction(unittest.TestCase):
+    """Tests for recognizing API actions of requests."""
+
+    def test_get_action_dict(self):
+        kwargs = {"data": {"action": "wbeditentity", "new": "item"}}
+        self.assertEqual(api_costs.get_action(kwargs), "wbeditentity")
+
+    def test_get_action_urlencoded(self):
+        kwargs = {"data": "action=wbsetlabel&language=sv&value=Foo"}
+        self.assertEqual(api_costs.get_action(kwargs), "wbsetlabel")
+
+    def test_get_action_none(self):
+        self.assertIsNone(api_costs.get_action({"params": {"q": "x"}}))
+
+
+class TestCostLedger(unittest.TestCase):
+    """Tests for attributing requests to items and phases."""
+
+    def setUp(self):
+        self.ledger = api_costs.CostLedger()
+        api_costs.ledger = self.ledger
+
+    def tearDown(self):
+        api_costs.ledger = None
+
+    def test_make_report(self):
+        with api_costs.item("1", "nr", new=True):
+            with api_costs.phase("create"):
+                self.ledger.count(True, 100, 0.1)
+        with api_costs.item("2", "np", new=False):
+            with api_costs.phase("labels"):
+                self.ledger.count(False, 10, 0.1)
+                self.ledger.count(True, 20, 0.1)
+        self.ledger.count(False, 5, 0.1)
+        report = self.ledger.make_report()
+        self.assertEqual(report["all"]["items"], 2)
+        self.assertEqual(report["all"]["writes"]["total"], 2)
+        self.assertEqual(report["all"]["bytes"]["total"], 130)
+        self.assertEqual(report["by_status"]["new"]["items"], 1)
+        self.assertEqual(
+            report["by_dataset"]["np"]["phases"]["labels"]["reads"]["total"],
+            1)
+        self.assertEqual(report["unattributed"]["reads"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import math
+import unittest
+import importer.area_columns as area_columns
+
+
+def make_row(nature_id, total="10.0", woods="2.0", land="8.0",
+             water="2.0", date="'2001-05-17'"):
+    return {"NVRID": nature_id, "AREA_HA": total, "SKOG_HA": woods,
+            "LAND_HA": land, "VATTEN_HA": water, "URSBESLDAT": date}
+
+
+class TestLoadAreaColumns(unittest.TestCase):
+    """Tests for parsing source rows into columns."""
+
+    def test_load_area_columns_typed(self):
+        rows = [make_row("1"), make_row("2", total="foo", date="x")]
+        columns = area_columns.load_area_columns(rows)
+        self.assertEqual(columns["NVRID"], ["1", "2"])
+        self.assertEqual(columns["AREA_HA"][0], 10.0)
+        self.assertTrue(math.isnan(columns["AREA_HA"][1]))
+        self.assertEqual(columns["URSBESLDAT"][0].year, 2001)
+        self.assertIsNone(columns["URSBESLDAT"][1])
+
+
+class TestValidateAreaColumns(unittest.TestCase):
+    """Tests for bulk validation of parsed columns."""
+
+    def validate(self, rows):
+        columns = area_columns.load_area_columns(rows)
+        return area_columns.validate_area_columns(columns)
+
+    def test_validate_area_columns_valid(self):
+        self.assertEqual(self.validate([make_row("1")]), {})
+
+    def test_validate_area_columns_no_breakdown(self):
+        row = make_row("1", woods="0", land="0", water="0")
+        self.assertEqual(self.validate([row]), {})
+
+    def test_validate_area_columns_problems(self):
+        rows = [make_row("1", total="abc"),
+                make_row("2", water="-1"),
+                make_row("3", total="50.0"),
+                make_row("4", woods="9.5"),
+                make_row("5", date="")]
+        problems = self.validate(rows)
+        self.assertEqual(problems["AREA_HA is not a number"], ["1"])
+        self.assertEqual(problems["VATTEN_HA is negative"], ["2"])
+        self.assertEqual(
+            problems["LAND_HA + VATTEN_HA differs from AREA_HA"],
+            ["2", "3"])
+        self.assertEqual(problems["SKOG_HA is larger than LAND_HA"], ["4"])
+        self.assertEqual(problems["URSBESLDAT is not a date"], ["5"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+import importer.area_geometry as geometry
+
+SQUARE = [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+HOLE = [[2, 2], [2, 8], [8, 8], [8, 2], [2, 2]]
+
+
+class TestSummarizeGeometry(unittest.TestCase):
+    """Tests for bounding box and representative point."""
+
+    def test_summarize_geometry_polygon(self):
+        summary = geometry.summarize_geometry(
+            {"type": "Polygon", "coordinates": [SQUARE]})
+        self.assertEqual(summary["bbox"], (0, 0, 10, 10))
+        self.assertEqual(summary["point"], (5.0, 5.0))
+
+    def test_summarize_geometry_hole(self):
+        polygon = [SQUARE, HOLE]
+        summary = geometry.summarize_geometry(
+            {"type": "Polygon", "coordinates": polygon})
+        point = summary["point"]
+        self.assertTrue(geometry.point_in_polygon(point[0], point[1],
+                                                  polygon))
+
+    def test_summarize_geometry_multipolygon(self):
+        small = [[20, 0], [21, 0], [21, 1], [20, 1], [20, 0]]
+        summary = geometry.summarize_geometry(
+            {"type": "MultiPolygon", "coordinates": [[SQUARE], [small]]})
+        self.assertEqual(summary["bbox"], (0, 0, 21, 10))
+
+    def test_summarize_geometry_empty(self):
+        self.assertIsNone(geometry.summarize_geometry(None))
+
+
+class TestCoordinateConversion(unittest.TestCase):
+    """Tests for conversion to WGS84."""
+
+    def test_sweref99tm_to_wgs84_stockholm(self):
+        latitude, longitude = geometry.to_wgs84((674032, 6580822))
+        self.assertAlmostEqual(latitude, 59.33, places=2)
+        self.assertAlmostEqual(longitude, 18.06, places=2)
+
+    def test_to_wgs84_unprojected(self):
+        self.assertEqual(geometry.to_wgs84((18.06, 59.33)), (59.33, 18.06))
+
+    def test_wgs84_to_sweref99tm_round_trip(self):
+        easting, northing = geometry.wgs84_to_sweref99tm(59.33, 18.06)
+        self.assertAlmostEqual(easting, 674079, delta=1)
+        self.assertAlmostEqual(northing, 6580798, delta=1)
+        latitude, longitude = geometry.sweref99tm_to_wgs84(easting, northing)
+        self.assertAlmostEqual(latitude, 59.33, places=8)
+        self.assertAlmostEqual(longitude, 18.06, places=8)
+
+    def test_to_system(self):
+        point = geometry.to_system((18.06, 59.33), True)
+        self.assertTrue(geometry.is_projected(point))
+        back = geometry.to_system(point, False)
+        self.assertAlmostEqual(back[0], 18.06, places=8)
+        self.assertEqual(geometry.to_system((1, 2), False), (1, 2))
+
+
+class TestInteriorPoints(unittest.TestCase):
+    """Tests for points spread inside a geometry."""
+
+    def test_interior_points_square(self):
+        points = geometry.interior_points(
+            {"type": "Polygon", "coordinates": [SQUARE]}, size=4)
+        self.assertEqual(len(points), 16)
+        self.assertIn((1.25, 1.25), points)
+
+    def test_interior_points_hole(self):
+        polygon = [SQUARE, HOLE]
+        points = geometry.interior_points(
+            {"type": "Polygon", "coordinates": polygon}, size=10)
+        self.assertEqual(len(points), 100 - 36)
+        for x, y in points:
+            self.assertTrue(geometry.point_in_polygon(x, y, polygon))
+
+    def test_interior_points_flat(self):
+        line = [[0, 0], [10, 0], [0, 0]]
+        self.assertEqual(geometry.interior_points(
+            {"type": "Polygon", "coordinates": [line]}), [])
+
+
+class TestPolygonIndex(unittest.TestCase):
+    """Tests for finding the polygons containing a point."""
+
+    def setUp(self):
+        right = [[10, 0], [20, 0], [20, 10], [10, 10], [10, 0]]
+        islands = [[[[2, 2], [4, 2], [4, 4], [2, 4], [2, 2]]],
+                   [[[22, 2], [24, 2], [24, 4], [22, 4], [22, 2]]]]
+        self.index = geometry.PolygonIndex(
+            [("left", {"type": "Polygon", "coordinates": [SQUARE, HOLE]}),
+             ("right", {"type": "Polygon", "coordinates": [right]}),
+             ("islands", {"type": "MultiPolygon",
+                          "coordinates": islands})],
+            cells=8)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup(1, 1), ["left"])
+        self.assertEqual(self.index.lookup(15, 5), ["right"])
+        self.assertEqual(self.index.lookup(5, 5), [])
+        self.assertEqual(self.index.lookup(3, 3), ["islands"])
+        self.assertEqual(self.index.lookup(23, 3), ["islands"])
+        self.assertEqual(self.index.lookup(30, 3), [])
+
+    def test_lookup_matches_brute_force(self):
+        polygons = {"left": [SQUARE, HOLE],
+                    "right": [[[10, 0], [20, 0], [20, 10], [10, 10],
+                               [10, 0]]]}
+        for x in range(0, 200):
+            for y in range(0, 100, 7):
+                point = (x / 8 + 0.01, y / 10 + 0.01)
+                found = self.index.lookup(*point)
+                for key, polygon in polygons.items():
+                    self.assertEqual(
+                        key in found,
+                        geometry.point_in_polygon(point[0], point[1],
+                                                  polygon))
+
+    def test_empty_index(self):
+        self.assertEqual(geometry.PolygonIndex([]).lookup(1, 1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
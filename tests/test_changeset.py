@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+import importer.changeset as changeset
+
+
+class TestCompareReleases(unittest.TestCase):
+    """Tests for comparing two releases of a dataset."""
+
+    def setUp(self):
+        self.old = [{"NVRID": "1", "NAMN": "Foo", "AREA_HA": "10"},
+                    {"NVRID": "2", "NAMN": "Bar", "AREA_HA": "20"},
+                    {"NVRID": "3", "NAMN": "Baz", "AREA_HA": "30"}]
+        self.new = [{"NVRID": "1", "NAMN": "Foo", "AREA_HA": "10",
+                     "OBJECTID": "99"},
+                    {"NVRID": "2", "NAMN": "Bar", "AREA_HA": "25"},
+                    {"NVRID": "4", "NAMN": "Qux", "AREA_HA": "40"}]
+
+    def test_compare_releases(self):
+        changes = changeset.compare_releases(self.old, self.new)
+        self.assertEqual(changes["added"], ["4"])
+        self.assertEqual(changes["removed"], ["3"])
+        self.assertEqual(changes["modified"], {"2": ["AREA_HA"]})
+
+    def test_filter_changed(self):
+        changes = changeset.compare_releases(self.old, self.new)
+        changed = changeset.filter_changed(self.new, changes)
+        self.assertEqual([x["NVRID"] for x in changed], ["2", "4"])
+
+    def test_content_hash_ignores_unmapped(self):
+        self.assertEqual(changeset.content_hash(self.old[0]),
+                         changeset.content_hash(self.new[0]))
+
+    def test_selected_areas(self):
+        changes = changeset.compare_releases(self.old, self.new[:1],
+                                             nature_ids=["1"])
+        self.assertEqual(changes,
+                         {"added": [], "removed": [], "modified": {}})
+
+
+class TestGeometry(unittest.TestCase):
+    """Tests for noticing areas that moved between releases."""
+
+    def setUp(self):
+        self.rows = [{"NVRID": "1", "NAMN": "Foo"},
+                     {"NVRID": "2", "NAMN": "Bar"}]
+        self.old = {"1": {"latitude": 59.12341, "longitude": 17.5},
+                    "2": {"latitude": 60.0, "longitude": 18.0}}
+
+    def fingerprints(self, geometry):
+        return changeset.geometry_fingerprints(geometry, 0.0001)
+
+    def test_moved_area_modified(self):
+        new = dict(self.old, **{"2": {"latitude": 60.1, "longitude": 18.0}})
+        changes = changeset.compare_releases(
+            self.rows, self.rows, self.fingerprints(self.old),
+            self.fingerprints(new))
+        self.assertEqual(changes["modified"], {"2": ["geometry"]})
+
+    def test_move_below_precision_ignored(self):
+        new = dict(self.old,
+                   **{"1": {"latitude": 59.12342, "longitude": 17.5}})
+        changes = changeset.compare_releases(
+            self.rows, self.rows, self.fingerprints(self.old),
+            self.fingerprints(new))
+        self.assertEqual(changes["modified"], {})
+
+    def test_new_polygon(self):
+        new = dict(self.old, **{"3": {"latitude": 61.0, "longitude": 16.0}})
+        old = {"1": self.old["1"]}
+        changes = changeset.compare_releases(
+            self.rows, self.rows, self.fingerprints(old),
+            self.fingerprints(new))
+        self.assertEqual(changes["modified"], {"2": ["geometry"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+import importer.csv_index as csv_index
+
+ROWS = [{"NVRID": "2000283", "NAMN": "Åkerö", "BESLSTATUS": "Gällande"},
+        {"NVRID": "2002631", "NAMN": "Ön \"Lilla\",\nmed radbrytning",
+         "BESLSTATUS": "Gällande"},
+        {"NVRID": "200", "NAMN": "Kort", "BESLSTATUS": "Gällande"},
+        {"NVRID": "2000283", "NAMN": "Åkerö", "BESLSTATUS": "Upphävt"}]
+
+
+class TestCsvIndex(unittest.TestCase):
+    """Tests for reading rows by NVRID through the index."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.directory, "source.csv")
+        self.write_rows(ROWS)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_rows(self, rows):
+        with open(self.filepath, "w", newline="") as f_obj:
+            writer = csv.DictWriter(f_obj, fieldnames=list(ROWS[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def test_read_rows(self):
+        rows, missing = csv_index.read_rows(
+            self.filepath, ["2002631", "2000283", "1", "20002830"])
+        self.assertEqual(rows, [ROWS[0], ROWS[1], ROWS[3]])
+        self.assertEqual(missing, ["1", "20002830"])
+
+    def test_read_rows_short_key(self):
+        rows, missing = csv_index.read_rows(self.filepath, ["200"])
+        self.assertEqual(rows, [ROWS[2]])
+        self.assertEqual(missing, [])
+
+    def test_index_saved(self):
+        csv_index.read_rows(self.filepath, ["200"])
+        metadata = csv_index.read_metadata(
+            csv_index.get_index_path(self.filepath))
+        self.assertTrue(csv_index.is_current(metadata, self.filepath))
+        self.assertEqual(metadata["count"], 4)
+        self.assertEqual(metadata["header"], list(ROWS[0]))
+
+    def test_index_rebuilt(self):
+        csv_index.read_rows(self.filepath, ["200"])
+        changed = [dict(ROWS[2], NVRID="300")] + ROWS[:2]
+        self.write_rows(changed)
+        rows, missing = csv_index.read_rows(self.filepath, ["300", "200"])
+        self.assertEqual(rows, [changed[0]])
+        self.assertEqual(missing, ["200"])
+
+    def test_empty_file(self):
+        self.write_rows([])
+        self.assertEqual(csv_index.read_rows(self.filepath, ["200"]),
+                         ([], ["200"]))
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import argparse
+import contextlib
+import io
+import unittest
+
+import importer_path  # noqa: F401
+import datasets
+import nature_importer
+
+
+def make_dataset(code="nm", protection_type="Naturminne"):
+    return datasets.Dataset(code=code,
+                            source_file="NM_polygon.csv",
+                            geometry_file="NM_polygon.geojsonl",
+                            edit_summary="#WLESE #naturminne",
+                            source_item="source_nm",
+                            protection_type=protection_type)
+
+
+class TestRegistry(unittest.TestCase):
+    """Tests for registering and looking up datasets."""
+
+    def setUp(self):
+        self.registered = dict(datasets.DATASETS)
+
+    def tearDown(self):
+        datasets.DATASETS.clear()
+        datasets.DATASETS.update(self.registered)
+
+    def test_builtin_datasets(self):
+        self.assertEqual(datasets.get_dataset_codes(), ["np", "nr"])
+        self.assertEqual(datasets.get_dataset("nr").source_file,
+                         "NR_polygon.csv")
+        self.assertEqual(datasets.get_dataset("np").source_item,
+                         "source_np")
+
+    def test_unknown_code(self):
+        self.assertIsNone(datasets.get_dataset("xx"))
+
+    def test_register_dataset(self):
+        dataset = make_dataset()
+        datasets.register_dataset(dataset)
+        self.assertIs(datasets.get_dataset("nm"), dataset)
+        self.assertEqual(datasets.get_dataset_codes(), ["nm", "np", "nr"])
+        self.assertTrue(dataset.get_source_path().endswith(
+            "NM_polygon.csv"))
+
+    def test_register_replaces(self):
+        dataset = make_dataset(code="nr", protection_type="Naturreservat")
+        datasets.register_dataset(dataset)
+        self.assertIs(datasets.get_dataset("nr"), dataset)
+        self.assertEqual(datasets.get_dataset_codes(), ["np", "nr"])
+
+    def test_get_dataset_by_protection_type(self):
+        self.assertEqual(
+            datasets.get_dataset_by_protection_type("Nationalpark").code,
+            "np")
+        self.assertIsNone(
+            datasets.get_dataset_by_protection_type("Naturminne"))
+        datasets.register_dataset(make_dataset())
+        self.assertEqual(
+            datasets.get_dataset_by_protection_type("Naturminne").code,
+            "nm")
+
+
+class TestParseDatasets(unittest.TestCase):
+    """Tests for choosing the datasets on the command line."""
+
+    def test_parse_datasets(self):
+        selected = nature_importer.parse_datasets("nr, np")
+        self.assertEqual([x.code for x in selected], ["nr", "np"])
+
+    def test_unknown_dataset(self):
+        with self.assertRaises(argparse.ArgumentTypeError) as context:
+            nature_importer.parse_datasets("nr,xx")
+        self.assertIn("np, nr", str(context.exception))
+
+    def test_unknown_dataset_rejected_by_parser(self):
+        parser = nature_importer.make_parser()
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                parser.parse_args(["--dataset", "xx"])
+
+
+if __name__ == '__main__':
+    unittest.main()
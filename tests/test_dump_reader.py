@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import importer.dump_reader as dump_reader
+
+
+def make_claim(prop, value, rank="normal"):
+    if isinstance(value, str) and value.startswith("Q"):
+        datavalue = {"value": {"entity-type": "item", "id": value},
+                     "type": "wikibase-entityid"}
+    else:
+        datavalue = {"value": value, "type": "string"}
+    return {"mainsnak": {"snaktype": "value", "property": prop,
+                         "datavalue": datavalue},
+            "type": "statement", "rank": rank}
+
+
+def make_entity(item, labels=None, claims=None):
+    entity = {"type": "item", "id": item,
+              "labels": {k: {"language": k, "value": v}
+                         for k, v in (labels or {}).items()},
+              "claims": {}}
+    for prop, value, *rank in claims or []:
+        entity["claims"].setdefault(prop, []).append(
+            make_claim(prop, value, *rank))
+    return entity
+
+
+class TestReadDump(unittest.TestCase):
+    """Tests for extracting data from a dump."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        entities = [
+            make_entity("Q10550272", {"sv": "Kungsberget"},
+                        [("P3613", "2000283"), ("P137", "Q29515266")]),
+            make_entity("Q30", {"sv": "Dubblett"}, [("P3613", "2000283")]),
+            make_entity("Q31", {}, [("P3613", "9", "deprecated")]),
+            make_entity("Q109010", {"en": "Solna Municipality",
+                                    "sv": "Solna kommun"},
+                        [("P31", "Q127448")]),
+            make_entity("Q29515266", {"sv": "AssiDomän AB"}),
+            make_entity("Q29515279", {"sv": "August Abrahamssons stiftelse"}),
+            make_entity("Q1", {"sv": "Universum"})]
+        self.dump = os.path.join(self.directory, "dump.json.gz")
+        with gzip.open(self.dump, "wt", encoding="utf-8") as f:
+            f.write("[\n")
+            f.write(",\n".join(json.dumps(x, separators=(",", ":"))
+                               for x in entities))
+            f.write("\n]\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_dump(self):
+        results = dump_reader.read_dump(self.dump, processes=2)
+        self.assertEqual(results["existing"],
+                         {"2000283": ["Q30", "Q10550272"]})
+        self.assertEqual(results["municipalities"],
+                         [{"item": "Q109010", "en": "Solna Municipality",
+                           "sv": "Solna kommun"}])
+        self.assertEqual(results["forvaltare"],
+                         [{"item": "Q29515266", "sv": "AssiDomän AB"}])
+
+    def test_write_results(self):
+        results = dump_reader.read_dump(self.dump, processes=1)
+        dump_reader.write_results(results, self.directory)
+        with open(os.path.join(self.directory, "existing_P3613.json")) as f:
+            self.assertEqual(json.load(f), results["existing"])
+
+    def test_unused_operators_kept(self):
+        known = [{"item": "Q29515279", "sv": "Gammalt namn"},
+                 {"item": "Q29515266", "sv": "AssiDomän"},
+                 {"item": "Q99", "sv": "Borttagen"}]
+        results = dump_reader.read_dump(self.dump, processes=1,
+                                        known_operators=known)
+        self.assertEqual(results["forvaltare"],
+                         [{"item": "Q29515266", "sv": "AssiDomän AB"},
+                          {"item": "Q29515279",
+                           "sv": "August Abrahamssons stiftelse"},
+                          {"item": "Q99", "sv": "Borttagen"}])
+
+    def test_load_operators(self):
+        filepath = os.path.join(self.directory, "forvaltare.json")
+        self.assertEqual(dump_reader.load_operators(filepath), [])
+        with open(filepath, "w") as f:
+            json.dump([{"item": "Q1", "sv": "Universum"}], f)
+        self.assertEqual(dump_reader.load_operators(filepath),
+                         [{"item": "Q1", "sv": "Universum"}])
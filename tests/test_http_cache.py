@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+import importer.http_cache as http_cache
+import importer.wikibase_standin as standin
+
+
+class TestNormalizeRequest(unittest.TestCase):
+    """Tests for the keys of requests."""
+
+    def test_order_and_volatile_ignored(self):
+        first = http_cache.normalize_request(
+            "post", "https://example.org/w/api.php?format=json",
+            {"data": {"action": "wbgetentities", "ids": "Q1",
+                      "requestid": "1"}})
+        second = http_cache.normalize_request(
+            "POST", "https://example.org/w/api.php",
+            {"data": "requestid=2&ids=Q1&action=wbgetentities",
+             "params": {"format": "json"}})
+        self.assertEqual(first, second)
+        self.assertEqual(http_cache.make_key(first),
+                         http_cache.make_key(second))
+
+    def test_accept_header(self):
+        first = http_cache.normalize_request(
+            "GET", "https://example.org/", {"params": {"q": "x"}},
+            {"Accept": "application/json"})
+        second = http_cache.normalize_request(
+            "GET", "https://example.org/",
+            {"params": {"q": "x"},
+             "headers": {"accept": "text/csv"}},
+            {"Accept": "application/json"})
+        self.assertNotEqual(http_cache.make_key(first),
+                            http_cache.make_key(second))
+
+    def test_passwords_redacted(self):
+        normalized = http_cache.normalize_request(
+            "POST", "https://example.org/w/api.php",
+            {"data": {"action": "login", "lgname": "Bot",
+                      "lgpassword": "secret", "lgtoken": "abc"}})
+        self.assertEqual(normalized["params"],
+                         [("action", "login"), ("lgname", "Bot"),
+                          ("lgpassword", http_cache.REDACTED)])
+
+    def test_is_cacheable(self):
+        self.assertTrue(http_cache.is_cacheable(
+            "GET", [("action", "wbgetentities"), ("ids", "Q1")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "GET", [("action", "query"), ("meta", "tokens")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "GET", [("action", "query"), ("meta", "siteinfo|userinfo")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "POST", [("action", "login"), ("lgname", "Bot"),
+                     ("lgtoken", "abc+\\")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "POST", [("action", "clientlogin")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "GET", [("action", "query"), ("assert", "user")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "POST", [("action", "wbeditentity"), ("id", "Q1")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "POST", [("action", "query"), ("token", "abc+\\")]))
+        self.assertFalse(http_cache.is_cacheable(
+            "GET", [("action", "query"), ("maxlag", "-1")]))
+
+    def test_different_values(self):
+        first = http_cache.normalize_request(
+            "GET", "https://example.org/", {"params": {"ids": "Q1"}})
+        second = http_cache.normalize_request(
+            "GET", "https://example.org/", {"params": {"ids": "Q2"}})
+        self.assertNotEqual(http_cache.make_key(first),
+                            http_cache.make_key(second))
+
+
+class TestHttpCache(unittest.TestCase):
+    """Tests for recording and replaying requests."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.database = os.path.join(self.directory, "cache.sqlite")
+        self.server = standin.start_server()
+        self.api = self.server.get_url() + standin.API_PATH
+        self.params = {"action": "query", "meta": "siteinfo",
+                       "format": "json"}
+
+    def tearDown(self):
+        http_cache.uninstall()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_record_then_replay(self):
+        cache = http_cache.HttpCache(self.database, "record")
+        http_cache.install(cache)
+        recorded = requests.get(self.api, params=self.params).json()
+        requests.get(self.api, params=self.params)
+        self.assertEqual(cache.stats["misses"], 1)
+        self.assertEqual(cache.stats["hits"], 1)
+        cache.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+        cache = http_cache.HttpCache(self.database, "replay")
+        http_cache.install(cache)
+        response = requests.get(self.api, params=self.params, stream=True)
+        with response:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), recorded)
+        with self.assertRaises(http_cache.CacheMiss):
+            requests.get(self.api, params={"action": "paraminfo"})
+        self.assertEqual(cache.summarize(),
+                         {"GET " + self.api.split("/")[2]: 1})
+
+    def test_passthrough(self):
+        cache = http_cache.HttpCache(self.database, "passthrough")
+        http_cache.install(cache)
+        requests.get(self.api, params=self.params)
+        self.assertEqual(cache.stats["sent"], 1)
+        self.assertEqual(cache.summarize(), {})
+
+    def test_writes_always_sent(self):
+        cache = http_cache.HttpCache(self.database, "record")
+        http_cache.install(cache)
+        data = {"action": "wbeditentity", "new": "item", "data": "{}",
+                "token": "+\\", "format": "json"}
+        first = requests.post(self.api, data=data).json()
+        second = requests.post(self.api, data=data).json()
+        self.assertNotEqual(first["entity"]["id"], second["entity"]["id"])
+        self.assertEqual(cache.stats["sent"], 2)
+        self.assertEqual(cache.stats["hits"], 0)
+        self.assertEqual(cache.summarize(), {})
+
+    def test_lag_probe_sent(self):
+        cache = http_cache.HttpCache(self.database, "replay")
+        http_cache.install(cache)
+        params = dict(self.params, maxlag=-1)
+        requests.get(self.api, params=params)
+        self.assertEqual(cache.stats["sent"], 1)
+        self.assertEqual(cache.stats["misses"], 0)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            http_cache.HttpCache(self.database, "rewind")
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+import importer.item_serializer as item_serializer
+import standin_site
+
+HAS_WIKIDATASTUFF = importlib.util.find_spec("wikidataStuff") is not None
+
+
+class TestRecords(unittest.TestCase):
+    """Tests for writing and reading export files and journals."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records_round_trip(self):
+        records = [{"key": "2000283", "name": "Kungsberget",
+                    "labels": {"sv": "Kungsberget"}},
+                   {"key": "2001225", "name": "Åsnen", "labels": {}}]
+        filepath = os.path.join(self.directory, "items.jsonl")
+        writer = item_serializer.RecordWriter(filepath)
+        for record in records:
+            writer.write(record)
+        writer.close()
+        with open(filepath) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.assertEqual(list(item_serializer.iter_records(filepath)),
+                         records)
+
+    def test_journal(self):
+        filepath = os.path.join(self.directory, "journal.jsonl")
+        self.assertEqual(item_serializer.read_journal(filepath), {})
+        item_serializer.append_journal(filepath, "2000283", "Q10550272")
+        item_serializer.append_journal(filepath, "2001225", "Q1")
+        self.assertEqual(item_serializer.read_journal(filepath),
+                         {"2000283": "Q10550272", "2001225": "Q1"})
+
+    def test_serialized_item(self):
+        record = {"key": "2000283", "name": "Kungsberget", "dataset": "nr"}
+        wd_item = {"wd-item": None, "upload": True}
+        item = item_serializer.SerializedItem(record, wd_item)
+        item.associate_wd_item("Q10550272")
+        self.assertEqual(item.wd_item["wd-item"], "Q10550272")
+        self.assertEqual(item.raw_data["NVRID"], "2000283")
+
+
+class TestTargets(unittest.TestCase):
+    """Tests for encoding and decoding the targets of statements."""
+
+    def setUp(self):
+        import pywikibot
+        self.pywikibot = pywikibot
+        _, self.repo = standin_site.get_site()
+
+    def assert_round_trip(self, target, kind):
+        encoded = item_serializer.encode_target(target)
+        self.assertEqual(encoded["type"], kind)
+        decoded, special = item_serializer.decode_target(
+            encoded, self.repo)
+        self.assertFalse(special)
+        self.assertEqual(decoded, target)
+        self.assertEqual(item_serializer.encode_target(decoded), encoded)
+
+    def test_item(self):
+        self.assert_round_trip(
+            self.pywikibot.ItemPage(self.repo, "Q179049"), "item")
+
+    def test_string(self):
+        self.assert_round_trip("2000283", "string")
+
+    def test_time(self):
+        self.assert_round_trip(
+            self.pywikibot.WbTime(year=1983, month=12, day=2,
+                                  site=self.repo), "time")
+
+    def test_quantity(self):
+        unit = self.pywikibot.ItemPage(self.repo, "Q712226")
+        self.assert_round_trip(
+            self.pywikibot.WbQuantity(amount=12.5, unit=unit,
+                                      site=self.repo), "quantity")
+
+    def test_coordinate(self):
+        globe = self.pywikibot.ItemPage(self.repo, "Q2")
+        self.assert_round_trip(
+            self.pywikibot.Coordinate(lat=59.1, lon=17.2, precision=0.0001,
+                                      globe_item=globe, site=self.repo),
+            "globecoordinate")
+
+    def test_special(self):
+        encoded = item_serializer.encode_target("somevalue", special=True)
+        self.assertEqual(encoded, {"type": "somevalue"})
+        self.assertEqual(item_serializer.decode_target(encoded, self.repo),
+                         ("somevalue", True))
+
+
+@unittest.skipUnless(HAS_WIKIDATASTUFF, "wikidataStuff is not installed")
+class TestItemRoundTrip(unittest.TestCase):
+    """Tests for exporting a built area and loading it again."""
+
+    def setUp(self):
+        import nature_importer
+        import synthetic_data
+        from NatureArea import NatureArea
+        _, self.repo = standin_site.get_site()
+        rows, _ = synthetic_data.make_rows(1, 0, seed=1)
+        self.area = NatureArea(rows[0], self.repo,
+                               nature_importer.load_mapping_files(), {})
+
+    def test_round_trip(self):
+        record = item_serializer.encode_item(self.area, "nr")
+        self.assertEqual(record["key"], self.area.raw_data["NVRID"])
+        self.assertTrue(record["labels"])
+        self.assertTrue(record["refs"])
+        props = [x["prop"] for x in record["statements"]]
+        self.assertEqual(props, [x["prop"] for x in
+                                 self.area.wd_item["statements"]])
+        self.assertTrue(all(x["ref"] is not None
+                            for x in record["statements"]))
+        decoded = item_serializer.decode_item(record, self.repo)
+        self.assertEqual(decoded.wd_item["wd-item"],
+                         self.area.wd_item["wd-item"])
+        self.assertEqual(item_serializer.encode_item(decoded, "nr"), record)
+
+
+class TestRecordWriter(unittest.TestCase):
+    """Tests for writing an export file as the items are built."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_written_at_once(self):
+        filepath = os.path.join(self.directory, "items.jsonl")
+        writer = item_serializer.RecordWriter(filepath)
+        writer.write({"key": "2000283"})
+        self.assertEqual(list(item_serializer.iter_records(filepath)),
+                         [{"key": "2000283"}])
+        writer.write({"key": "2001225"})
+        writer.close()
+        self.assertEqual(writer.count, 2)
+        self.assertEqual(len(list(item_serializer.iter_records(filepath))),
+                         2)
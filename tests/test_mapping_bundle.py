@@ -0,0 +1,64 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import importer.mapping_bundle as mapping_bundle
+
+
+class TestBuildIndexes(unittest.TestCase):
+    """Tests for the lookup indexes of the bundle."""
+
+    def test_index_by_first_wins(self):
+        entries = [{"nature_id": "1", "item": "Q1"},
+                   {"nature_id": "1", "item": "Q2"},
+                   {"item": "Q3"}]
+        self.assertEqual(mapping_bundle.index_by(entries, "nature_id"),
+                         {"1": "Q1"})
+
+    def test_index_by_lower(self):
+        entries = [{"sv": "Solna kommun", "item": "Q109010"}]
+        self.assertEqual(mapping_bundle.index_by(entries, "sv", lower=True),
+                         {"solna kommun": "Q109010"})
+
+
+class TestLoadBundle(unittest.TestCase):
+    """Tests for building, caching and rebuilding the bundle."""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        source_dir = mapping_bundle.get_data_dir()
+        for filename in mapping_bundle.MAPPING_FILES:
+            shutil.copy(os.path.join(source_dir, filename), self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_load_bundle_builds(self):
+        bundle = mapping_bundle.load_bundle(self.data_dir)
+        self.assertTrue(os.path.isfile(
+            os.path.join(self.data_dir, mapping_bundle.BUNDLE_FILE)))
+        self.assertEqual(bundle["indexes"]["municipalities_en"]
+                         ["solna municipality"], "Q109010")
+        self.assertEqual(bundle["indexes"]["svwp_to_nature_id_exact"]
+                         ["2000283"], "Q10550272")
+        self.assertIn("properties", bundle["files"])
+
+    def test_load_bundle_rebuilds_on_change(self):
+        mapping_bundle.load_bundle(self.data_dir)
+        with open(os.path.join(self.data_dir, "items.json"), "w") as f:
+            f.write('{"sweden": "Q1"}')
+        bundle = mapping_bundle.load_bundle(self.data_dir)
+        self.assertEqual(bundle["files"]["items"], {"sweden": "Q1"})
+
+    def test_load_bundle_rebuilds_other_version(self):
+        bundle = mapping_bundle.build_bundle(self.data_dir)
+        bundle["version"] = mapping_bundle.BUNDLE_VERSION - 1
+        bundle["files"] = {}
+        mapping_bundle.save_bundle(
+            bundle, os.path.join(self.data_dir, mapping_bundle.BUNDLE_FILE))
+        bundle = mapping_bundle.load_bundle(self.data_dir)
+        self.assertEqual(bundle["version"], mapping_bundle.BUNDLE_VERSION)
+        self.assertIn("items", bundle["files"])
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+
+import importer_path  # noqa: F401
+import importer_utils as utils
+import match_validator
+
+ITEMS = {"nature_reserve": "Q179049", "national_park": "Q46169",
+         "protected_area": "Q473972"}
+
+
+def make_entity(qid, instance_of=None):
+    claims = {}
+    if instance_of:
+        claims["P31"] = [{"mainsnak": {"datavalue": {
+            "value": {"entity-type": "item", "id": x}}}}
+            for x in instance_of]
+    return {"id": qid, "type": "item", "claims": claims}
+
+
+class FakeRequest(object):
+    """Answers wbgetentities as the API does, from a FakeRepo."""
+
+    def __init__(self, repo, ids):
+        self.repo = repo
+        self.ids = ids
+
+    def submit(self):
+        self.repo.requests.append(list(self.ids))
+        entities = {}
+        for qid in self.ids:
+            target = self.repo.redirects.get(qid, qid)
+            if target not in self.repo.entities:
+                entities[qid] = {"id": qid, "missing": ""}
+                continue
+            entity = dict(self.repo.entities[target])
+            if target != qid:
+                entity["redirects"] = {"from": qid, "to": target}
+            entities[target] = entity
+        return {"entities": entities, "success": 1}
+
+
+class FakeRepo(object):
+    """A site with some items, redirects between them, and no others."""
+
+    def __init__(self, entities, redirects=None):
+        self.entities = {x["id"]: x for x in entities}
+        self.redirects = redirects or {}
+        self.requests = []
+
+    def simple_request(self, action, ids, props, redirects):
+        return FakeRequest(self, ids)
+
+
+class FakeArea(object):
+    """A built area, matched to an item."""
+
+    def __init__(self, nature_id, item, match_source="mapping"):
+        self.raw_data = {"NVRID": nature_id, "NAMN": "Område " + nature_id}
+        self.wd_item = {"wd-item": item, "upload": True}
+        self.match_source = match_source
+
+    def associate_wd_item(self, item):
+        self.wd_item["wd-item"] = item
+
+
+class TestGetEntities(unittest.TestCase):
+    """Tests for fetching many entities in batches."""
+
+    def test_batches(self):
+        repo = FakeRepo([make_entity("Q{}".format(x)) for x in range(5)])
+        ids = ["Q{}".format(x) for x in range(5)]
+        entities = utils.get_entities(repo, ids, batch_size=2)
+        self.assertEqual(sorted(entities), ids)
+        self.assertEqual(repo.requests, [ids[:2], ids[2:4], ids[4:]])
+
+    def test_redirect_and_missing(self):
+        repo = FakeRepo([make_entity("Q1")], {"Q2": "Q1"})
+        entities = utils.get_entities(repo, ["Q2", "Q3"])
+        self.assertEqual(entities["Q2"]["id"], "Q1")
+        self.assertIn("missing", entities["Q3"])
+
+    def test_redirects_to_the_same_item(self):
+        repo = FakeRepo([make_entity("Q1")], {"Q2": "Q1", "Q3": "Q1"})
+        entities = utils.get_entities(repo, ["Q1", "Q2", "Q3"])
+        self.assertEqual(sorted(entities), ["Q1", "Q2", "Q3"])
+        self.assertEqual({x["id"] for x in entities.values()}, {"Q1"})
+        self.assertEqual(len(repo.requests), 3)
+
+
+class TestValidateMatches(unittest.TestCase):
+    """Tests for checking the matched items before upload."""
+
+    def validate(self, repo, areas):
+        return match_validator.validate_matches(repo, areas, ITEMS)
+
+    def test_valid(self):
+        repo = FakeRepo([make_entity("Q1", ["Q179049"])])
+        area = FakeArea("2000283", "Q1")
+        self.assertEqual(self.validate(repo, [area]), {})
+        self.assertTrue(area.wd_item["upload"])
+
+    def test_redirect(self):
+        repo = FakeRepo([make_entity("Q1", ["Q179049"])], {"Q2": "Q1"})
+        area = FakeArea("2000283", "Q2")
+        report = self.validate(repo, [area])
+        self.assertEqual(list(report), ["redirect"])
+        self.assertEqual(report["redirect"][0]["details"], "Q1")
+        self.assertEqual(area.wd_item["wd-item"], "Q1")
+        self.assertTrue(area.wd_item["upload"])
+
+    def test_deleted(self):
+        repo = FakeRepo([])
+        area = FakeArea("2000283", "Q1")
+        report = self.validate(repo, [area])
+        self.assertEqual(report["deleted"][0]["item"], "Q1")
+        self.assertFalse(area.wd_item["upload"])
+
+    def test_suspicious_p31(self):
+        repo = FakeRepo([make_entity("Q1", ["Q23397"])])
+        area = FakeArea("2000283", "Q1")
+        report = self.validate(repo, [area])
+        self.assertEqual(report["suspicious_p31"][0]["details"], ["Q23397"])
+        self.assertFalse(area.wd_item["upload"])
+
+    def test_p31_only_checked_for_mapping_matches(self):
+        repo = FakeRepo([make_entity("Q1", ["Q23397"]),
+                         make_entity("Q2")])
+        existing = FakeArea("2000283", "Q1", match_source="existing")
+        no_p31 = FakeArea("2002631", "Q2")
+        self.assertEqual(self.validate(repo, [existing, no_p31]), {})
+        self.assertTrue(existing.wd_item["upload"])
+        self.assertTrue(no_p31.wd_item["upload"])
+
+    def test_merged_into_the_same_item(self):
+        repo = FakeRepo([make_entity("Q1", ["Q179049"])],
+                        {"Q2": "Q1", "Q3": "Q1"})
+        areas = [FakeArea("2000283", "Q2"), FakeArea("2002631", "Q3")]
+        report = self.validate(repo, areas)
+        self.assertEqual(len(report["redirect"]), 2)
+        self.assertNotIn("deleted", report)
+        self.assertTrue(all(x.wd_item["upload"] for x in areas))
+
+    def test_unmatched_areas(self):
+        repo = FakeRepo([])
+        self.assertEqual(self.validate(repo, [FakeArea("1", None)]), {})
+        self.assertEqual(repo.requests, [])
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import importer_path  # noqa: F401
+import area_geometry
+import municipality_index
+
+SOLNA = "Q109010"
+SUNDBYBERG = "Q500089"
+INDEXES = {"municipalities_en": {},
+           "municipalities_sv": {"solna kommun": SOLNA,
+                                 "sundbybergs kommun": SUNDBYBERG}}
+
+
+def make_box(west, south, east, north):
+    return {"type": "Polygon",
+            "coordinates": [[[west, south], [east, south], [east, north],
+                             [west, north], [west, south]]]}
+
+
+def make_feature(geometry, **properties):
+    return {"type": "Feature", "properties": properties,
+            "geometry": geometry}
+
+
+def make_row(nature_id, kommun):
+    return {"NVRID": nature_id, "NAMN": "Area {}".format(nature_id),
+            "KOMMUN": kommun}
+
+
+IN_SOLNA = make_box(17.92, 59.32, 17.98, 59.38)
+IN_SUNDBYBERG = make_box(18.02, 59.32, 18.08, 59.38)
+OUTSIDE = make_box(15.0, 57.0, 15.1, 57.1)
+
+
+class TestMunicipalityIndex(unittest.TestCase):
+    """Tests for locating areas in the municipalities."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        boundaries = [
+            make_feature(make_box(17.9, 59.3, 18.0, 59.4), KnNamn="Solna"),
+            make_feature(make_box(18.0, 59.3, 18.1, 59.4), item=SUNDBYBERG),
+            make_feature(make_box(19.0, 59.3, 19.1, 59.4), KnNamn="Atlantis")]
+        path = self.write_features("boundaries.geojsonl", boundaries)
+        self.index, self.unmatched = municipality_index.load_boundaries(
+            path, INDEXES)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_features(self, filename, features):
+        filepath = os.path.join(self.directory, filename)
+        with open(filepath, "w") as f_obj:
+            for feature in features:
+                f_obj.write(json.dumps(feature) + "\n")
+        return filepath
+
+    def check(self, features, rows, geometry=None):
+        path = self.write_features("areas.geojsonl", features)
+        return municipality_index.check_areas(path, self.index, rows,
+                                              INDEXES, geometry)
+
+    def test_load_boundaries(self):
+        self.assertEqual(self.index.lookup(17.95, 59.35), [SOLNA])
+        self.assertEqual(self.index.lookup(18.05, 59.35), [SUNDBYBERG])
+        self.assertEqual(self.unmatched, [{"KnNamn": "Atlantis"}])
+
+    def test_matching_kommun(self):
+        found, report = self.check(
+            [make_feature(IN_SOLNA, NVRID="1")], [make_row("1", "Solna")])
+        self.assertEqual(found, {"1": [SOLNA]})
+        self.assertEqual(report, {})
+
+    def test_wrong_kommun(self):
+        found, report = self.check(
+            [make_feature(IN_SOLNA, NVRID="1")],
+            [make_row("1", "Sundbyberg")])
+        self.assertEqual(found, {"1": [SOLNA]})
+        self.assertEqual(report["not_in_kommun"][0]["items"], [SOLNA])
+        self.assertEqual(report["outside_polygon"][0]["items"],
+                         [SUNDBYBERG])
+
+    def test_unknown_name(self):
+        found, report = self.check(
+            [make_feature(IN_SOLNA, NVRID="1")], [make_row("1", "Solan")])
+        self.assertEqual(report, {"unknown_name": [
+            {"nature_id": "1", "name": "Area 1", "kommun": "Solan",
+             "unknown": ["Solan"], "found": [SOLNA]}]})
+
+    def test_outside_and_no_polygon(self):
+        found, report = self.check(
+            [make_feature(OUTSIDE, NVRID="1")],
+            [make_row("1", "Solna"), make_row("2", "Solna")])
+        self.assertEqual(found, {"1": []})
+        self.assertEqual(
+            [x["nature_id"] for x in report["outside_boundaries"]], ["1"])
+        self.assertEqual([x["nature_id"] for x in report["no_polygon"]],
+                         ["2"])
+
+    def test_current_feature_preferred(self):
+        rows = [make_row("1", "Solna")]
+        features = [
+            make_feature(IN_SUNDBYBERG, NVRID="1", BESLSTATUS="Upphävt"),
+            make_feature(IN_SOLNA, NVRID="1", BESLSTATUS="Gällande"),
+            make_feature(IN_SUNDBYBERG, NVRID="1", BESLSTATUS="Överklagat")]
+        found, report = self.check(features, rows)
+        self.assertEqual(found, {"1": [SOLNA]})
+        self.assertEqual(report, {})
+
+    def test_same_feature_as_coordinates(self):
+        rows = [make_row("1", "Solna")]
+        features = [
+            make_feature(IN_SUNDBYBERG, NVRID="1", BESLSTATUS="Överklagat"),
+            make_feature(IN_SOLNA, NVRID="1", BESLSTATUS="Gällande")]
+        path = self.write_features("points.geojsonl", features)
+        geometry = area_geometry.load_geometry(path)
+        found, report = self.check(features, rows, geometry)
+        self.assertEqual(found, {"1": [SOLNA]})
+        self.assertEqual(report, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import argparse
+import contextlib
+import importlib.util
+import io
+import unittest
+
+import importer_path  # noqa: F401
+import nature_importer
+import standin_site
+import synthetic_data
+from NatureArea import NatureArea
+
+HAS_WIKIDATASTUFF = importlib.util.find_spec("wikidataStuff") is not None
+
+
+class RecordingArea(NatureArea):
+    """A NatureArea that records which groups it builds."""
+
+    def __init__(self):
+        self.built = set()
+        self.calls = []
+        for name, setter in self.PROPERTY_SETTERS:
+            setattr(self, setter,
+                    lambda name=name: self.calls.append(name))
+
+
+class TestBuild(unittest.TestCase):
+    """Tests for building only some groups of statements."""
+
+    def test_build_all(self):
+        area = RecordingArea()
+        area.build()
+        self.assertEqual(area.calls, NatureArea.PROPERTY_NAMES)
+
+    def test_build_selected(self):
+        area = RecordingArea()
+        area.build(["iucn", "area"])
+        self.assertEqual(area.calls, ["iucn", "area"])
+        self.assertEqual(area.built, {"iucn", "area"})
+
+    def test_build_more(self):
+        area = RecordingArea()
+        area.build(["area"])
+        area.build(["area", "labels"])
+        self.assertEqual(area.calls, ["area", "labels"])
+
+
+class TestParseProperties(unittest.TestCase):
+    """Tests for choosing the groups on the command line."""
+
+    def test_parse_properties(self):
+        self.assertEqual(nature_importer.parse_properties("area, iucn"),
+                         ["area", "iucn"])
+
+    def test_unknown_property(self):
+        with self.assertRaises(argparse.ArgumentTypeError):
+            nature_importer.parse_properties("area,population")
+
+    def test_unknown_property_rejected_by_parser(self):
+        parser = nature_importer.make_parser()
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                parser.parse_args(["--dataset", "nr",
+                                   "--properties", "population"])
+
+
+@unittest.skipUnless(HAS_WIKIDATASTUFF, "wikidataStuff is not installed")
+class TestBuildArea(unittest.TestCase):
+    """Tests for building some groups of a real area."""
+
+    def setUp(self):
+        _, self.repo = standin_site.get_site()
+        self.data_files = nature_importer.load_mapping_files()
+        rows, _ = synthetic_data.make_rows(1, 1, seed=1)
+        self.row = rows[0]
+
+    def test_only_selected_statements(self):
+        area = NatureArea(self.row, self.repo, self.data_files, {},
+                          properties=["area", "iucn"])
+        self.assertIsNotNone(area.wd_item["wd-item"])
+        self.assertEqual(
+            sorted(x["prop"] for x in area.wd_item["statements"]),
+            ["P2046", "P814"])
+        self.assertEqual(area.wd_item["labels"], [])
+        self.assertEqual(area.wd_item["descriptions"], [])
+
+    def test_unmatched_area_not_uploaded(self):
+        rows, _ = synthetic_data.make_rows(1, 0, seed=1)
+        area = NatureArea(rows[0], self.repo, self.data_files, {},
+                          properties=["area"])
+        self.assertFalse(area.wd_item["upload"])
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import threading
+import unittest
+
+import requests
+
+import importer_path  # noqa: F401
+import api_costs
+import datasets
+import nature_service
+
+TOKEN = "secret"
+
+
+class FakeService(object):
+    """Records the calls of the handler instead of building areas."""
+
+    def __init__(self):
+        self.calls = []
+
+    def refresh(self):
+        self.calls.append("refresh")
+
+    def reload(self):
+        self.calls.append("reload")
+
+    def get_status(self):
+        return {"existing": 0}
+
+    def build(self, nature_ids, properties=None):
+        self.calls.append(("build", nature_ids))
+        return ([], {"errors": {}, "warnings": {}, "problems": {},
+                     "excluded": set(), "matches": {}})
+
+    def upload(self, built, mode):
+        self.calls.append(("upload", mode))
+        return ({}, {"items": 0})
+
+
+class TestServiceHandler(unittest.TestCase):
+    """Tests for answering requests to the service."""
+
+    def setUp(self):
+        self.service = FakeService()
+        self.server = nature_service.ServiceServer(
+            ("127.0.0.1", 0), self.service, TOKEN)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = self.server.get_origin()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def post(self, path, headers=None):
+        return requests.post(self.url + path, headers=headers or {})
+
+    def test_status(self):
+        response = requests.get(self.url + "/status")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["existing"], 0)
+
+    def test_post_without_token(self):
+        response = self.post("/upload?nvrid=1&mode=live")
+        self.assertEqual(response.status_code, 403)
+        response = self.post("/upload?nvrid=1&mode=live",
+                             {nature_service.TOKEN_HEADER: "wrong"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.service.calls, [])
+
+    def test_post_from_other_origin(self):
+        response = self.post("/upload?nvrid=1&mode=live",
+                             {nature_service.TOKEN_HEADER: TOKEN,
+                              "Origin": "http://example.org"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.service.calls, [])
+
+    def test_upload(self):
+        response = self.post("/upload?nvrid=1&mode=live",
+                             {nature_service.TOKEN_HEADER: TOKEN,
+                              "Origin": self.url})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.service.calls,
+                         ["refresh", ("build", ["1"]), ("upload", "live")])
+        self.assertEqual(response.json()["preflight"]["matches"], {})
+
+    def test_upload_needs_post(self):
+        response = requests.get(self.url + "/upload?nvrid=1")
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.service.calls, [])
+
+    def test_reload(self):
+        response = self.post("/reload", {nature_service.TOKEN_HEADER: TOKEN})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.service.calls, ["reload"])
+
+
+class FakeArea(object):
+    """A built area, matched to an item that failed validation."""
+
+    def __init__(self, nature_id, item):
+        self.raw_data = {"NVRID": nature_id}
+        self.wd_item = {"wd-item": item, "upload": False}
+
+
+class TestServiceUpload(unittest.TestCase):
+    """Tests for uploading built areas."""
+
+    def test_invalid_matches_skipped(self):
+        service = nature_service.NatureService.__new__(
+            nature_service.NatureService)
+        service.arguments = {}
+        service.run = {}
+        service.costs = api_costs.CostLedger()
+        dataset = datasets.get_dataset("nr")
+        results, costs = service.upload(
+            [(dataset, FakeArea("2000283", "Q1"))], "live")
+        self.assertEqual(results, {"2000283": {"skipped": "Q1"}})
+        self.assertEqual(costs["items"], 0)
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import threading
+import time
+import unittest
+
+from importer.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    """Tests for running items through stages."""
+
+    def test_order_kept(self):
+        results = []
+        pipeline = Pipeline(queue_size=2)
+        pipeline.add_stage("double", lambda x: x * 2)
+        pipeline.add_stage("collect", results.append)
+        pipeline.run(range(100))
+        self.assertEqual(results, [x * 2 for x in range(100)])
+
+    def test_drop_and_batch(self):
+        batches = []
+        pipeline = Pipeline()
+        pipeline.add_stage("odd", lambda x: x if x % 2 else None)
+        pipeline.add_stage("batch", batches.append, batch_size=4)
+        pipeline.run(range(20))
+        self.assertEqual([len(x) for x in batches], [4, 4, 2])
+        metrics = pipeline.metrics()
+        self.assertEqual(metrics[0]["items_in"], 20)
+        self.assertEqual(metrics[0]["items_out"], 10)
+        self.assertEqual(metrics[1]["items_in"], 10)
+
+    def test_several_workers(self):
+        seen = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                seen.append(item)
+
+        pipeline = Pipeline(queue_size=3)
+        pipeline.add_stage("pass", lambda x: x, workers=3)
+        pipeline.add_stage("collect", collect, workers=2)
+        pipeline.run(range(50))
+        self.assertEqual(sorted(seen), list(range(50)))
+
+    def test_backpressure(self):
+        fed = []
+        ahead = []
+
+        def source():
+            for number in range(30):
+                fed.append(number)
+                yield number
+
+        def slow(item):
+            if item == 0:
+                time.sleep(0.3)
+                ahead.append(len(fed))
+
+        pipeline = Pipeline(queue_size=2)
+        pipeline.add_stage("pass", lambda x: x)
+        pipeline.add_stage("slow", slow)
+        pipeline.run(source())
+        self.assertEqual(len(fed), 30)
+        # one item in each stage, two in each queue, one being fed
+        self.assertEqual(ahead, [2 + 2 * 2 + 1])
+        self.assertGreater(pipeline.metrics()[0]["blocked"], 0)
+
+    def test_error_stops_pipeline(self):
+        def fail(item):
+            if item == 5:
+                raise ValueError("bad item")
+            return item
+
+        pipeline = Pipeline(queue_size=2)
+        pipeline.add_stage("fail", fail)
+        pipeline.add_stage("pass", lambda x: x)
+        with self.assertRaises(ValueError):
+            pipeline.run(range(1000))
+        self.assertLess(pipeline.metrics()[0]["items_in"], 1000)
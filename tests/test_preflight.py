@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+import importer.preflight as preflight
+
+
+def make_data_files():
+    indexes = {"municipalities_en": {"solna municipality": "Q109010"},
+               "municipalities_sv": {"solna kommun": "Q109010",
+                                     "malung-sälens kommun": "Q510130",
+                                     "hässleholms kommun": "Q504676"},
+               "forvaltare_sv": {"länsstyrelsen": "Q1"}}
+    glossary = {"location_in": {"fi": {"Stockholm": "Tukholman läänissä"},
+                                "ru": {"Stockholm": "в лене Стокгольм"}}}
+    return {"indexes": indexes, "glossary": glossary,
+            "iucn_categories": {"0": "novalue", "II": "Q14545628"}}
+
+
+def make_row(nature_id, kommun="Solna", lan="Stockholms län",
+             iucn="II, Nationalpark", forvaltare="Länsstyrelsen",
+             skyddstyp="Naturreservat"):
+    return {"NVRID": nature_id, "NAMN": "Area {}".format(nature_id),
+            "KOMMUN": kommun, "LAN": lan, "IUCNKAT": iucn,
+            "FORVALTARE": forvaltare, "SKYDDSTYP": skyddstyp,
+            "AREA_HA": "10.0", "URSBESLDAT": "x"}
+
+
+class TestLookups(unittest.TestCase):
+    """Tests for the lookups shared with NatureArea."""
+
+    def setUp(self):
+        self.indexes = make_data_files()["indexes"]
+
+    def test_resolve_municipalities(self):
+        self.assertEqual(
+            preflight.resolve_municipalities("Solna, Foo, Malung, ",
+                                             self.indexes),
+            (["Q109010", "Q510130"], ["Foo"]))
+
+    def test_find_operator(self):
+        self.assertEqual(
+            preflight.find_operator("Hässelholms kommun", self.indexes),
+            "Q504676")
+        self.assertIsNone(preflight.find_operator("Foo", self.indexes))
+
+    def test_get_county_name(self):
+        self.assertEqual(preflight.get_county_name("Stockholms län"),
+                         "Stockholm")
+        self.assertEqual(preflight.get_county_name("Västra Götalands län"),
+                         "Västra Götaland")
+
+
+class TestValidateRows(unittest.TestCase):
+    """Tests for checking all rows of a dataset."""
+
+    def setUp(self):
+        self.data_files = make_data_files()
+
+    def test_validate_rows_valid(self):
+        report = preflight.validate_rows([make_row("1")], self.data_files)
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(report["warnings"], {})
+        self.assertEqual(report["excluded"], set())
+
+    def test_validate_rows_errors(self):
+        rows = [make_row("1", kommun="Foo"),
+                make_row("2", lan="Skåne län"),
+                make_row("3", iucn="VII"),
+                make_row("4", skyddstyp="Biotopskydd"),
+                make_row("5")]
+        report = preflight.validate_rows(rows, self.data_files)
+        self.assertEqual(sorted(report["errors"]),
+                         ["county not in glossary", "unknown IUCN category",
+                          "unknown municipality", "unknown protection type"])
+        self.assertEqual(report["excluded"], {"1", "2", "3", "4"})
+        self.assertEqual(
+            report["errors"]["county not in glossary"][0]["detail"],
+            {"county": "Skåne", "languages": ["fi", "ru"]})
+        self.assertEqual([x["NVRID"] for x in
+                          preflight.exclude_rows(rows, report)], ["5"])
+
+    def test_validate_rows_warnings(self):
+        rows = [make_row("1", forvaltare="Foo"),
+                make_row("2", kommun="Foo"),
+                make_row("3", kommun="Solna, Foo")]
+        self.data_files["municipalities_found"] = {"2": ["Q109010"]}
+        report = preflight.validate_rows(rows, self.data_files)
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(report["excluded"], set())
+        self.assertEqual(report["problems"],
+                         {"1": {"unmapped operator": "Foo"},
+                          "2": {"municipality from polygon":
+                                {"unknown": ["Foo"], "found": ["Q109010"]}},
+                          "3": {"unknown municipality": ["Foo"]}})
+
+    def test_validate_rows_column_problems(self):
+        rows = [make_row("1"), make_row("2")]
+        column_problems = {"URSBESLDAT is not a date": ["1"],
+                           "AREA_HA is negative": ["2"]}
+        report = preflight.validate_rows(rows, self.data_files,
+                                         column_problems)
+        self.assertEqual(report["excluded"], {"1"})
+        self.assertEqual(report["errors"]["URSBESLDAT is not a date"],
+                         [{"nature_id": "1", "name": "Area 1",
+                           "detail": "x"}])
+        self.assertEqual(list(report["warnings"]), ["AREA_HA is negative"])
+        self.assertEqual(report["problems"]["2"],
+                         {"AREA_HA is negative": "10.0"})
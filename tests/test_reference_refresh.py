@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import copy
+import unittest
+import importer.reference_refresh as reference_refresh
+
+URL_TEMPLATE = "http://example.org/omrade/{}/G%C3%A4llande"
+DATES = {"publication": "2018-06-01", "retrieved": "2018-06-15"}
+
+
+def make_item_snak(prop, qid):
+    return {"snaktype": "value", "property": prop,
+            "datavalue": {"value": {"entity-type": "item",
+                                    "numeric-id": int(qid[1:]), "id": qid},
+                          "type": "wikibase-entityid"},
+            "datatype": "wikibase-item"}
+
+
+def make_url_snak(url):
+    return {"snaktype": "value", "property": "P854",
+            "datavalue": {"value": url, "type": "string"},
+            "datatype": "url"}
+
+
+def make_reference(source, url, publication="2015-12-18",
+                   retrieved="2017-01-20"):
+    snaks = {"P248": [make_item_snak("P248", source)],
+             "P854": [make_url_snak(url)]}
+    if publication:
+        snaks["P577"] = [reference_refresh.make_time_snak(
+            "P577", publication)]
+    if retrieved:
+        snaks["P813"] = [reference_refresh.make_time_snak(
+            "P813", retrieved)]
+    return {"hash": "abc", "snaks": snaks, "snaks-order": list(snaks)}
+
+
+class TestIsImporterReference(unittest.TestCase):
+    """Tests for recognising the references of the importer."""
+
+    def setUp(self):
+        self.pattern = reference_refresh.make_url_pattern(URL_TEMPLATE)
+
+    def test_importer_reference(self):
+        reference = make_reference(
+            "Q1", "http://example.org/omrade/2000283/G%C3%A4llande")
+        self.assertTrue(reference_refresh.is_importer_reference(
+            reference, {"Q1"}, self.pattern))
+
+    def test_other_source(self):
+        reference = make_reference(
+            "Q2", "http://example.org/omrade/2000283/G%C3%A4llande")
+        self.assertFalse(reference_refresh.is_importer_reference(
+            reference, {"Q1"}, self.pattern))
+
+    def test_other_url(self):
+        for url in ["http://example.org/omrade/2000283",
+                    "http://example.org/omrade/1/2/G%C3%A4llande",
+                    "http://example.org/omradeX2000283/G%C3%A4llande"]:
+            reference = make_reference("Q1", url)
+            self.assertFalse(reference_refresh.is_importer_reference(
+                reference, {"Q1"}, self.pattern))
+
+    def test_no_url(self):
+        reference = {"snaks": {"P248": [make_item_snak("P248", "Q1")]}}
+        self.assertFalse(reference_refresh.is_importer_reference(
+            reference, {"Q1"}, self.pattern))
+
+
+class TestRefresh(unittest.TestCase):
+    """Tests for setting the dates of references."""
+
+    def setUp(self):
+        self.pattern = reference_refresh.make_url_pattern(URL_TEMPLATE)
+        url = "http://example.org/omrade/2000283/G%C3%A4llande"
+        self.own = make_reference("Q1", url)
+        self.other = make_reference("Q9", "http://example.org/other")
+        self.entity = {
+            "id": "Q100", "lastrevid": 5,
+            "claims": {
+                "P3613": [{"id": "Q100$1", "mainsnak": {},
+                           "references": [copy.deepcopy(self.own)]}],
+                "P17": [{"id": "Q100$2", "mainsnak": {},
+                         "references": [copy.deepcopy(self.other),
+                                        copy.deepcopy(self.own)]}],
+                "P31": [{"id": "Q100$3", "mainsnak": {},
+                         "references": [copy.deepcopy(self.other)]}],
+                "P131": [{"id": "Q100$4", "mainsnak": {}}]}}
+
+    def test_refresh_reference(self):
+        reference = copy.deepcopy(self.own)
+        self.assertTrue(reference_refresh.refresh_reference(
+            reference, DATES))
+        self.assertNotIn("hash", reference)
+        self.assertEqual(
+            reference_refresh.get_snak_values(reference, "P577")[0]["time"],
+            "+2018-06-01T00:00:00Z")
+        self.assertEqual(
+            reference_refresh.get_snak_values(reference, "P813")[0]["time"],
+            "+2018-06-15T00:00:00Z")
+        self.assertEqual(reference["snaks"]["P854"], self.own["snaks"]["P854"])
+
+    def test_refresh_reference_unchanged(self):
+        reference = make_reference("Q1", "x", *sorted(DATES.values()))
+        self.assertFalse(reference_refresh.refresh_reference(
+            reference, DATES))
+        self.assertEqual(reference["hash"], "abc")
+
+    def test_refresh_reference_missing_date(self):
+        reference = make_reference("Q1", "x", retrieved=None)
+        self.assertTrue(reference_refresh.refresh_reference(
+            reference, DATES))
+        self.assertEqual(reference["snaks-order"],
+                         ["P248", "P854", "P577", "P813"])
+
+    def test_refresh_entity(self):
+        statements, references = reference_refresh.refresh_entity(
+            self.entity, {"Q1"}, self.pattern, DATES)
+        self.assertEqual(sorted(x["id"] for x in statements),
+                         ["Q100$1", "Q100$2"])
+        self.assertEqual(references, 2)
+        other = self.entity["claims"]["P17"][0]["references"][0]
+        self.assertEqual(other, self.other)
+        self.assertEqual(reference_refresh.make_edit_data(statements),
+                         {"claims": statements})
+
+    def test_refresh_entity_twice(self):
+        reference_refresh.refresh_entity(
+            self.entity, {"Q1"}, self.pattern, DATES)
+        self.assertEqual(reference_refresh.refresh_entity(
+            self.entity, {"Q1"}, self.pattern, DATES), ([], 0))
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import importer_path  # noqa: F401
+import api_costs
+import sharding
+
+
+class TestShards(unittest.TestCase):
+    """Tests for assigning areas to shards."""
+
+    def test_parse_shard(self):
+        self.assertEqual(sharding.parse_shard("2/4"), (2, 4))
+
+    def test_parse_shard_invalid(self):
+        for text in ["0/4", "5/4", "1/0", "a/b", "2"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                sharding.parse_shard(text)
+
+    def test_shard_of_stable(self):
+        self.assertEqual(sharding.shard_of("2000283", 4),
+                         sharding.shard_of("2000283", 4))
+        self.assertEqual(sharding.shard_of("2000283", 1), 1)
+
+    def test_shards_partition(self):
+        rows = [{"NVRID": str(x), "LAN": "Skåne län"}
+                for x in range(2000000, 2000200)]
+        shards = [sharding.select_shard(rows, (x, 3)) for x in [1, 2, 3]]
+        self.assertEqual(sum(len(x) for x in shards), len(rows))
+        self.assertTrue(all(shards))
+        ids = [y["NVRID"] for x in shards for y in x]
+        self.assertEqual(len(set(ids)), len(rows))
+
+    def test_shard_by_county(self):
+        rows = [{"NVRID": str(x), "LAN": "Skåne län"} for x in range(50)]
+        shards = [sharding.select_shard(rows, (x, 3), by="county")
+                  for x in [1, 2, 3]]
+        self.assertEqual(sorted(len(x) for x in shards), [0, 0, 50])
+
+
+class TestMerge(unittest.TestCase):
+    """Tests for combining the files of several shards."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_journal(self, name, entries):
+        filepath = os.path.join(self.directory, name)
+        with open(filepath, "w") as f:
+            for key, item in entries:
+                f.write(json.dumps({"key": key, "item": item}) + "\n")
+        return filepath
+
+    def test_merge_journals(self):
+        first = self.write_journal("1.jsonl", [("1", "Q1"), ("2", "Q2")])
+        second = self.write_journal("2.jsonl", [("3", "Q3"), ("2", "Q5")])
+        entries, conflicts = sharding.merge_journals([first, second])
+        self.assertEqual(sorted(x["key"] for x in entries), ["1", "2", "3"])
+        self.assertEqual(conflicts, {"2": ["Q2", "Q5"]})
+
+    def test_merge_reports(self):
+        reports = [{"deleted": [{"item": "Q1"}], "uploads": 3},
+                   {"deleted": [{"item": "Q2"}], "redirect": [],
+                    "uploads": 4}]
+        self.assertEqual(sharding.merge_reports(reports),
+                         {"deleted": [{"item": "Q1"}, {"item": "Q2"}],
+                          "redirect": [],
+                          "uploads": [3, 4]})
+
+    def make_cost_report(self, items):
+        ledger = api_costs.CostLedger()
+        api_costs.ledger = ledger
+        try:
+            for key, dataset, new, reads in items:
+                with api_costs.item(key, dataset, new=new):
+                    with api_costs.phase("labels"):
+                        for _ in range(reads):
+                            ledger.count(False, 10, 0.1)
+            ledger.count(True, 5, 0.1)
+        finally:
+            api_costs.ledger = None
+        return ledger.make_report()
+
+    def test_merge_cost_reports(self):
+        first = self.make_cost_report([("1", "nr", True, 1),
+                                       ("2", "nr", False, 2)])
+        second = self.make_cost_report([("3", "np", False, 10)])
+        merged = api_costs.merge_reports([first, second])
+        whole = self.make_cost_report([("1", "nr", True, 1),
+                                       ("2", "nr", False, 2),
+                                       ("3", "np", False, 10)])
+        self.assertEqual([x["item"] for x in merged["items"]],
+                         ["1", "2", "3"])
+        self.assertEqual(merged["unattributed"]["writes"], 2)
+        for counter in api_costs.COUNTERS:
+            self.assertEqual(merged["all"][counter],
+                             whole["all"][counter])
+        self.assertEqual(merged["all"]["reads"]["p50"], 2)
+        self.assertEqual(merged["by_status"]["existing"]["items"], 2)
+        self.assertEqual(merged["by_dataset"]["nr"]["reads"],
+                         whole["by_dataset"]["nr"]["reads"])
+        labels = merged["by_status"]["existing"]["phases"]["labels"]
+        self.assertEqual(labels["reads"]["total"], 12)
+        self.assertEqual(labels["reads"]["count"], 2)
+        self.assertIsNone(labels["reads"]["p50"])
+
+    def test_merge_files_costs(self):
+        filepaths = []
+        for name, items in [("1.json", [("1", "nr", True, 1)]),
+                            ("2.json", [("2", "nr", True, 3)])]:
+            filepath = os.path.join(self.directory, name)
+            with open(filepath, "w") as f:
+                json.dump(self.make_cost_report(items), f)
+            filepaths.append(filepath)
+        output = os.path.join(self.directory, "costs.json")
+        sharding.merge_files("costs", filepaths, output)
+        with open(output) as f:
+            merged = json.load(f)
+        self.assertEqual(merged["all"]["reads"]["total"], 4)
+        self.assertEqual(merged["all"]["items"], 2)
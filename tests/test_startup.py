@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest import mock
+
+import importer_path  # noqa: F401
+import nature_importer
+
+IMPORTER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "importer")
+HEAVY_MODULES = ["pywikibot", "wikidataStuff"]
+STARTUP_BUDGET = 0.5
+
+
+def run_python(code):
+    """Run code in a new interpreter in the importer directory."""
+    start = time.time()
+    output = subprocess.check_output([sys.executable, "-c", code],
+                                     cwd=IMPORTER_DIR,
+                                     universal_newlines=True)
+    return (output, time.time() - start)
+
+
+class TestStartup(unittest.TestCase):
+    """Tests for importing the importer without its heavy dependencies."""
+
+    def test_no_heavy_imports(self):
+        code = ("import sys, nature_importer\n"
+                "print(','.join(x for x in {} if x in sys.modules))")
+        output, _ = run_python(code.format(HEAVY_MODULES))
+        self.assertEqual(output.strip(), "")
+
+    def test_startup_budget(self):
+        _, baseline = run_python("pass")
+        _, elapsed = run_python("import nature_importer")
+        self.assertLess(elapsed - baseline, STARTUP_BUDGET)
+
+    def test_estimate_without_pywikibot(self):
+        code = ("import sys, nature_importer\n"
+                "nature_importer.utils.json_to_file = lambda *args: None\n"
+                "nature_importer.save_estimate(\n"
+                "    {'cost_report': None, 'workers': 1,\n"
+                "     'min_interval': 1.0},\n"
+                "    {'site': None, 'estimated': [], 'timestamp': 'x'})\n"
+                "print('pywikibot' in sys.modules)")
+        output, _ = run_python(code)
+        self.assertEqual(output.split()[-1], "False")
+
+
+class TestDeferredSetup(unittest.TestCase):
+    """Tests for setting up the site and the existing items when needed."""
+
+    def setUp(self):
+        self.run = {"site": None, "existing": None, "throttle": None}
+        self.arguments = {"from_export": None, "wdqs_page_size": None,
+                          "sparql_endpoint": None, "existing_file": None,
+                          "upload": "live", "workers": 4,
+                          "min_interval": 1.0, "start_interval": 5.0,
+                          "maxlag": 5.0}
+
+    def test_existing_downloaded_once(self):
+        with mock.patch.object(nature_importer, "get_wd_items_using_prop",
+                               return_value={"1": "Q1"}) as download:
+            for _ in range(2):
+                existing = nature_importer.get_existing(self.arguments,
+                                                        self.run)
+        self.assertEqual(existing, {"1": "Q1"})
+        self.assertEqual(download.call_count, 1)
+
+    def test_existing_not_downloaded_for_export(self):
+        self.arguments["from_export"] = "export.jsonl"
+        with mock.patch.object(nature_importer,
+                               "get_wd_items_using_prop") as download:
+            existing = nature_importer.get_existing(self.arguments, self.run)
+        self.assertEqual(existing, {})
+        download.assert_not_called()
+        self.assertIsNone(self.run["site"])
+
+    def test_throttle(self):
+        self.run["site"] = object()
+        throttle = nature_importer.get_throttle(self.arguments, self.run)
+        self.assertIs(throttle.site, self.run["site"])
+        self.assertEqual(throttle.max_workers, 4)
+        self.assertIs(nature_importer.get_throttle(self.arguments, self.run),
+                      throttle)
+
+    def test_one_worker_in_sandbox(self):
+        self.run["site"] = object()
+        self.arguments["upload"] = "sandbox"
+        throttle = nature_importer.get_throttle(self.arguments, self.run)
+        self.assertEqual(throttle.max_workers, 1)
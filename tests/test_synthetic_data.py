@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+from collections import Counter
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import importer.synthetic_data as synthetic_data
+
+
+class TestMakeRows(unittest.TestCase):
+    """Tests for generating rows of the source file."""
+
+    def test_make_rows_statuses(self):
+        rows, matched = synthetic_data.make_rows(
+            200, 0.1, seed=1, duplicate_share=0.05, invalid_share=0.1)
+        self.assertEqual(len(rows), 200 + 10 + 20)
+        self.assertEqual(len(matched), 20)
+        valid = [x for x in rows if x["BESLSTATUS"] == "Gällande"]
+        self.assertEqual(len(valid), 200)
+        self.assertEqual(len(set(x["NVRID"] for x in valid)), 200)
+        counts = Counter(x["NVRID"] for x in rows)
+        duplicated = [x for x, count in counts.items() if count > 1]
+        self.assertTrue(duplicated)
+        self.assertTrue(all(x in set(y["NVRID"] for y in valid)
+                            for x in duplicated))
+
+    def test_make_rows_municipalities(self):
+        rows, _ = synthetic_data.make_rows(100, 0, seed=2, multi_share=1)
+        self.assertTrue(all(len(x["KOMMUN"].split(", ")) in [2, 3]
+                            for x in rows))
+
+    def test_make_rows_seed(self):
+        self.assertEqual(synthetic_data.make_rows(50, 0.5, seed=3),
+                         synthetic_data.make_rows(50, 0.5, seed=3))
+
+
+class TestMakeArticles(unittest.TestCase):
+    """Tests for generating the svwp articles."""
+
+    def test_make_articles(self):
+        rows, _ = synthetic_data.make_rows(300, 0, seed=4, multi_share=0.5)
+        titles, pages = synthetic_data.make_articles(rows, seed=4)
+        self.assertEqual(len(titles), len(set(titles)))
+        lists = [x for x in titles if x.startswith("Lista")]
+        self.assertTrue(lists)
+        self.assertEqual(len(titles), len(pages) + len(lists))
+        items = [x["item"] for x in pages.values()]
+        self.assertEqual(len(items), len(set(items)))
+        names = set(x["NAMN"] for x in rows)
+        for title, page in pages.items():
+            if title in names:
+                self.assertTrue(page["categories"][0].startswith(
+                    "Naturreservat i "))
+
+
+class TestGenerate(unittest.TestCase):
+    """Tests for writing the generated files."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_generate(self):
+        written = synthetic_data.generate(self.directory, 50, seed=5,
+                                          existing_share=0)
+        with open(os.path.join(self.directory,
+                               synthetic_data.SOURCE_FILE)) as f_obj:
+            rows = list(csv.DictReader(f_obj))
+        self.assertEqual(len(rows), written[synthetic_data.SOURCE_FILE])
+        self.assertEqual(list(rows[0]), synthetic_data.COLUMNS)
+        with open(os.path.join(self.directory,
+                               synthetic_data.PETSCAN_FILE)) as f_obj:
+            petscan = json.load(f_obj)
+        self.assertEqual(len(petscan["*"][0]["a"]["*"]),
+                         written[synthetic_data.PETSCAN_FILE])
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import json
+import os
+import tempfile
+import unittest
+
+import importer.api_costs as api_costs
+import importer.upload_estimate as upload_estimate
+
+
+def make_record(key, item, upload=True, props=("P31", "P17")):
+    return {"key": key, "dataset": "nr", "item": item, "upload": upload,
+            "labels": {"sv": "Namn"},
+            "descriptions": {"sv": "naturreservat", "en": "nature reserve"},
+            "statements": [{"prop": x} for x in props]}
+
+
+class TestUploadEstimate(unittest.TestCase):
+    """Tests for estimating the costs of an upload."""
+
+    def setUp(self):
+        self.items = [
+            upload_estimate.count_record(make_record("1", None)),
+            upload_estimate.count_record(make_record("2", "Q2")),
+            upload_estimate.count_record(make_record("3", "Q3", False))]
+
+    def test_phases(self):
+        self.assertEqual(upload_estimate.get_phases(self.items[0]),
+                         [("create", 1)])
+        self.assertEqual(upload_estimate.get_phases(self.items[1]),
+                         [("prefetch", 0), ("labels", 1),
+                          ("descriptions", 2), ("claim P31", 1),
+                          ("claim P17", 1)])
+        self.assertEqual(upload_estimate.get_phases(self.items[2]), [])
+
+    def test_default_model(self):
+        estimate = upload_estimate.make_estimate(
+            self.items, workers=2, min_interval=1.0, put_throttle=10.0)
+        summary = estimate["all"]
+        self.assertEqual((summary["new"], summary["existing"],
+                          summary["skipped"]), (1, 1, 1))
+        self.assertEqual((summary["labels"], summary["descriptions"],
+                          summary["claims"]), (2, 4, 4))
+        self.assertEqual(summary["sent"]["new"],
+                         {"labels": 1, "descriptions": 2, "claims": 2})
+        self.assertEqual(summary["sent"]["existing"],
+                         {"labels": 1, "descriptions": 2, "claims": 2})
+        self.assertEqual(summary["reads"], 1)
+        self.assertEqual(summary["writes"], 1 + 1 + 2 + 2)
+        self.assertEqual(summary["seconds"], 60.0)
+        self.assertEqual(summary["limited_by"], "put_throttle")
+        self.assertEqual(estimate["by_dataset"]["nr"], summary)
+
+    def test_new_items_counted(self):
+        items = [upload_estimate.count_record(
+            make_record(str(x), None, props=("P31", "P17", "P131")))
+            for x in range(3)]
+        summary = upload_estimate.make_estimate(items)["all"]
+        self.assertEqual(summary["new"], 3)
+        self.assertEqual(summary["claims"], 9)
+        self.assertEqual(summary["sent"]["new"]["labels"], 3)
+        self.assertEqual(summary["sent"]["existing"]["claims"], 0)
+
+    def test_measured_costs(self):
+        ledger = api_costs.CostLedger()
+        for new, phases in [(True, [("create", 0, 1, 2.0)]),
+                            (False, [("prefetch", 2, 0, 0.5),
+                                     ("labels", 1, 0, 0.5),
+                                     ("descriptions", 1, 1, 1.0),
+                                     ("claim P31", 1, 1, 1.5)])]:
+            record = api_costs.new_record("x", "nr", new)
+            for name, reads, writes, seconds in phases:
+                counts = api_costs.new_counts()
+                counts.update(phase=name, reads=reads, writes=writes,
+                              seconds=seconds)
+                record["phases"].append(counts)
+            ledger.add(record)
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, "costs.json")
+            with open(filepath, "w") as f_obj:
+                json.dump(ledger.make_report(), f_obj)
+            phase_costs = upload_estimate.load_phase_costs(filepath)
+        estimate = upload_estimate.make_estimate(
+            self.items, phase_costs, workers=1, min_interval=1.0,
+            put_throttle=0.0)
+        summary = estimate["all"]
+        # P17 was never measured, so it costs as much as P31
+        self.assertEqual(summary["reads"], 2 + 1 + 1 + 1 + 1)
+        self.assertEqual(summary["writes"], 1 + 1 + 1 + 1)
+        self.assertEqual(summary["item_seconds"], 2.0 + 0.5 + 0.5 + 1 + 3)
+        self.assertEqual(summary["limited_by"], "workers")
+        self.assertTrue(estimate["settings"]["measured_costs"])
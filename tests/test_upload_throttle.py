@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import time
+import unittest
+
+import importer_path  # noqa: F401
+import wdqs
+import wikibase_standin
+from UploadThrottle import UploadThrottle
+
+
+class StandinSite(object):
+    """The parts of a pywikibot site the throttle uses."""
+
+    def __init__(self, server):
+        self.host = "{}:{}".format(*server.server_address[:2])
+
+    def protocol(self):
+        return "http"
+
+    def hostname(self):
+        return self.host
+
+    def apipath(self):
+        return wikibase_standin.API_PATH
+
+
+class LaggedThrottle(UploadThrottle):
+    """A throttle that sees a fixed lag instead of asking a site."""
+
+    def __init__(self, lag, retry_after, **kwargs):
+        super().__init__(site=object(), **kwargs)
+        self.fixed_lag = (lag, retry_after)
+
+    def fetch_lag(self):
+        return self.fixed_lag
+
+
+class TestAdapting(unittest.TestCase):
+    """Tests for speeding up and slowing down."""
+
+    def test_speed_up_interval_then_workers(self):
+        throttle = UploadThrottle(min_interval=1.0, start_interval=2.0,
+                                  max_workers=3)
+        throttle.release()
+        self.assertLess(throttle.interval, 2.0)
+        self.assertEqual(throttle.workers, 1)
+        for _ in range(20):
+            throttle.release()
+        self.assertEqual(throttle.interval, 1.0)
+        self.assertEqual(throttle.workers, 3)
+
+    def test_speed_up_without_min_interval(self):
+        throttle = UploadThrottle(min_interval=0.0, start_interval=5.0,
+                                  max_workers=3)
+        for _ in range(100):
+            throttle.release()
+        self.assertEqual(throttle.interval, 0.0)
+        self.assertEqual(throttle.workers, 3)
+        self.assertEqual(throttle.metrics()["peak_workers"], 3)
+        self.assertIsNone(throttle.metrics()["uploads_per_minute"])
+
+    def test_slow_down_on_error(self):
+        throttle = UploadThrottle(min_interval=1.0, start_interval=1.0,
+                                  max_interval=3.0, max_workers=4)
+        throttle.workers = 4
+        throttle.release(ValueError("failed"))
+        self.assertEqual(throttle.interval, 2.0)
+        self.assertEqual(throttle.workers, 2)
+        self.assertGreater(throttle.backoff_until, time.time() + 0.5)
+        throttle.release(ValueError("failed"))
+        self.assertEqual(throttle.interval, 3.0)
+        self.assertEqual(throttle.workers, 1)
+        self.assertEqual(throttle.errors, 2)
+
+    def test_no_speed_up_after_recent_error(self):
+        throttle = UploadThrottle(min_interval=1.0, start_interval=2.0)
+        throttle.release(ValueError("failed"))
+        interval = throttle.interval
+        throttle.release()
+        self.assertEqual(throttle.interval, interval)
+
+    def test_slot_counts_error(self):
+        throttle = UploadThrottle(min_interval=0.0, start_interval=0.0)
+        with self.assertRaises(ValueError):
+            with throttle.slot():
+                raise ValueError("failed")
+        self.assertEqual(throttle.errors, 1)
+        self.assertEqual(throttle.active, 0)
+        self.assertEqual(throttle.peak_active, 1)
+
+    def test_is_failing(self):
+        throttle = UploadThrottle(error_window=3)
+        for _ in range(2):
+            throttle.release(ValueError("failed"))
+        self.assertFalse(throttle.is_failing())
+        throttle.release(ValueError("failed"))
+        self.assertTrue(throttle.is_failing())
+        throttle.release()
+        self.assertFalse(throttle.is_failing())
+
+
+class TestLag(unittest.TestCase):
+    """Tests for adapting to the lag of the site."""
+
+    def test_retry_after(self):
+        throttle = LaggedThrottle(lag=8, retry_after=30, start_interval=2.0)
+        throttle.check_lag()
+        self.assertEqual(throttle.lag, 8)
+        self.assertEqual(throttle.interval, 4.0)
+        self.assertGreater(throttle.backoff_until, time.time() + 25)
+
+    def test_pause_for_lag_without_retry_after(self):
+        throttle = LaggedThrottle(lag=8, retry_after=None)
+        throttle.check_lag()
+        self.assertGreater(throttle.backoff_until, time.time() + 5)
+
+    def test_low_lag(self):
+        throttle = LaggedThrottle(lag=1, retry_after=None,
+                                  start_interval=2.0)
+        throttle.check_lag()
+        self.assertEqual(throttle.interval, 2.0)
+        self.assertEqual(throttle.backoff_until, 0.0)
+
+    def test_no_speed_up_while_lagged(self):
+        throttle = LaggedThrottle(lag=4, retry_after=None,
+                                  start_interval=2.0, target_lag=5.0)
+        throttle.check_lag()
+        throttle.release()
+        self.assertEqual(throttle.interval, 2.0)
+
+    def test_fetch_lag(self):
+        server = wikibase_standin.start_server(maxlag_rate=1.0, lag=8.0,
+                                               retry_after=3)
+        try:
+            throttle = UploadThrottle(site=StandinSite(server))
+            self.assertEqual(throttle.fetch_lag(), (8.0, 3))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(throttle.session.headers["User-Agent"],
+                         wdqs.USER_AGENT)
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+
+import importer_path  # noqa: F401
+import standin_site
+from Uploader import Uploader
+
+
+class Statement(object):
+    """The parts of a wikidataStuff Statement the uploader reads."""
+
+    def __init__(self, itis, special=False, quals=None):
+        self.itis = itis
+        self.special = special
+        self.quals = quals or []
+
+
+class Qualifier(object):
+    """The parts of a wikidataStuff Qualifier the uploader reads."""
+
+    def __init__(self, prop, itis):
+        self.prop = prop
+        self.itis = itis
+
+
+class Reference(object):
+    """The parts of a wikidataStuff Reference the uploader reads."""
+
+    def __init__(self, source_test, source_notest):
+        self.source_test = source_test
+        self.source_notest = source_notest
+
+
+def get_snak_value(snak):
+    return snak["datavalue"]["value"]
+
+
+def get_snak_item(snak):
+    return "Q{}".format(get_snak_value(snak)["numeric-id"])
+
+
+class TestMakeItemData(unittest.TestCase):
+    """Tests for the JSON of a new item, sent in a single edit."""
+
+    def setUp(self):
+        import pywikibot
+        _, self.repo = standin_site.get_site()
+
+        def item(qid):
+            return pywikibot.ItemPage(self.repo, qid)
+
+        def claim(prop, target):
+            made = pywikibot.Claim(self.repo, prop)
+            made.setTarget(target)
+            return made
+
+        published = pywikibot.WbTime(year=2015, month=12, day=18,
+                                     site=self.repo)
+        ref = Reference(
+            [claim("P248", item("Q29580583"))],
+            [claim("P854", "http://example.org/2000283"),
+             claim("P577", published)])
+        self.uploader = Uploader.__new__(Uploader)
+        self.uploader.repo = self.repo
+        self.uploader.data = {
+            "upload": True, "wd-item": None,
+            "labels": [{"language": "sv", "value": "Kungsberget"},
+                       {"language": "en", "value": "Kungsberget"}],
+            "descriptions": [{"language": "sv",
+                              "value": "naturreservat i Gävleborgs län"}],
+            "statements": [
+                {"prop": "P31", "value": Statement(item("Q179049")),
+                 "ref": ref},
+                {"prop": "P131", "value": Statement(
+                    item("Q504238"),
+                    quals=[Qualifier("P518", item("Q23397"))]),
+                 "ref": ref},
+                {"prop": "P3613", "value": Statement("2000283"),
+                 "ref": None},
+                {"prop": "P137", "value": Statement("somevalue",
+                                                    special=True),
+                 "ref": None}]}
+
+    def test_terms(self):
+        data = self.uploader.make_item_data()
+        self.assertEqual(data["labels"], {
+            "sv": {"language": "sv", "value": "Kungsberget"},
+            "en": {"language": "en", "value": "Kungsberget"}})
+        self.assertEqual(data["descriptions"], {
+            "sv": {"language": "sv",
+                   "value": "naturreservat i Gävleborgs län"}})
+
+    def test_claims(self):
+        claims = self.uploader.make_item_data()["claims"]
+        self.assertEqual([x["mainsnak"]["property"] for x in claims],
+                         ["P31", "P131", "P3613", "P137"])
+        self.assertEqual(get_snak_item(claims[0]["mainsnak"]),
+                         "Q179049")
+        self.assertEqual(get_snak_value(claims[2]["mainsnak"]), "2000283")
+        self.assertEqual(claims[3]["mainsnak"]["snaktype"], "somevalue")
+        self.assertNotIn("references", claims[2])
+
+    def test_qualifiers(self):
+        claims = self.uploader.make_item_data()["claims"]
+        self.assertEqual(list(claims[1]["qualifiers"]), ["P518"])
+        self.assertEqual(
+            get_snak_item(claims[1]["qualifiers"]["P518"][0]),
+            "Q23397")
+        self.assertNotIn("qualifiers", claims[0])
+
+    def test_references(self):
+        claims = self.uploader.make_item_data()["claims"]
+        for claim in claims[:2]:
+            self.assertEqual(len(claim["references"]), 1)
+            reference = claim["references"][0]
+            self.assertEqual(reference["snaks-order"],
+                             ["P248", "P854", "P577"])
+            snaks = reference["snaks"]
+            self.assertEqual(get_snak_item(snaks["P248"][0]),
+                             "Q29580583")
+            self.assertEqual(get_snak_value(snaks["P854"][0]),
+                             "http://example.org/2000283")
+            self.assertEqual(get_snak_value(snaks["P577"][0])["time"],
+                             "+00000002015-12-18T00:00:00Z")
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+import standin_site  # noqa: F401
+import uploader_benchmark
+
+HAS_WIKIDATASTUFF = importlib.util.find_spec("wikidataStuff") is not None
+
+
+@unittest.skipUnless(HAS_WIKIDATASTUFF, "wikidataStuff is not installed")
+class TestBenchmark(unittest.TestCase):
+    """Tests for uploading generated reserves to the stand-in."""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_concurrent_uploads(self):
+        arguments = uploader_benchmark.make_parser().parse_args([
+            "--port", "0", "--items", "30", "--workers", "4",
+            "--min-interval", "0", "--start-interval", "0.1",
+            "--latency", "0.01", "--seed", "1"])
+        report = uploader_benchmark.run_benchmark(arguments)
+        self.assertEqual(report["items"], 30)
+        self.assertGreater(report["peak_workers"], 1)
+        self.assertLessEqual(report["peak_active"], 4)
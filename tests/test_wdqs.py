@@ -0,0 +1,37 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import unittest
+import importer.wdqs as wdqs
+
+
+class TestParseTsvValue(unittest.TestCase):
+    """Tests for parsing SPARQL TSV results."""
+
+    def test_parse_tsv_value_entity(self):
+        text = "<http://www.wikidata.org/entity/Q42>"
+        self.assertEqual(wdqs.parse_tsv_value(text), "Q42")
+
+    def test_parse_tsv_value_literal(self):
+        self.assertEqual(wdqs.parse_tsv_value('"2000283"'), "2000283")
+
+    def test_parse_tsv_value_language(self):
+        self.assertEqual(wdqs.parse_tsv_value('"Abisko"@sv'), "Abisko")
+
+    def test_parse_tsv_value_escaped(self):
+        self.assertEqual(wdqs.parse_tsv_value('"a\\"b\\tc"'), 'a"b\tc')
+
+    def test_parse_tsv_value_unbound(self):
+        self.assertIsNone(wdqs.parse_tsv_value(""))
+
+
+class TestGroupValues(unittest.TestCase):
+    """Tests for finding IDs used on several items."""
+
+    def test_group_values(self):
+        pairs = [("1", "Q200"), ("2", "Q5"), ("1", "Q30"), ("1", "Q200")]
+        self.assertEqual(wdqs.group_values(pairs),
+                         {"1": ["Q30", "Q200"], "2": ["Q5"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
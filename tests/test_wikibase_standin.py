@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8  -*-
+import json
+import unittest
+
+import requests
+
+import importer.wikibase_standin as standin
+
+
+def make_claim(prop, value):
+    return {"mainsnak": {"snaktype": "value", "property": prop,
+                         "datavalue": {"value": value, "type": "string"}}}
+
+
+class TestEntityStore(unittest.TestCase):
+    """Tests for the in-memory entity store."""
+
+    def setUp(self):
+        self.store = standin.EntityStore()
+
+    def test_create_item_new_ids(self):
+        first = self.store.create_item()
+        second = self.store.create_item()
+        self.assertNotEqual(first["id"], second["id"])
+
+    def test_edit_entity_terms_and_claims(self):
+        entity = self.store.create_item()
+        revision = entity["lastrevid"]
+        self.store.edit_entity(entity, {
+            "labels": {"sv": {"language": "sv", "value": "Abisko"}},
+            "claims": [make_claim("P3613", "2001225")]})
+        self.assertEqual(entity["labels"]["sv"]["value"], "Abisko")
+        claim = entity["claims"]["P3613"][0]
+        self.assertTrue(claim["id"].startswith(entity["id"] + "$"))
+        self.assertEqual(claim["mainsnak"]["datatype"], "external-id")
+        self.assertGreater(entity["lastrevid"], revision)
+
+    def test_edit_entity_remove_claim(self):
+        entity = self.store.create_item()
+        self.store.edit_entity(entity,
+                               {"claims": [make_claim("P3613", "1")]})
+        guid = entity["claims"]["P3613"][0]["id"]
+        self.store.edit_entity(entity,
+                               {"claims": [{"id": guid, "remove": ""}]})
+        self.assertEqual(entity["claims"], {})
+
+    def test_get_missing(self):
+        with self.assertRaises(standin.ApiError):
+            self.store.get("Q1")
+
+
+class TestStandinServer(unittest.TestCase):
+    """Tests for the API of a running stand-in."""
+
+    def setUp(self):
+        self.server = standin.start_server()
+        self.api = self.server.get_url() + standin.API_PATH
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, **params):
+        params["format"] = "json"
+        return requests.post(self.api, data=params, timeout=10)
+
+    def test_create_and_get(self):
+        data = {"labels": {"sv": {"language": "sv", "value": "Abisko"}}}
+        created = self.post(action="wbeditentity", new="item",
+                            data=json.dumps(data)).json()
+        item = created["entity"]["id"]
+        entities = self.post(action="wbgetentities",
+                             ids="{}|Q1".format(item)).json()["entities"]
+        self.assertEqual(entities[item]["labels"], data["labels"])
+        self.assertIn("missing", entities["Q1"])
+
+    def test_maxlag(self):
+        self.server.maxlag_rate = 1.0
+        response = self.post(action="query", maxlag="5")
+        self.assertEqual(response.json()["error"]["code"], "maxlag")
+        self.assertEqual(response.headers["Retry-After"],
+                         str(self.server.retry_after))
+
+    def test_not_lagged(self):
+        response = self.post(action="query", meta="userinfo", maxlag="5")
+        self.assertIn("userinfo", response.json()["query"])
+
+    def test_error_rate(self):
+        self.server.error_rate = 1.0
+        response = self.post(action="wbeditentity", new="item", data="{}")
+        self.assertIn("error", response.json())
+
+    def test_sparql(self):
+        entity = self.server.store.create_item()
+        self.server.store.edit_entity(
+            entity, {"claims": [make_claim("P3613", "2001225")]})
+        response = requests.post(
+            self.server.get_url() + standin.SPARQL_PATH,
+            data={"query": "SELECT ?item ?value WHERE {?item p:P3613 ?s}"},
+            timeout=10)
+        lines = response.text.splitlines()
+        self.assertEqual(lines[0], "?item\t?value")
+        self.assertEqual(lines[1], "<{}{}>\t\"2001225\"".format(
+            standin.CONCEPT_BASE, entity["id"]))